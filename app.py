@@ -1,3 +1,4 @@
+import logging
 from contextlib import suppress
 from datetime import datetime, timedelta
 from dis import dis
@@ -9,6 +10,7 @@ from dotenv import load_dotenv
 from streamlit_tags import st_tags
 from vnstock import Vnstock
 
+from src.admin import ADMIN_PAGE, display_admin_page
 from src.features import (
     fetch_and_plot_ownership,
     get_fund_data,
@@ -16,12 +18,14 @@ from src.features import (
     plot_pie_fund,
 )
 from src.filter import (
+    filter_by_ml_prediction,
     filter_by_ownerratio,
     filter_by_pricing_stock,
     filter_by_quantitative,
     filter_components,
 )
-from src.fund import display_fund_data
+from src.fund import display_fund_data, display_fund_ownership
+from src.instrumentation import add_bytes
 from src.market_overview import overview_market
 from src.optimize_portfolio import display_portfolio_analysis
 from src.plots import (
@@ -33,10 +37,14 @@ from src.plots import (
     plot_proprietary_trading,
 )
 from src.quant_profile import calculate_quant_metrics
+from src.sections import record_run, render_rerun_panel, section
 from src.stock_health import display_dupont_analysis, display_stock_score
 from src.stock_profile import company_profile
 
 load_dotenv()
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
 period = 7
 
 old_request = requests.Session.request
@@ -44,7 +52,11 @@ old_request = requests.Session.request
 
 def new_request(self, *args, **kwargs):
     kwargs["verify"] = False
-    return old_request(self, *args, **kwargs)
+    response = old_request(self, *args, **kwargs)
+    if not kwargs.get("stream"):
+        # Ghi nhận dung lượng tải về cho các hàm đang được đo
+        add_bytes(len(response.content))
+    return response
 
 
 requests.Session.request = new_request
@@ -119,12 +131,18 @@ def get_sidebar_inputs():
         return stock, start_date, end_date, period, page
 
 
-def display_cashflow_analysis(stock, df_price, period):
+def display_cashflow_analysis(stock, start_date, end_date, period):
+    df_price = get_stock_price(
+        stock, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    )
     plot_cashflow_analysis(df_price, stock, period)
 
 
-def display_trading_analysis(stock, df_price, df_index, start_date, end_date):
+def display_trading_analysis(stock, start_date, end_date):
     """Display trading analysis for the selected stock."""
+    df_price = get_stock_price(
+        stock, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    )
     st.header("📈 PHÂN TÍCH CỔ PHIẾU " + stock)
     st.subheader("THÔNG TIN CỔ PHIẾU")
     df_pricing = get_firm_pricing(stock, "2024-01-01")
@@ -149,6 +167,9 @@ def display_trading_analysis(stock, df_price, df_index, start_date, end_date):
         st.subheader("ĐỊNH GIÁ TỪ CÁC CTCK")
         plot_firm_pricing(df_pricing)
 
+    st.subheader("QUỸ MỞ NẮM GIỮ")
+    display_fund_ownership(stock)
+
     st.divider()
     st.subheader("GIAO DỊCH CỦA TỔ CHỨC VÀ NƯỚC NGOÀI")
     col_1, col_2 = st.columns([2, 1])
@@ -167,13 +188,18 @@ def display_trading_analysis(stock, df_price, df_index, start_date, end_date):
         st.write("Update sau")
 
 
+@section("fund_allocation")
+def display_fund_allocation():
+    start = st.date_input("Chọn ngày: ", datetime(2025, 1, 1))
+    df = get_fund_data(start.strftime("%Y-%m-%d"))
+    plot_pie_fund(df)
+
+
 def display_overview_market():
     """Display market overview."""
     overview_market()
     st.divider()
-    start = st.date_input("Chọn ngày: ", datetime(2025, 1, 1))
-    df = get_fund_data(start.strftime("%Y-%m-%d"))
-    plot_pie_fund(df)
+    display_fund_allocation()
 
 
 def display_quant_analysis(stock, end_date):
@@ -190,6 +216,7 @@ def display_filter_stock(end_date):
             "Lọc cổ phiếu theo % NN sở hữu",
             "Lọc cổ phiếu theo định giá",
             "Lọc theo định lượng",
+            "Lọc theo mô hình ML",
         ]
     )
     with tabs[0]:
@@ -212,11 +239,17 @@ def display_filter_stock(end_date):
             )
 
             filter_by_quantitative(stocks_tag, end_date, years, risk_profile)
+    with tabs[3]:
+        filter_by_ml_prediction(stocks)
 
 
 def main():
     """Main function to run the Streamlit app."""
     configure_streamlit()
+    if st.query_params.get("page") == ADMIN_PAGE:
+        display_admin_page()
+        return
+    record_run("app")
     stock, start_date, end_date, period, page = get_sidebar_inputs()
     st.title(f"Vincent App - {page}")
     st.divider()
@@ -229,14 +262,9 @@ def main():
     )
 
     if stock:
-        df_price = get_stock_price(
-            stock, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
-        )
-        df_index = get_stock_price(
-            "VNINDEX", start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
-        )
+        # Giá chỉ được lấy trong các trang cần đến, không phải ở mỗi lần chạy lại
         if page == "💰 Phân Tích Dòng Tiền":
-            display_cashflow_analysis(stock, df_price, period)
+            display_cashflow_analysis(stock, start_date, end_date, period)
         elif page == "🌍 Tổng Quan Thị Trường":
             display_overview_market()
         elif page == "🎲 Phân Tích Định Lượng":
@@ -246,7 +274,7 @@ def main():
         elif page == "🔍 Bộ Lọc Cổ Phiếu":
             display_filter_stock(end_date)
         elif page == "📈 Phân Tích Cổ Phiếu":
-            display_trading_analysis(stock, df_price, df_index, start_date, end_date)
+            display_trading_analysis(stock, start_date, end_date)
         elif page == "📃 Phân Tích Cơ Bản Cổ Phiếu":
             display_stock_score(stock)
             st.divider()
@@ -256,6 +284,8 @@ def main():
         else:
             display_overview_market()
 
+    render_rerun_panel()
+
 
 if __name__ == "__main__":
     main()
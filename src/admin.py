@@ -0,0 +1,69 @@
+import pandas as pd
+import streamlit as st
+
+from src.figure_cache import cache_stats
+from src.instrumentation import call_stats, export_json, records, reset
+from src.llm_model import call_metrics
+from src.modeling import registry
+from src.sections import RUNS_KEY
+
+# Trang quản trị không có trong menu, mở bằng ?page=admin
+ADMIN_PAGE = "admin"
+
+
+def display_admin_page():
+    """Thời gian thực/CPU, byte tải về, cache hit/miss và số dòng của các hàm lấy dữ liệu"""
+    st.title("Vincent App - Hiệu năng")
+
+    stats = call_stats()
+    if stats.empty:
+        st.info("Chưa có lượt gọi nào được ghi nhận trong tiến trình này.")
+    else:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Số lượt gọi", int(stats["calls"].sum()))
+        col2.metric("Tổng thời gian (s)", f"{stats['wall_total'].sum():,.2f}")
+        col3.metric("Dữ liệu tải về (MB)", f"{stats['bytes_total'].sum() / 1e6:,.2f}")
+        st.dataframe(
+            stats.style.format(
+                {
+                    "wall_total": "{:.3f}",
+                    "wall_mean": "{:.3f}",
+                    "wall_p95": "{:.3f}",
+                    "wall_max": "{:.3f}",
+                    "cpu_total": "{:.3f}",
+                    "bytes_total": "{:,.0f}",
+                    "rows_total": "{:,.0f}",
+                    "hit_rate": "{:.1%}",
+                },
+                na_rep="-",
+            ),
+            use_container_width=True,
+        )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "Tải JSON",
+            export_json(),
+            file_name=f"profile_{pd.Timestamp.now():%Y%m%d_%H%M%S}.json",
+            mime="application/json",
+        )
+    with col2:
+        if st.button("Xóa số liệu"):
+            reset()
+            st.rerun()
+
+    with st.expander("Các lượt gọi gần nhất"):
+        st.dataframe(records().tail(200).iloc[::-1], use_container_width=True)
+
+    st.subheader("Cache biểu đồ")
+    st.dataframe(cache_stats(), use_container_width=True)
+
+    st.subheader("Gọi LLM")
+    st.dataframe(call_metrics(), use_container_width=True)
+
+    st.subheader("Nạp artifact mô hình")
+    st.dataframe(pd.DataFrame.from_dict(registry.load_stats(), orient="index"))
+
+    st.subheader("Các phần chạy lại trong phiên")
+    st.dataframe(pd.DataFrame.from_dict(st.session_state.get(RUNS_KEY, {}), orient="index"))
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.config import EXTERNAL_DATA_DIR
+from src.daily_store import DailyStore
+from src.instrumentation import log_error, submit
+from src.manifest import batch
+from src.tcbs_stock_data import TCBSStockData
+
+BARS_DIR = EXTERNAL_DATA_DIR / "bars"
+
+COLUMNS = ["time", "open", "high", "low", "close", "volume"]
+
+
+def fetch_bars(stock, start, end):
+    tcbs = TCBSStockData(rate_limit_pause=0)
+    df = tcbs.get_stock_data_by_date_range(
+        stock, start_date=f"{start:%Y-%m-%d}", end_date=f"{end:%Y-%m-%d}"
+    )
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    df = df[[c for c in COLUMNS if c in df.columns]].copy()
+    df["time"] = pd.to_datetime(df["time"])
+    df[COLUMNS[1:]] = df[COLUMNS[1:]].astype(float)
+    return df
+
+
+store = DailyStore(BARS_DIR, fetch_bars, COLUMNS, "nến")
+
+
+def sync_bars(stock, start=None, force=False):
+    """Đồng bộ nến ngày của một mã; trả về True nếu kho có thay đổi"""
+    return store.sync(stock, start=start, force=force)
+
+
+def read_bars(stock):
+    """Toàn bộ nến ngày đã lưu của một mã (giá theo VND như API TCBS)"""
+    return store.read(stock)
+
+
+def sync_universe(symbols, sync_one=sync_bars, max_workers=8, start=None, on_progress=None):
+    """Đồng bộ song song nhiều mã (I/O), trả về (mã có thay đổi, mã lỗi)
+
+    Manifest của kho được ghi một lần khi kết thúc thay vì sau mỗi mã; các luồng đồng bộ
+    được giao việc qua `submit` để dùng chung batch này.
+    """
+    changed, failed = [], []
+    with batch(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {submit(executor, sync_one, symbol, start): symbol for symbol in symbols}
+        for done, future in enumerate(as_completed(futures), start=1):
+            symbol = futures[future]
+            try:
+                if future.result():
+                    changed.append(symbol)
+            except Exception as e:
+                log_error(f"Lỗi khi đồng bộ {symbol}", e)
+                failed.append(symbol)
+            if on_progress:
+                on_progress(done, len(futures), symbol)
+    return changed, failed
+
+
+def load_bars(stock, start, end):
+    """Nến ngày của một mã trong [start, end], đồng bộ kho trước nếu cần"""
+    return store.load(stock, start, end)
@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+import pandas as pd
+
+from src.instrumentation import log_error
+from src.manifest import Manifest
+
+# Lần đầu tải lùi về BACKFILL_DAYS ngày; sau đó chỉ bổ sung các phiên mới
+BACKFILL_DAYS = 3 * 365
+MIN_CHECK_INTERVAL = timedelta(hours=6)
+
+
+class DailyStore:
+    """Kho dữ liệu theo ngày của từng mã: mỗi mã một file Parquet, chung một manifest
+
+    Manifest ghi lại ngày bắt đầu đã backfill và lần kiểm tra cuối của từng mã. Lần đầu tải từ
+    `start`, sau đó chỉ tải các phiên sau ngày cuối đã lưu (tối đa một lần mỗi
+    MIN_CHECK_INTERVAL); nếu `start` sớm hơn phần đã backfill thì chỉ tải bổ sung đoạn còn thiếu
+    phía trước. `fetch(stock, start, end)` trả về DataFrame có cột "time"; `label` dùng trong
+    thông báo lỗi.
+    """
+
+    def __init__(self, directory, fetch, columns, label):
+        self.directory = directory
+        self.fetch = fetch
+        self.columns = columns
+        self.label = label
+        self.manifest = Manifest(directory / "manifest.json")
+        self._lock = threading.Lock()
+        self._ticker_locks = defaultdict(threading.Lock)
+
+    def _ticker_lock(self, stock):
+        with self._lock:
+            return self._ticker_locks[stock]
+
+    def path(self, stock):
+        return self.directory / f"{stock}.parquet"
+
+    def read(self, stock):
+        """Toàn bộ dữ liệu đã lưu của một mã"""
+        path = self.path(stock)
+        if not path.exists():
+            return pd.DataFrame(columns=self.columns)
+        return pd.read_parquet(path)
+
+    def _write(self, stock, df):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(stock)
+        tmp_path = path.with_suffix(".tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def sync(self, stock, start=None, force=False):
+        """Đồng bộ một mã; trả về True nếu có dữ liệu mới được ghi vào kho
+
+        File Parquet chỉ được ghi lại khi tải được dòng mới, để lần kiểm tra không có gì mới
+        không đổi mtime của file (các bước tính lại theo mtime dựa vào điều này).
+        """
+        now = pd.Timestamp.now()
+        today = now.normalize()
+        start = pd.Timestamp(start) if start is not None else today - timedelta(days=BACKFILL_DAYS)
+        with self._ticker_lock(stock):
+            stored = self.read(stock)
+            entry = self.manifest.get(stock)
+            ranges = []
+            if entry is None:
+                ranges.append((start, today))
+            else:
+                backfilled_from = pd.Timestamp(entry["start"])
+                if start < backfilled_from:
+                    ranges.append((start, backfilled_from - timedelta(days=1)))
+                # Mã không có dữ liệu (hủy niêm yết, API không hỗ trợ) vẫn theo nhịp kiểm tra
+                last = (
+                    stored["time"].max()
+                    if not stored.empty
+                    else backfilled_from - timedelta(days=1)
+                )
+                checked_at = pd.Timestamp(entry["checked_at"])
+                if force or (last < today and now - checked_at > MIN_CHECK_INTERVAL):
+                    ranges.append((last + timedelta(days=1), today))
+                start = min(start, backfilled_from)
+            if not ranges:
+                return False
+
+            fetched = [self.fetch(stock, begin, end) for begin, end in ranges if begin <= end]
+            fetched = [df for df in fetched if not df.empty]
+            if fetched:
+                frames = [stored] + fetched if not stored.empty else fetched
+                df = pd.concat(frames, ignore_index=True)
+                df = df.drop_duplicates("time", keep="last").sort_values("time")
+                self._write(stock, df.reset_index(drop=True))
+            self.manifest.update(
+                stock, {"start": start.isoformat(), "checked_at": now.isoformat()}
+            )
+            return bool(fetched)
+
+    def load(self, stock, start, end):
+        """Dữ liệu của một mã trong [start, end], đồng bộ kho trước nếu cần
+
+        Lỗi khi đồng bộ không chặn việc đọc: trả về phần đã lưu.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        try:
+            self.sync(stock, start=min(start, pd.Timestamp.now() - timedelta(days=BACKFILL_DAYS)))
+        except Exception as e:
+            log_error(f"Lỗi khi đồng bộ {self.label} {stock}", e)
+        stored = self.read(stock)
+        mask = (stored["time"] >= start) & (stored["time"] <= end)
+        return stored.loc[mask].reset_index(drop=True)
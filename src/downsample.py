@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+# Ngân sách điểm cho mỗi trace: khoảng 1 điểm / pixel của một biểu đồ rộng cả trang
+VIEWPORT_WIDTH_PX = 1200
+POINTS_PER_PX = 1.0
+
+# Các thuộc tính theo từng điểm cần cắt cùng với x/y
+_POINT_ARRAYS = ("text", "hovertext", "customdata")
+_MARKER_ARRAYS = ("color", "size")
+
+
+def point_budget(width_px=VIEWPORT_WIDTH_PX, points_per_px=POINTS_PER_PX):
+    return max(3, int(width_px * points_per_px))
+
+
+def _as_numeric(x):
+    """Trục x dạng số cho phép tính diện tích tam giác (ngày giờ -> ns)"""
+    values = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(values) or isinstance(x[0], str):
+        converted = pd.to_datetime(values, errors="coerce")
+        if converted.notna().all():
+            return converted.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    return np.arange(len(values), dtype=float)
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: chọn n_out điểm giữ hình dạng (và đỉnh/đáy) của chuỗi"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = np.nanmean(y[end:next_end]) if np.isfinite(y[end:next_end]).any() else y[a]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        area = np.where(np.isnan(area), -1, area)
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """Chia thành n_out/2 nhóm, giữ điểm thấp nhất và cao nhất của mỗi nhóm"""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(y))
+    if valid.size == 0:
+        return np.arange(n)
+    buckets = valid * (n_out // 2) // n
+    keys = np.lexsort((y[valid], buckets))
+    order, sorted_buckets = valid[keys], buckets[keys]
+    boundary = sorted_buckets[1:] != sorted_buckets[:-1]
+    lowest = order[np.r_[True, boundary]]
+    highest = order[np.r_[boundary, True]]
+    return np.unique(np.r_[0, lowest, highest, n - 1])
+
+
+def _trace_indices(trace, n_out, method):
+    n = len(trace.y)
+    y = pd.to_numeric(pd.Series(trace.y), errors="coerce").to_numpy(dtype=float)
+    if method == "lttb":
+        x = _as_numeric(trace.x) if trace.x is not None else np.arange(n, dtype=float)
+        return lttb_indices(x, y, n_out)
+    return minmax_indices(y, n_out)
+
+
+def _take(trace, indices):
+    n = len(trace.y)
+    for name in ("x", "y") + _POINT_ARRAYS:
+        values = trace[name] if name in trace else None
+        if values is not None and not isinstance(values, str) and len(values) == n:
+            trace[name] = np.asarray(values)[indices]
+    for name in _MARKER_ARRAYS:
+        values = trace.marker[name] if name in trace.marker else None
+        if values is not None and not np.isscalar(values) and len(values) == n:
+            trace.marker[name] = np.asarray(values)[indices]
+
+
+def _bar_groups(bars):
+    """Gom các trace cột cùng trục x và cùng mảng x (các tầng của một cột chồng)"""
+    groups = []
+    for trace in bars:
+        x = np.asarray(trace.x) if trace.x is not None else None
+        for group in groups:
+            other = group[0]
+            if (other.xaxis or "x") != (trace.xaxis or "x") or len(other.y) != len(trace.y):
+                continue
+            other_x = np.asarray(other.x) if other.x is not None else None
+            if (x is None and other_x is None) or (
+                x is not None and other_x is not None and np.array_equal(x, other_x)
+            ):
+                group.append(trace)
+                break
+        else:
+            groups.append([trace])
+    return groups
+
+
+def downsample_figure(fig, max_points=None):
+    """Giảm số điểm của các trace dài trong figure trước khi gửi xuống trình duyệt
+
+    Đường (Scatter) dùng LTTB để giữ hình dạng; cột (Bar) dùng min/max theo nhóm để giữ
+    giá trị cực trị. Các trace cột chung trục x dùng chung một tập chỉ số (hợp các điểm
+    cực trị của từng trace) để cột chồng/cột nhóm vẫn thẳng hàng theo ngày.
+    Candlestick, heatmap, pie... giữ nguyên. Sửa trực tiếp và trả về `fig`.
+    """
+    max_points = max_points or point_budget()
+    bars = []
+    for trace in fig.data:
+        if trace.y is None or len(trace.y) <= max_points:
+            continue
+        if trace.type in ("scatter", "scattergl"):
+            mode = trace.mode or "lines"
+            if "lines" in mode:
+                _take(trace, _trace_indices(trace, max_points, "lttb"))
+        elif trace.type == "bar" and trace.orientation != "h":
+            bars.append(trace)
+
+    for group in _bar_groups(bars):
+        # Chia ngân sách cho các trace để tổng số điểm chung vẫn xấp xỉ max_points
+        n_out = max(2, max_points // len(group))
+        indices = np.unique(
+            np.concatenate([_trace_indices(trace, n_out, "minmax") for trace in group])
+        )
+        for trace in group:
+            _take(trace, indices)
+    return fig
@@ -0,0 +1,134 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+from tqdm import tqdm
+
+from src.config import INTERIM_DATA_DIR, PROCESSED_DATA_DIR, RAW_DATA_DIR
+from src.statements import load_statement_table, sync_statements
+
+DUPONT_PATH = PROCESSED_DATA_DIR / "dupont_percentiles.parquet"
+INDUSTRY_LEVEL = "icb_code3"
+MIN_PEERS = 3
+
+DUPONT_METRICS = [
+    "Biên lợi nhuận ròng",
+    "Hiệu suất sử dụng tài sản",
+    "Đòn bẩy tài chính",
+    "ROA",
+    "ROE",
+    "Gánh nặng thuế",
+    "Gánh nặng lãi vay",
+    "Biên lợi nhuận hoạt động",
+]
+PERCENT_METRICS = [
+    "Biên lợi nhuận ròng",
+    "ROA",
+    "ROE",
+    "Gánh nặng thuế",
+    "Gánh nặng lãi vay",
+    "Biên lợi nhuận hoạt động",
+]
+
+app = typer.Typer()
+
+
+def _safe_div(num, den):
+    return num / den.where(den != 0)
+
+
+def compute_dupont(is_df, bs_df):
+    """Phân tích DuPont 3 và 5 thành phần cho mọi mã và mọi năm cùng lúc"""
+    keys = ["ticker", "yearReport"]
+    income = is_df.reindex(
+        columns=keys
+        + ["Net Profit For the Year", "Net Sales", "Profit before tax", "Interest Expenses"]
+    ).drop_duplicates(subset=keys)
+    balance = bs_df.reindex(
+        columns=keys + ["TOTAL ASSETS (Bn. VND)", "OWNER'S EQUITY(Bn.VND)"]
+    ).drop_duplicates(subset=keys)
+    df = income.merge(balance, on=keys, how="inner")
+
+    net_profit = df["Net Profit For the Year"]
+    sales = df["Net Sales"]
+    pbt = df["Profit before tax"]
+    ebit = pbt + df["Interest Expenses"].abs()
+    total_assets = df["TOTAL ASSETS (Bn. VND)"]
+
+    dupont = pd.DataFrame(
+        {
+            "ticker": df["ticker"],
+            "Năm": df["yearReport"].astype(int),
+            "Biên lợi nhuận ròng": _safe_div(net_profit, sales),
+            "Hiệu suất sử dụng tài sản": _safe_div(sales, total_assets),
+            "Đòn bẩy tài chính": _safe_div(total_assets, df["OWNER'S EQUITY(Bn.VND)"]),
+            "Gánh nặng thuế": _safe_div(net_profit, pbt),
+            "Gánh nặng lãi vay": _safe_div(pbt, ebit),
+            "Biên lợi nhuận hoạt động": _safe_div(ebit, sales),
+        }
+    )
+    dupont["ROA"] = dupont["Biên lợi nhuận ròng"] * dupont["Hiệu suất sử dụng tài sản"]
+    dupont["ROE"] = dupont["ROA"] * dupont["Đòn bẩy tài chính"]
+    dupont = dupont.replace([np.inf, -np.inf], np.nan)
+    return dupont.sort_values(["ticker", "Năm"], ascending=[True, False]).reset_index(drop=True)
+
+
+def add_industry_percentiles(dupont, industries, level=INDUSTRY_LEVEL):
+    """Thêm thứ hạng phần trăm của từng chỉ số trong cùng ngành ICB và cùng năm"""
+    industries = industries[["symbol", "icb_name3", level]].rename(columns={"symbol": "ticker"})
+    df = dupont.merge(industries, on="ticker", how="left")
+
+    groups = df.groupby([level, "Năm"])
+    ranks = groups[DUPONT_METRICS].rank(pct=True)
+    peers = groups["ticker"].transform("size")
+    ranks = ranks.where(peers >= MIN_PEERS)
+    ranks.columns = [f"{col} (pct)" for col in DUPONT_METRICS]
+
+    df["Số DN cùng ngành"] = peers
+    return pd.concat([df, ranks], axis=1)
+
+
+def build_dupont_table(output_path=DUPONT_PATH):
+    """Tính DuPont cho toàn bộ kho báo cáo và lưu bảng xếp hạng theo ngành"""
+    is_df = load_statement_table("income_statement")
+    bs_df = load_statement_table("balance_sheet")
+    industries = pd.read_csv(INTERIM_DATA_DIR / "symbols_by_industries.csv")
+
+    table = add_industry_percentiles(compute_dupont(is_df, bs_df), industries)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    table.to_parquet(output_path, index=False)
+    return table
+
+
+def load_dupont_peers(path=DUPONT_PATH):
+    """Đọc bảng DuPont đã tính sẵn, đánh chỉ mục theo mã"""
+    if not Path(path).exists():
+        return None
+    return pd.read_parquet(path).set_index("ticker").sort_index()
+
+
+@app.command()
+def main(
+    output_path: Path = DUPONT_PATH,
+    sync: bool = typer.Option(False, help="Cập nhật kho báo cáo cho các mã HOSE/HNX trước"),
+):
+    if sync:
+        stocks = pd.read_csv(RAW_DATA_DIR / "list_stock.csv")
+        symbols = stocks.loc[
+            stocks["exchange"].isin(["HSX", "HNX"]) & (stocks["type"] == "STOCK"), "symbol"
+        ].tolist()
+        logger.info(f"Syncing statements for {len(symbols)} symbols...")
+        for symbol in tqdm(symbols):
+            try:
+                sync_statements(symbol)
+            except Exception as e:
+                logger.warning(f"{symbol}: {e}")
+
+    table = build_dupont_table(output_path)
+    logger.success(f"Saved DuPont table ({len(table)} rows) to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
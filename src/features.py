@@ -10,7 +10,12 @@ import streamlit as st
 from plotly.subplots import make_subplots
 from vnstock import Vnstock
 
+from src.downsample import downsample_figure
+from src.figure_cache import fingerprint, memoize_figure
+from src.indicators import compute_indicators
+from src.instrumentation import instrument
 from src.llm_model import analysis_with_ai
+from src.timealign import asof_align
 
 HEADERS = {
     "Upgrade-Insecure-Requests": "1",
@@ -78,7 +83,7 @@ def plot_price_chart(df):
             yaxis_title="Close Price",
             template="plotly_white",
         )
-        st.plotly_chart(fig)
+        st.plotly_chart(downsample_figure(fig))
     except Exception as e:
         st.write("No data available:", e)
 
@@ -112,6 +117,7 @@ def process_chunk(chunk):
 # === Các hàm phân tích bổ sung ===
 
 
+@memoize_figure(page="cashflow")
 def plot_volume_price_analysis(df_stacked):
     """Phân tích mối tương quan giữa khối lượng và giá"""
     fig = make_subplots(
@@ -135,11 +141,11 @@ def plot_volume_price_analysis(df_stacked):
     )
 
     # Volume chart
-    df_stacked["total_volume"] = df_stacked["BUY"] + abs(df_stacked["SELL"])
+    total_volume = df_stacked["BUY"] + df_stacked["SELL"].abs()
     fig.add_trace(
         go.Bar(
             x=df_stacked["date"],
-            y=df_stacked["total_volume"],
+            y=total_volume,
             name="Tổng khối lượng",
             marker_color="orange",
         ),
@@ -148,11 +154,11 @@ def plot_volume_price_analysis(df_stacked):
     )
 
     # Buy/Sell ratio
-    df_stacked["buy_sell_ratio"] = df_stacked["BUY"] / (abs(df_stacked["SELL"]) + 0.001)
+    buy_sell_ratio = df_stacked["BUY"] / (df_stacked["SELL"].abs() + 0.001)
     fig.add_trace(
         go.Scatter(
             x=df_stacked["date"],
-            y=df_stacked["buy_sell_ratio"],
+            y=buy_sell_ratio,
             name="Tỷ lệ BUY/SELL",
             line=dict(color="green"),
         ),
@@ -164,6 +170,7 @@ def plot_volume_price_analysis(df_stacked):
     return fig
 
 
+@memoize_figure(page="cashflow")
 def plot_investor_sentiment_heatmap(df_stacked):
     """Tạo heatmap thể hiện tâm lý nhà đầu tư"""
     # Chuẩn bị dữ liệu
@@ -201,6 +208,7 @@ def plot_investor_sentiment_heatmap(df_stacked):
     return fig
 
 
+@memoize_figure(page="cashflow")
 def plot_candlestick_with_volume(df_stacked):
     """Biểu đồ nến kết hợp với khối lượng giao dịch"""
     fig = make_subplots(
@@ -212,19 +220,23 @@ def plot_candlestick_with_volume(df_stacked):
         row_width=[0.2, 0.7],
     )
 
-    # Tạo dữ liệu OHLC giả lập (vì chỉ có close price)
-    df_stacked["open"] = df_stacked["close"].shift(1).fillna(df_stacked["close"])
-    df_stacked["high"] = df_stacked[["open", "close"]].max(axis=1) * 1.002
-    df_stacked["low"] = df_stacked[["open", "close"]].min(axis=1) * 0.998
+    # Dùng OHLC thật từ lịch sử giá; chỉ giả lập khi thiếu
+    close = df_stacked["close"]
+    if {"open", "high", "low"}.issubset(df_stacked.columns):
+        open_, high, low = df_stacked["open"], df_stacked["high"], df_stacked["low"]
+    else:
+        open_ = close.shift(1).fillna(close)
+        high = pd.concat([open_, close], axis=1).max(axis=1) * 1.002
+        low = pd.concat([open_, close], axis=1).min(axis=1) * 0.998
 
     # Candlestick chart
     fig.add_trace(
         go.Candlestick(
             x=df_stacked["date"],
-            open=df_stacked["open"],
-            high=df_stacked["high"],
-            low=df_stacked["low"],
-            close=df_stacked["close"],
+            open=open_,
+            high=high,
+            low=low,
+            close=close,
             name="OHLC",
         ),
         row=1,
@@ -279,6 +291,7 @@ def plot_candlestick_with_volume(df_stacked):
     return fig
 
 
+@memoize_figure(page="cashflow")
 def plot_correlation_analysis(df_stacked):
     """Phân tích tương quan giữa các yếu tố"""
     # Tính toán các chỉ số bổ sung
@@ -310,18 +323,11 @@ def plot_correlation_analysis(df_stacked):
     return fig
 
 
-def plot_moving_averages_analysis(df_stacked):
+@memoize_figure(page="cashflow")
+def plot_moving_averages_analysis(df_stacked, indicators):
     """Phân tích đường trung bình động"""
-    df_ma = df_stacked.copy()
-
-    # Tính các đường MA
-    df_ma["MA_5"] = df_ma["close"].rolling(window=5).mean()
-    df_ma["MA_10"] = df_ma["close"].rolling(window=10).mean()
-    df_ma["MA_20"] = df_ma["close"].rolling(window=20).mean()
-
-    # Tính MA cho BUY/SELL
-    df_ma["BUY_MA_5"] = df_ma["BUY"].rolling(window=5).mean()
-    df_ma["SELL_MA_5"] = df_ma["SELL"].rolling(window=5).mean()
+    # Các đường MA của giá và BUY/SELL lấy từ bộ chỉ báo dùng chung
+    df_ma = indicators.assign(date=df_stacked["date"], close=df_stacked["close"])
 
     fig = make_subplots(
         rows=2,
@@ -378,27 +384,13 @@ def plot_moving_averages_analysis(df_stacked):
     return fig
 
 
-def plot_advanced_indicators(df_stacked):
+@memoize_figure(page="cashflow")
+def plot_advanced_indicators(df_stacked, indicators):
     """Các chỉ báo kỹ thuật nâng cao"""
-    df_indicators = df_stacked.copy()
-
-    # RSI tự tạo đơn giản
-    delta = df_indicators["close"].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df_indicators["RSI"] = 100 - (100 / (1 + rs))
-
-    # Bollinger Bands
-    df_indicators["BB_middle"] = df_indicators["close"].rolling(window=20).mean()
-    bb_std = df_indicators["close"].rolling(window=20).std()
-    df_indicators["BB_upper"] = df_indicators["BB_middle"] + (bb_std * 2)
-    df_indicators["BB_lower"] = df_indicators["BB_middle"] - (bb_std * 2)
-
-    # Money Flow Index (MFI) simplified
-    df_indicators["typical_price"] = df_indicators["close"]
-    df_indicators["money_flow"] = df_indicators["typical_price"] * df_indicators["BUY"]
-    df_indicators["MFI"] = df_indicators["money_flow"].rolling(window=14).mean()
+    # RSI (Wilder), Bollinger Bands và MFI (theo giá điển hình và khối lượng) đã tính sẵn
+    df_indicators = indicators.assign(date=df_stacked["date"], close=df_stacked["close"])
+    if "MFI" not in df_indicators:
+        df_indicators["MFI"] = np.nan
 
     fig = make_subplots(
         rows=4,
@@ -466,12 +458,15 @@ def plot_advanced_indicators(df_stacked):
         col=1,
     )
 
+    fig.add_hline(y=80, line_dash="dash", line_color="red", row=3, col=1)
+    fig.add_hline(y=20, line_dash="dash", line_color="green", row=3, col=1)
+
     # Volume Oscillator
-    df_indicators["volume_osc"] = df_indicators["BUY"] - abs(df_indicators["SELL"])
+    volume_osc = df_stacked["BUY"] - abs(df_stacked["SELL"])
     fig.add_trace(
         go.Bar(
             x=df_indicators["date"],
-            y=df_indicators["volume_osc"],
+            y=volume_osc,
             name="Volume Oscillator",
             marker_color="teal",
         ),
@@ -483,6 +478,86 @@ def plot_advanced_indicators(df_stacked):
     return fig
 
 
+@memoize_figure(page="cashflow")
+def plot_buy_sell_overview(df_stacked):
+    """Tỷ trọng BUY vs SELL chủ động và giá đóng cửa"""
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(x=df_stacked["date"], y=df_stacked["BUY"], name="BUY", marker_color="green")
+    )
+    fig.add_trace(
+        go.Bar(x=df_stacked["date"], y=df_stacked["SELL"], name="SELL", marker_color="red")
+    )
+
+    fig.add_trace(
+        go.Scatter(
+            x=df_stacked["date"],
+            y=df_stacked["close"],
+            name="Close Price",
+            yaxis="y2",
+            line=dict(color="blue"),
+        )
+    )
+
+    fig.update_layout(
+        barmode="relative",
+        title="Tỷ trọng BUY vs SELL",
+        yaxis=dict(title="Tỷ lệ giao dịch (%)", tickformat=".0%"),
+        yaxis2=dict(title="Close Price", overlaying="y", side="right"),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.25, xanchor="center", x=0.5),
+        height=500,
+    )
+    return fig
+
+
+@memoize_figure(page="cashflow")
+def plot_investor_groups(df_stacked):
+    """Tỷ trọng mua/bán của từng nhóm Shark/Wolf/Sheep"""
+    fig = go.Figure()
+    colors_buy = ["darkgreen", "limegreen", "yellowgreen"]
+    colors_sell = ["darkred", "orangered", "gold"]
+
+    for col, color in zip(["Shark buy", "Wolf buy", "Sheep buy"], colors_buy):
+        fig.add_trace(
+            go.Bar(x=df_stacked["date"], y=df_stacked[col], name=col, marker_color=color)
+        )
+
+    for col, color in zip(["Shark sell", "Wolf sell", "Sheep sell"], colors_sell):
+        fig.add_trace(
+            go.Bar(x=df_stacked["date"], y=df_stacked[col], name=col, marker_color=color)
+        )
+
+    fig.add_trace(
+        go.Scatter(
+            x=df_stacked["date"],
+            y=df_stacked["close"],
+            name="Close Price",
+            yaxis="y2",
+            line=dict(color="blue"),
+        )
+    )
+
+    fig.update_layout(
+        barmode="relative",
+        title="Chi tiết Shark/Wolf/Sheep",
+        yaxis=dict(title="Tỷ lệ giao dịch (%)", tickformat=".0%"),
+        yaxis2=dict(title="Close Price", overlaying="y", side="right"),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.25, xanchor="center", x=0.5),
+        height=500,
+    )
+    return fig
+
+
+@st.cache_data(ttl=3600)
+def get_indicators(stock, data_key, _df_stacked):
+    """Chỉ báo kỹ thuật của một mã, tính một lần cho mọi biểu đồ
+
+    `data_key` là dấu vết nội dung của `_df_stacked`, nên dữ liệu đổi (phiên cuối cập nhật,
+    khoảng ngày giá khác) là tính lại.
+    """
+    return compute_indicators(_df_stacked)
+
+
 # === Hàm xử lý chart với nhiều tab ===
 def plot_cashflow_analysis(df_price, stock, period):
     st.subheader("📊 Phân Tích Tỷ Lệ Mua Bán Chủ Động")
@@ -500,16 +575,17 @@ def plot_cashflow_analysis(df_price, stock, period):
 
     df_relative = pd.concat(results).reset_index(drop=True)
 
-    # Ghép lại với cột date
-    df_relative["date"] = pd.to_datetime(df["date"])
-    df_price["time"] = pd.to_datetime(df_price["time"])
-    df_stacked = df_relative.merge(
-        df_price[["time", "close"]], left_on="date", right_on="time", how="left"
-    )
+    # Ghép lại với cột date; OHLCV lấy theo phiên gần nhất (không sửa df_price)
+    df_relative["date"] = pd.to_datetime(df["date"]).to_numpy()
+    bars = [c for c in ("open", "high", "low", "close", "volume") if c in df_price.columns]
+    df_stacked = asof_align(
+        df_relative.sort_values("date"), [(df_price, bars, "time")], on="date", tolerance="3D"
+    ).reset_index(drop=True)
 
     # Gom nhóm BUY / SELL
     df_stacked["BUY"] = df_stacked[["Shark buy", "Wolf buy", "Sheep buy"]].sum(axis=1)
     df_stacked["SELL"] = df_stacked[["Shark sell", "Wolf sell", "Sheep sell"]].sum(axis=1)
+    indicators = get_indicators(stock, fingerprint(df_stacked), df_stacked)
 
     # --- Tabs mở rộng ---
     tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(
@@ -527,70 +603,13 @@ def plot_cashflow_analysis(df_price, stock, period):
 
     # --- Chart 1: BUY vs SELL ---
     with tab1:
-        fig1 = go.Figure()
-        fig1.add_trace(
-            go.Bar(x=df_stacked["date"], y=df_stacked["BUY"], name="BUY", marker_color="green")
-        )
-        fig1.add_trace(
-            go.Bar(x=df_stacked["date"], y=df_stacked["SELL"], name="SELL", marker_color="red")
-        )
-
-        fig1.add_trace(
-            go.Scatter(
-                x=df_stacked["date"],
-                y=df_stacked["close"],
-                name="Close Price",
-                yaxis="y2",
-                line=dict(color="blue"),
-            )
-        )
-
-        fig1.update_layout(
-            barmode="relative",
-            title="Tỷ trọng BUY vs SELL",
-            yaxis=dict(title="Tỷ lệ giao dịch (%)", tickformat=".0%"),
-            yaxis2=dict(title="Close Price", overlaying="y", side="right"),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.25, xanchor="center", x=0.5),
-            height=500,
-        )
-
-        st.plotly_chart(fig1, use_container_width=True)
+        fig1 = plot_buy_sell_overview(df_stacked)
+        st.plotly_chart(downsample_figure(fig1), use_container_width=True)
 
     # --- Chart 2: Shark/Wolf/Sheep ---
     with tab2:
-        fig2 = go.Figure()
-        colors_buy = ["darkgreen", "limegreen", "yellowgreen"]
-        colors_sell = ["darkred", "orangered", "gold"]
-
-        for col, color in zip(["Shark buy", "Wolf buy", "Sheep buy"], colors_buy):
-            fig2.add_trace(
-                go.Bar(x=df_stacked["date"], y=df_stacked[col], name=col, marker_color=color)
-            )
-
-        for col, color in zip(["Shark sell", "Wolf sell", "Sheep sell"], colors_sell):
-            fig2.add_trace(
-                go.Bar(x=df_stacked["date"], y=df_stacked[col], name=col, marker_color=color)
-            )
-
-        fig2.add_trace(
-            go.Scatter(
-                x=df_stacked["date"],
-                y=df_stacked["close"],
-                name="Close Price",
-                yaxis="y2",
-                line=dict(color="blue"),
-            )
-        )
-
-        fig2.update_layout(
-            barmode="relative",
-            title="Chi tiết Shark/Wolf/Sheep",
-            yaxis=dict(title="Tỷ lệ giao dịch (%)", tickformat=".0%"),
-            yaxis2=dict(title="Close Price", overlaying="y", side="right"),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.25, xanchor="center", x=0.5),
-            height=500,
-        )
-        st.plotly_chart(fig2, use_container_width=True)
+        fig2 = plot_investor_groups(df_stacked)
+        st.plotly_chart(downsample_figure(fig2), use_container_width=True)
 
         # Bảng thống kê nhanh
         top_shark = df_stacked.nlargest(5, "Shark buy")[["date", "Shark buy", "close"]]
@@ -605,7 +624,7 @@ def plot_cashflow_analysis(df_price, stock, period):
     # --- Tab 3: Volume-Price Analysis ---
     with tab3:
         fig3 = plot_volume_price_analysis(df_stacked)
-        st.plotly_chart(fig3, use_container_width=True)
+        st.plotly_chart(downsample_figure(fig3), use_container_width=True)
 
         # Thống kê tương quan
         correlation = df_stacked[["close", "BUY", "SELL"]].corr()
@@ -615,7 +634,7 @@ def plot_cashflow_analysis(df_price, stock, period):
     # --- Tab 4: Sentiment Heatmap ---
     with tab4:
         fig4 = plot_investor_sentiment_heatmap(df_stacked)
-        st.plotly_chart(fig4, use_container_width=True)
+        st.plotly_chart(downsample_figure(fig4), use_container_width=True)
 
         # Thông tin bổ sung
         st.write("**Giải thích màu sắc:**")
@@ -626,7 +645,7 @@ def plot_cashflow_analysis(df_price, stock, period):
     # --- Tab 5: Candlestick with Volume ---
     with tab5:
         fig5 = plot_candlestick_with_volume(df_stacked)
-        st.plotly_chart(fig5, use_container_width=True)
+        st.plotly_chart(downsample_figure(fig5), use_container_width=True)
 
     # --- Tab 6: Correlation Analysis ---
     with tab6:
@@ -644,13 +663,13 @@ def plot_cashflow_analysis(df_price, stock, period):
 
     # --- Tab 7: Moving Averages ---
     with tab7:
-        fig7 = plot_moving_averages_analysis(df_stacked)
-        st.plotly_chart(fig7, use_container_width=True)
+        fig7 = plot_moving_averages_analysis(df_stacked, indicators)
+        st.plotly_chart(downsample_figure(fig7), use_container_width=True)
 
     # --- Tab 8: Advanced Technical Indicators ---
     with tab8:
-        fig8 = plot_advanced_indicators(df_stacked)
-        st.plotly_chart(fig8, use_container_width=True)
+        fig8 = plot_advanced_indicators(df_stacked, indicators)
+        st.plotly_chart(downsample_figure(fig8), use_container_width=True)
 
     # --- Highlight sự kiện rule-based ---
     events = []
@@ -676,13 +695,13 @@ def plot_cashflow_analysis(df_price, stock, period):
     """
 
     try:
-        res = analysis_with_ai(df_stacked, prompt)
-        st.success(res)
+        analysis_with_ai(df_stacked, prompt)
     except Exception as e:
         st.error(f"Lỗi khi phân tích AI: {str(e)}")
         st.info("Có thể phân tích thủ công dựa trên các biểu đồ trên.")
 
 
+@st.cache_data(ttl=3600)
 def get_fund_data(start_date):
     api_url = (
         f"{API_URL_FUND}?q=reportDate:gte:{start_date}~ratioCode:IFC_HOLDING_COUNT_CR&size=1000"
@@ -700,6 +719,7 @@ def get_fund_data(start_date):
         return None
 
 
+@instrument()
 def fetch_cashflow_market(ticker, date=None):
     if date is None:
         date = datetime.now().strftime("%Y-%m-%d")
@@ -804,6 +824,7 @@ def fetch_and_plot_ownership(symbol):
 # === Thêm các hàm phân tích bổ sung ===
 
 
+@memoize_figure(page="cashflow")
 def plot_market_breadth_analysis(df_stacked):
     """Phân tích độ rộng thị trường và momentum"""
     df_breadth = df_stacked.copy()
@@ -930,14 +951,13 @@ def plot_market_breadth_analysis(df_stacked):
     return fig
 
 
-def plot_risk_analysis(df_stacked):
+@memoize_figure(page="cashflow")
+def plot_risk_analysis(df_stacked, indicators):
     """Phân tích rủi ro và volatility"""
-    df_risk = df_stacked.copy()
-
-    # Tính toán các chỉ số rủi ro
-    df_risk["daily_return"] = df_risk["close"].pct_change()
-    df_risk["volatility_10d"] = df_risk["daily_return"].rolling(window=10).std() * np.sqrt(252)
-    df_risk["volatility_20d"] = df_risk["daily_return"].rolling(window=20).std() * np.sqrt(252)
+    # Lợi nhuận ngày và volatility 10/20 phiên lấy từ bộ chỉ báo dùng chung
+    df_risk = df_stacked[["date", "close"]].join(
+        indicators[["daily_return", "volatility_10d", "volatility_20d"]]
+    )
 
     # VaR (Value at Risk) 95% và 99%
     df_risk["var_95"] = df_risk["daily_return"].rolling(window=20).quantile(0.05)
@@ -1031,9 +1051,10 @@ def plot_risk_analysis(df_stacked):
     return fig
 
 
-def plot_liquidity_analysis(df_stacked):
+@memoize_figure(page="cashflow")
+def plot_liquidity_analysis(df_stacked, indicators):
     """Phân tích thanh khoản thị trường"""
-    df_liquidity = df_stacked.copy()
+    df_liquidity = df_stacked[["date", "close", "BUY", "SELL"]].join(indicators["daily_return"])
 
     # Tính toán các chỉ số thanh khoản
     df_liquidity["total_value"] = df_liquidity["BUY"] + abs(df_liquidity["SELL"])
@@ -1043,15 +1064,12 @@ def plot_liquidity_analysis(df_stacked):
     )
 
     # Amihud illiquidity measure (simplified)
-    df_liquidity["price_impact"] = (
-        abs(df_liquidity["close"].pct_change()) / df_liquidity["total_value"]
-    )
+    df_liquidity["price_impact"] = abs(df_liquidity["daily_return"]) / df_liquidity["total_value"]
     df_liquidity["amihud_illiquidity"] = df_liquidity["price_impact"].rolling(window=5).mean()
 
     # Market efficiency measure
-    df_liquidity["price_reversal"] = df_liquidity["close"].pct_change() * df_liquidity[
-        "close"
-    ].pct_change().shift(1)
+    returns = df_liquidity["daily_return"]
+    df_liquidity["price_reversal"] = returns * returns.shift(1)
 
     fig = make_subplots(
         rows=2,
@@ -1117,9 +1135,13 @@ def plot_liquidity_analysis(df_stacked):
     return fig
 
 
-def plot_smart_money_flow(df_stacked):
+@memoize_figure(page="cashflow")
+def plot_smart_money_flow(df_stacked, indicators):
     """Phân tích dòng tiền thông minh"""
-    df_smart = df_stacked.copy()
+    df_smart = df_stacked[
+        ["date", "close", "BUY", "SELL", "Shark buy", "Shark sell", "Wolf buy", "Wolf sell"]
+        + ["Sheep buy", "Sheep sell"]
+    ].join(indicators["MA_10"].rename("price_ma"))
 
     # Smart Money Index (SMI)
     df_smart["smart_money"] = df_smart["Shark buy"] - abs(df_smart["Shark sell"])
@@ -1134,7 +1156,6 @@ def plot_smart_money_flow(df_stacked):
     )
 
     # Smart Money Divergence
-    df_smart["price_ma"] = df_smart["close"].rolling(window=10).mean()
     df_smart["smart_money_ma"] = df_smart["smart_money"].rolling(window=10).mean()
 
     # Tính toán divergence
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Giới hạn tổng dung lượng JSON của các figure được giữ lại (LRU)
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _update_hash(sha, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        sha.update(type(value).__name__.encode())
+        if isinstance(value, pd.DataFrame):
+            sha.update(repr(list(value.columns)).encode())
+            sha.update(repr(value.dtypes.tolist()).encode())
+        else:
+            sha.update(repr((value.name, value.dtype)).encode())
+        try:
+            sha.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        except TypeError:
+            # Ô chứa list/dict không băm được theo cột
+            sha.update(value.to_json(date_format="iso").encode())
+    elif isinstance(value, np.ndarray):
+        sha.update(repr((value.dtype, value.shape)).encode())
+        sha.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        sha.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update_hash(sha, item)
+    elif isinstance(value, dict):
+        sha.update(f"dict{len(value)}".encode())
+        for key in sorted(value, key=repr):
+            _update_hash(sha, key)
+            _update_hash(sha, value[key])
+    else:
+        sha.update(repr(value).encode())
+
+
+def fingerprint(*values):
+    """Dấu vết nội dung của dữ liệu đầu vào và tham số vẽ"""
+    sha = hashlib.sha256()
+    for value in values:
+        _update_hash(sha, value)
+    return sha.hexdigest()
+
+
+class FigureCache:
+    """LRU các figure đã dựng, lưu dạng JSON, kèm thống kê hit/miss theo trang"""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "build_seconds": 0.0, "saved_seconds": 0.0}
+        )
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, figure_json, build_seconds):
+        size = len(figure_json)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key)[0])
+            self._entries[key] = (figure_json, build_seconds)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_or_build(self, key, page, build):
+        entry = self._get(key)
+        if entry is not None:
+            figure_json, build_seconds = entry
+            started = time.perf_counter()
+            fig = pio.from_json(figure_json)
+            with self._lock:
+                stats = self._stats[page]
+                stats["hits"] += 1
+                stats["saved_seconds"] += build_seconds - (time.perf_counter() - started)
+            return fig
+
+        started = time.perf_counter()
+        fig = build()
+        build_seconds = time.perf_counter() - started
+        with self._lock:
+            stats = self._stats[page]
+            stats["misses"] += 1
+            stats["build_seconds"] += build_seconds
+        if fig is not None:
+            self._put(key, fig.to_json(), build_seconds)
+        return fig
+
+    def stats(self):
+        """Tỷ lệ hit và thời gian dựng tiết kiệm được theo từng trang"""
+        with self._lock:
+            rows = [{"page": page, **stats} for page, stats in self._stats.items()]
+            entries, size = len(self._entries), self._bytes
+        df = pd.DataFrame(
+            rows, columns=["page", "hits", "misses", "build_seconds", "saved_seconds"]
+        )
+        df["hit_rate"] = df["hits"] / (df["hits"] + df["misses"]).replace(0, np.nan)
+        df.attrs.update(entries=entries, size_bytes=size)
+        return df
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats.clear()
+
+
+figure_cache = FigureCache()
+
+
+def memoize_figure(page=None):
+    """Decorator cho hàm dựng figure thuần (không gọi st.*): dùng lại figure khi dữ liệu
+    và tham số không đổi giữa các lần chạy lại của Streamlit"""
+
+    def decorator(builder):
+        name = f"{builder.__module__}.{builder.__qualname__}"
+
+        @wraps(builder)
+        def wrapper(*args, **kwargs):
+            key = fingerprint(name, args, kwargs)
+            return figure_cache.get_or_build(
+                key, page or builder.__module__, lambda: builder(*args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    return figure_cache.stats()
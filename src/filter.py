@@ -13,17 +13,32 @@ from plotly.subplots import make_subplots
 from streamlit_tags import st_tags
 from vnstock import Vnstock
 
-from src.config import INTERIM_DATA_DIR, RAW_DATA_DIR
+from src.foreign_store import ownership_trend
+from src.instrumentation import instrument, log_error
 from src.market_overview import get_list_stock
+from src.modeling.predict import LATEST_PREDICTIONS_PATH, read_latest_predictions
 from src.optimize_portfolio import get_port, get_port_price
-from src.plots import foreigner_trading_stock, get_firm_pricing, get_stock_price
+from src.plots import fetch_firm_pricing, get_stock_price
 from src.quant_profile import calculate_extended_metrics
+from src.screener import BASE_FIELDS, load_screener, screen
+from src.universe import UniverseIndex
 
 HEADERS = {
     "Upgrade-Insecure-Requests": "1",
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0",
 }
 
+# Nhóm vốn hóa (VND) và dòng tiền khối ngoại 20 ngày (VND) dùng làm bitmap dựng sẵn
+MARKET_CAP_BUCKETS = {
+    "Vốn hóa lớn": (1e13, None),
+    "Vốn hóa vừa": (1e12, 1e13),
+    "Vốn hóa nhỏ": (None, 1e12),
+}
+FOREIGN_FLOW_BUCKETS = {
+    "Khối ngoại mua ròng": (0, None),
+    "Khối ngoại bán ròng": (None, 0),
+}
+
 
 def fetch_api_data(url, payload, headers):
     """Fetch data from API and return as a DataFrame."""
@@ -37,57 +52,63 @@ def fetch_api_data(url, payload, headers):
 
 def get_stock_data_from_api(market_cap_min, net_bought_val_avg_20d_min):
     """Retrieve stock data based on market cap and net bought value."""
+    filters = [
+        {"dbFilterCode": "marketCapCr", "condition": "GT", "value": market_cap_min},
+        {
+            "dbFilterCode": "netForBoughtValAvgCr20d",
+            "condition": "GT",
+            "value": net_bought_val_avg_20d_min,
+        },
+    ]
+
+    # Lọc trên bảng screener cục bộ, chỉ gọi API khi chưa đồng bộ được
+    result = screen(filters, fields=BASE_FIELDS)
+    if result is not None:
+        return result
+
     url = "https://screener-api.vndirect.com.vn/search_data"
     payload = {
-        "fields": "code,companyNameVi,floor,priceCr,quarterReportDate,annualReportDate,marketCapCr,netForBoughtValAvgCr20d",
-        "filters": [
-            {"dbFilterCode": "marketCapCr", "condition": "GT", "value": market_cap_min},
-            {
-                "dbFilterCode": "netForBoughtValAvgCr20d",
-                "condition": "GT",
-                "value": net_bought_val_avg_20d_min,
-            },
-        ],
+        "fields": ",".join(BASE_FIELDS),
+        "filters": filters,
         "sort": "code:asc",
     }
     return fetch_api_data(url, payload, {"Content-Type": "application/json"})
 
 
+@st.cache_resource(ttl=3600)
+def get_universe_index():
+    """Chỉ mục bitmap của vũ trụ cổ phiếu, dựng một lần mỗi giờ thay vì đọc CSV mỗi lần rerun"""
+    universe = UniverseIndex.from_files()
+    screener = load_screener()
+    if screener is not None and not screener.empty:
+        universe.add_numeric(
+            "market_cap", screener["code"], screener["marketCapCr"], MARKET_CAP_BUCKETS
+        )
+        universe.add_numeric(
+            "net_foreign_buy_20d",
+            screener["code"],
+            screener["netForBoughtValAvgCr20d"],
+            FOREIGN_FLOW_BUCKETS,
+        )
+    return universe
+
+
 def filter_components():
     """Filter stocks based on user input."""
     st.subheader("🔍 Lọc cổ phiếu theo tiêu chí")
 
-    stock_sets = []  # Mỗi tiêu chí lọc tạo ra một tập hợp mã cổ phiếu
+    universe = get_universe_index()
+    stock_bitmaps = []  # Mỗi tiêu chí lọc tạo ra một bitmap trên vũ trụ cổ phiếu
 
     # Lọc theo sàn giao dịch
-    # exchange = st.selectbox(
-    #     "Chọn sàn giao dịch",
-    #     options=[
-    #         # "HOSE",
-    #         # "HNX",
-    #         # "UPCOM",
-    #         "VN30",
-    #         "VN100",
-    #         "HNX30",
-    #         "VNMidCap",
-    #         "VNSmallCap",
-    #         "VNAllShare",
-    #         "HNXCon",
-    #         "HNXFin",
-    #         "HNXLCap",
-    #         "HNXMSCap",
-    #         "HNXMan",
-    #     ],
-    #     index=0,
-    # )
-    stock_by_exchange = pd.read_csv(RAW_DATA_DIR / "list_stock.csv")["symbol"].tolist()
-
-    stock_sets.append(set(stock_by_exchange))
+    exchanges = st.multiselect(
+        "Chọn sàn giao dịch", options=["HSX", "HNX", "UPCOM"], default=["HSX", "HNX", "UPCOM"]
+    )
+    stock_bitmaps.append(universe.any_of("exchange", exchanges))
+
     # Lọc theo ngành nghề
     if st.checkbox("Ngành nghề", value=True):
-        stock_by_industry = filter_stocks_by_industry()
-        if stock_by_industry:
-            stock_sets.append(set(stock_by_industry))
+        stock_bitmaps.append(filter_stocks_by_industry(universe))
     # Lọc theo vốn hóa và GTNN
     if st.checkbox("Lọc cổ phiếu theo vốn hóa và GTNN mua ròng", value=True):
         st.info(
@@ -104,17 +125,52 @@ def filter_components():
         market_cap_min = market_cap * 1e12
         net_bought_val_avg_20d_min = net_bought_val * 1e9
 
-        stock_by_filter = get_stock_data_from_api(market_cap_min, net_bought_val_avg_20d_min)
-
-        if stock_by_filter is not None and not stock_by_filter.empty:
-            stock_sets.append(set(stock_by_filter["code"].tolist()))
-
-    # Kết hợp kết quả lọc
-    if stock_sets:
-        filtered_stocks = set.intersection(*stock_sets)  # lấy giao của tất cả tập con
-    else:
-        filtered_stocks = set()
-    return list(filtered_stocks)
+        if universe.has_numeric("market_cap"):
+            stock_bitmaps.append(universe.greater_than("market_cap", market_cap_min))
+            stock_bitmaps.append(
+                universe.greater_than("net_foreign_buy_20d", net_bought_val_avg_20d_min)
+            )
+            # Nhóm dựng sẵn: chỉ lọc khi bỏ chọn bớt nhóm
+            for name, buckets, label in (
+                ("market_cap", MARKET_CAP_BUCKETS, "Nhóm vốn hóa"),
+                ("net_foreign_buy_20d", FOREIGN_FLOW_BUCKETS, "Dòng tiền khối ngoại 20 ngày"),
+            ):
+                selected = st.multiselect(label, options=list(buckets), default=list(buckets))
+                if len(selected) < len(buckets):
+                    stock_bitmaps.append(universe.any_of(name, selected))
+        else:
+            stock_by_filter = get_stock_data_from_api(market_cap_min, net_bought_val_avg_20d_min)
+            if stock_by_filter is not None and not stock_by_filter.empty:
+                stock_bitmaps.append(universe.from_symbols(stock_by_filter["code"]))
+
+    # Lọc theo chỉ số định giá, hiệu quả từ bảng screener cục bộ
+    screener = load_screener()
+    extra_fields = {
+        "pe": "P/E",
+        "pb": "P/B",
+        "roae": "ROE (%)",
+        "dividendYield": "Tỷ suất cổ tức (%)",
+    }
+    available = {k: v for k, v in extra_fields.items() if screener is not None and k in screener}
+    if available and st.checkbox("Lọc theo chỉ số tài chính", value=False):
+        filters = []
+        for field, label in available.items():
+            values = screener[field].dropna()
+            if values.empty:
+                continue
+            low, high = float(values.quantile(0.01)), float(values.quantile(0.99))
+            if low < high:
+                selected = st.slider(label, low, high, (low, high))
+                # Khoảng mặc định thì không lọc, tránh loại mã ở hai đuôi hoặc thiếu giá trị
+                if selected != (low, high):
+                    filters.append(
+                        {"dbFilterCode": field, "condition": "BETWEEN", "value": selected}
+                    )
+        if filters:
+            stock_bitmaps.append(universe.from_symbols(screen(filters, fields=["code"])["code"]))
+
+    # Kết hợp kết quả lọc: giao của tất cả bitmap
+    return universe.to_symbols(universe.combine(*stock_bitmaps))
 
 
 def filter_by_ownerratio(stocks, end_date):
@@ -125,23 +181,14 @@ def filter_by_ownerratio(stocks, end_date):
 
     def process_symbol(symbol):
         try:
-            foreign = foreigner_trading_stock(
-                symbol, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
-            ).sort_index(ascending=False)
-            foreign.ffill(inplace=True)
-
-            if foreign is not None and not foreign.empty:
-                curr = foreign["currentRoom"].iloc[-1]
-                total = foreign["totalRoom"].iloc[-1]
-                if total > 0:
-                    ownership_ratio = round((total - curr) / total * 100, 2)
-                    trend_series = (
-                        (foreign["totalRoom"] - foreign["currentRoom"])
-                        / foreign["totalRoom"]
-                        * 100
-                    ).fillna(0)
-                    trend = [round(val, 2) for val in trend_series.tolist()]
-                    return symbol, {"Ownership Ratio": ownership_ratio, "lines": trend}
+            # Tỷ lệ sở hữu đã tính sẵn trong kho khối ngoại, chỉ cần cắt theo khoảng ngày
+            trend = ownership_trend(symbol, start_date, end_date)
+            trend = trend[~np.isnan(trend)]
+            if trend.size:
+                return symbol, {
+                    "Ownership Ratio": round(float(trend[-1]), 2),
+                    "lines": np.round(trend, 2).tolist(),
+                }
         except Exception as e:
             st.error(f"Lỗi xử lý dữ liệu cho mã {symbol}: {e}")
         return None
@@ -175,79 +222,171 @@ def filter_by_ownerratio(stocks, end_date):
     return df_result
 
 
-def filter_stocks_by_industry():
+def filter_stocks_by_industry(universe):
     # Lấy dữ liệu ngành từ API
     # stock = Vnstock().stock("ACB", source="VCI")
     # df = stock.listing.symbols_by_industries()
     # df.to_csv(INTERIM_DATA_DIR / "symbols_by_industries.csv", index=False)
-    df = pd.read_csv(INTERIM_DATA_DIR / "symbols_by_industries.csv")
-    # UI chọn ngành cấp 1
-    nganh1 = st.selectbox("Chọn ngành cấp 1", sorted(df["icb_name2"].unique()))
-    df_nganh1 = df[df["icb_name2"] == nganh1]
 
-    # Hiện danh sách cổ phiếu ngay khi chỉ chọn ngành cấp 1
-    filtered = df_nganh1
+    # UI chọn ngành cấp 1
+    nganh1 = st.selectbox("Chọn ngành cấp 1", universe.values("icb_name2"))
+    filtered = universe.mask("icb_name2", nganh1)
 
     # UI chọn ngành cấp 2 (tuỳ chọn)
     nganh2 = st.selectbox(
         "Chọn ngành cấp 2 (tùy chọn)",
-        options=["(Tất cả)"] + sorted(df_nganh1["icb_name3"].unique()),
+        options=["(Tất cả)"] + universe.values("icb_name3", within=filtered),
     )
 
     if nganh2 != "(Tất cả)":
-        df_nganh2 = df_nganh1[df_nganh1["icb_name3"] == nganh2]
-        filtered = df_nganh2
+        filtered = universe.combine(filtered, universe.mask("icb_name3", nganh2))
 
         # UI chọn ngành cấp 3 (tuỳ chọn)
         nganh3 = st.selectbox(
             "Chọn ngành cấp 3 (tùy chọn)",
-            options=["(Tất cả)"] + sorted(df_nganh2["icb_name4"].unique()),
+            options=["(Tất cả)"] + universe.values("icb_name4", within=filtered),
         )
 
         if nganh3 != "(Tất cả)":
-            filtered = df_nganh2[df_nganh2["icb_name4"] == nganh3]
+            filtered = universe.combine(filtered, universe.mask("icb_name4", nganh3))
+
+    return filtered
+
+
+def get_latest_closes(stocks, end_date):
+    """Giá đóng cửa gần nhất (nghìn đồng) cho cả danh sách mã
+
+    Nếu ngày kết thúc là hôm nay thì lấy một lần từ bảng screener cục bộ; các mã còn thiếu (hoặc
+    ngày kết thúc trong quá khứ) mới phải tải lịch sử giá từng mã.
+    """
+    closes = pd.Series(np.nan, index=pd.Index(list(dict.fromkeys(stocks)), dtype=object))
+    screener = load_screener()
+    is_recent = pd.Timestamp(end_date).date() >= datetime.today().date() - timedelta(days=1)
+    if screener is not None and is_recent:
+        snapshot = screener.set_index("code")["priceCr"] / 1000
+        closes.update(snapshot.reindex(closes.index))
+    return closes
 
-    return filtered["symbol"].tolist()
+
+def _latest_close(stock, end_date):
+    df_price = get_stock_price(
+        stock,
+        (end_date - timedelta(days=3)).strftime("%Y-%m-%d"),
+        end_date.strftime("%Y-%m-%d"),
+    )
+    return df_price["close"].iloc[-1] if not df_price.empty else np.nan
+
+
+def _target_price(stock, start_date):
+    df_pricing = fetch_firm_pricing(stock, start_date)
+    if df_pricing.empty:
+        return np.nan
+    return df_pricing["targetPrice"].astype(float).mean()
+
+
+def safety_margin_table(target_prices, close_prices):
+    """Biên an toàn tính trên cả cột: (giá mục tiêu - giá đóng cửa) / giá mục tiêu"""
+    df_safety = pd.DataFrame({"Target Price": target_prices, "Close Price": close_prices})
+    df_safety = df_safety.dropna()
+    df_safety = df_safety[df_safety["Target Price"] > 0]
+    df_safety["Safety Margin"] = (
+        (df_safety["Target Price"] - df_safety["Close Price"]) / df_safety["Target Price"] * 100
+    ).round(2)
+    df_safety[["Target Price", "Close Price"]] *= 1000
+    return (
+        df_safety.rename_axis("Stock")
+        .reset_index()
+        .sort_values(by="Safety Margin", ascending=False)
+    )
+
+
+def _show_safety_table(placeholder, df_safety):
+    placeholder.dataframe(
+        df_safety.style.format(
+            {"Target Price": "{:,.0f}", "Close Price": "{:,.0f}", "Safety Margin": "{:.2f}"}
+        ).background_gradient(
+            subset=["Safety Margin"],
+            cmap="RdYlGn",
+            vmin=-50,
+            vmax=50,
+        ),
+        use_container_width=True,
+    )
 
 
-def filter_by_pricing_stock(stocks, end_date):
+def filter_by_pricing_stock(stocks, end_date, max_workers=8):
     """Filter stocks based on pricing and safety margin."""
-    start_date = end_date - timedelta(days=365)
-    data = []
-
-    for stock in stocks:
-        df_pricing = get_firm_pricing(stock, start_date.strftime("%Y-%m-%d"))
-        if df_pricing is not None and not df_pricing.empty:
-            target_price = df_pricing["targetPrice"].astype(float).mean()
-            close_price = get_stock_price(
-                stock,
-                (end_date - timedelta(days=3)).strftime("%Y-%m-%d"),
-                end_date.strftime("%Y-%m-%d"),
-            )
-            if not close_price.empty:
-                close_price_value = close_price["close"].iloc[-1]
-                safety_margin = (target_price - close_price_value) / target_price * 100
-                data.append(
-                    {
-                        "Stock": stock,
-                        "Target Price": f"{target_price * 1000:,.0f}",
-                        "Close Price": f"{close_price_value * 1000:,.0f}",
-                        "Safety Margin": round(safety_margin, 2),
-                    }
-                )
-    if data:
-        df_safety = pd.DataFrame(data).sort_values(by="Safety Margin", ascending=False)
-        st.dataframe(
-            df_safety.style.background_gradient(
-                subset=["Safety Margin"],
-                cmap="RdYlGn",
-                vmin=-50,
-                vmax=50,
-            ),
-            use_container_width=True,
+    start_date = (end_date - timedelta(days=365)).strftime("%Y-%m-%d")
+    closes = get_latest_closes(stocks, end_date)
+    targets = pd.Series(np.nan, index=closes.index, dtype=float)
+
+    placeholder = st.empty()
+    progress = st.progress(0, text="Đang tải giá mục tiêu...")
+    total = len(closes)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_target_price, stock, start_date): stock for stock in closes.index
+        }
+        futures.update(
+            {
+                executor.submit(_latest_close, stock, end_date): (stock, "close")
+                for stock in closes.index[closes.isna()]
+            }
         )
+        done_targets = 0
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                value = future.result()
+            except Exception as e:
+                log_error(f"Lỗi khi lấy giá cho mã {key}", e)
+                value = np.nan
+            if isinstance(key, tuple):
+                closes[key[0]] = value
+                continue
+
+            targets[key] = value
+            done_targets += 1
+            progress.progress(done_targets / total, text=f"Đã tải {done_targets}/{total} mã")
+            # Hiển thị dần các dòng đã có đủ giá mục tiêu và giá đóng cửa
+            if done_targets % 5 == 0 or done_targets == total:
+                df_safety = safety_margin_table(targets, closes)
+                if not df_safety.empty:
+                    _show_safety_table(placeholder, df_safety)
+    progress.empty()
+
+    df_safety = safety_margin_table(targets, closes)
+    if not df_safety.empty:
+        _show_safety_table(placeholder, df_safety)
     else:
-        st.warning("No pricing data available.")
+        placeholder.warning("No pricing data available.")
+
+
+@st.cache_data(ttl=3600)
+def get_foreign_buy_predictions(version):
+    """Bảng xác suất mới nhất; `version` là mtime của file để cache đổi khi chấm điểm lại"""
+    return read_latest_predictions()
+
+
+def filter_by_ml_prediction(stocks, top_n=20):
+    """Cổ phiếu có xác suất tăng ≥5% sau 5 phiên cao nhất theo mô hình khối ngoại."""
+    if not LATEST_PREDICTIONS_PATH.exists():
+        st.warning("Chưa có kết quả chấm điểm. Chạy `python -m src.modeling.predict`.")
+        return None
+
+    predictions = get_foreign_buy_predictions(LATEST_PREDICTIONS_PATH.stat().st_mtime_ns)
+    if stocks:
+        predictions = predictions[predictions["symbol"].isin(stocks)]
+    if predictions.empty:
+        st.info("Không có mã nào trong danh sách đã chọn được mô hình chấm điểm.")
+        return predictions
+    st.caption(f"Phiên chấm điểm gần nhất: {predictions['time'].max():%d/%m/%Y}")
+    st.dataframe(
+        predictions.head(top_n).style.format({"close": "{:,.0f}", "predict_prob": "{:.2%}"}),
+        use_container_width=True,
+        hide_index=True,
+    )
+    return predictions
 
 
 def plot_risk_metrics_radar(metrics_df):
@@ -352,6 +491,7 @@ def plot_risk_metrics_radar(metrics_df):
 
 
 # === Main analyzer ===
+@instrument()
 def run_quant_analyzer(stocks, start_date, end_date, risk_profile="Cân bằng"):
 
     weights = get_risk_weights(risk_profile)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import requests
+
+from src.config import EXTERNAL_DATA_DIR
+from src.daily_store import DailyStore
+
+FOREIGN_DIR = EXTERNAL_DATA_DIR / "foreign"
+FOREIGN_URL = "https://api-finfo.vndirect.com.vn/v4/foreigns"
+HEADERS = {
+    "Upgrade-Insecure-Requests": "1",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0",
+}
+
+PAGE_SIZE = 500
+COLUMNS = [
+    "time",
+    "buyVol",
+    "sellVol",
+    "netVol",
+    "buyVal",
+    "sellVal",
+    "netVal",
+    "currentRoom",
+    "totalRoom",
+    "ownership_ratio",
+]
+
+
+def fetch_foreign(stock, start, end, page_size=PAGE_SIZE, timeout=10):
+    """Tải giao dịch khối ngoại của một mã trong [start, end], lấy đủ mọi trang"""
+    frames, page, total_pages = [], 1, 1
+    while page <= total_pages:
+        params = {
+            "sort": "tradingDate",
+            "q": f"code:{stock}~tradingDate:gte:{start:%Y-%m-%d}~tradingDate:lte:{end:%Y-%m-%d}",
+            "size": page_size,
+            "page": page,
+        }
+        res = requests.get(FOREIGN_URL, params=params, headers=HEADERS, timeout=timeout)
+        res.raise_for_status()
+        body = res.json()
+        frames.append(pd.DataFrame(body.get("data", [])))
+        total_pages = body.get("totalPages") or 1
+        page += 1
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    return _normalize(df)
+
+
+def _normalize(df):
+    df = df.rename(columns={"tradingDate": "time"})
+    df["time"] = pd.to_datetime(df["time"])
+    numeric = [c for c in COLUMNS if c in df.columns and c != "time"]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce")
+    for column in COLUMNS:
+        if column not in df.columns:
+            df[column] = np.nan
+    # Tỷ lệ sở hữu (%) tính sẵn một lần khi ghi
+    total_room = df["totalRoom"].replace(0, np.nan)
+    df["ownership_ratio"] = (total_room - df["currentRoom"]) / total_room * 100
+    return df[COLUMNS]
+
+
+store = DailyStore(FOREIGN_DIR, fetch_foreign, COLUMNS, "dữ liệu khối ngoại")
+
+
+def sync_foreign(stock, start=None, force=False):
+    """Backfill lần đầu rồi chỉ tải các phiên sau ngày cuối đã lưu; True nếu có dữ liệu mới"""
+    return store.sync(stock, start=start, force=force)
+
+
+def read_foreign(stock):
+    """Toàn bộ dữ liệu khối ngoại đã lưu của một mã"""
+    return store.read(stock)
+
+
+def load_foreign(stock, start, end):
+    """Giao dịch và sở hữu khối ngoại của một mã trong [start, end], sắp xếp theo ngày tăng dần"""
+    return store.load(stock, start, end)
+
+
+def ownership_trend(stock, start, end):
+    """Tỷ lệ sở hữu nước ngoài (%) dạng mảng theo ngày, điền tiếp các phiên thiếu room"""
+    foreign = load_foreign(stock, start, end)
+    return foreign["ownership_ratio"].ffill().to_numpy(dtype=float)
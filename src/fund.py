@@ -13,6 +13,22 @@ from PIL import Image
 from streamlit_option_menu import option_menu
 from vnstock.explorer.fmarket.fund import Fund
 
+from src.figure_cache import memoize_figure
+from src.fund_similarity import compute_fund_similarity, most_similar_funds
+from src.fund_store import fetch_fund_detail, nav_date_column, sync_fund_snapshots
+from src.holdings_index import HoldingsIndex, load_holdings_index
+from src.instrumentation import cache_miss, instrument, log_error
+from src.nav_store import (
+    TRADING_DAYS,
+    fund_id_column,
+    fund_performance,
+    load_nav_history,
+    nav_matrix,
+    sync_nav_history,
+)
+from src.plots import get_stock_price
+from src.sections import section
+
 fund = Fund()
 
 
@@ -54,18 +70,54 @@ def get_fund_list():
 def get_fund_detail(fund_code):
     """Lấy thông tin chi tiết của quỹ từ API"""
     try:
-        url = f"https://api.fmarket.vn/home/product/{fund_code}"
-        response = requests.get(url, verify=False)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Lỗi khi lấy thông tin quỹ {fund_code}: {response.status_code}")
-            return {}
+        return fetch_fund_detail(fund_code)
+    except requests.HTTPError as e:
+        st.error(f"Lỗi khi lấy thông tin quỹ {fund_code}: {e.response.status_code}")
+        return {}
     except Exception as e:
         st.error(f"Không thể kết nối đến API: {str(e)}")
         return {}
 
 
+def get_fund_nav_history(fund_code, product_id):
+    """Lịch sử NAV của một quỹ từ kho NAV, chỉ tải phần còn thiếu"""
+    sync_nav_history({fund_code: product_id})
+    return load_nav_history([fund_code])[["date", "nav_per_unit"]].reset_index(drop=True)
+
+
+@instrument("get_funds_performance", cached=True)
+@st.cache_data(ttl=3600)
+@cache_miss
+def get_funds_performance(funds_df, with_progress=False):
+    """Cập nhật NAV cho tất cả quỹ và tính hiệu suất, rủi ro cùng lúc trên ma trận ngày x quỹ"""
+    product_ids = dict(zip(funds_df["short_name"], funds_df[fund_id_column(funds_df)]))
+
+    progress = st.progress(0) if with_progress else None
+
+    def on_progress(done, total, fund_code):
+        if progress:
+            progress.progress(done / total)
+
+    failed_funds = sync_nav_history(product_ids, on_progress=on_progress)
+    if progress:
+        progress.empty()
+
+    matrix = nav_matrix(load_nav_history(list(product_ids)))
+    if matrix.empty:
+        return pd.DataFrame(), matrix, failed_funds
+
+    try:
+        start_date = (matrix.index[-1] - timedelta(days=400)).strftime("%Y-%m-%d")
+        end_date = matrix.index[-1].strftime("%Y-%m-%d")
+        df_index = get_stock_price("VNINDEX", start_date, end_date)
+        benchmark = df_index.set_index("time")["close"]
+    except Exception as e:
+        log_error("Không lấy được dữ liệu VNINDEX", e)
+        benchmark = None
+
+    return fund_performance(matrix, benchmark), matrix, failed_funds
+
+
 @st.cache_data(ttl=3600)
 def process_fund_data(fund_detail):
     """Xử lý dữ liệu quỹ thành các DataFrame riêng biệt"""
@@ -85,7 +137,7 @@ def process_fund_data(fund_detail):
         asset_df = pd.DataFrame(data.get("productAssetHoldingList", []))
 
         # Hiệu suất NAV
-        nav_df = pd.DataFrame(fund.details.nav_report(data.get("shortName")))
+        nav_df = get_fund_nav_history(data.get("shortName"), data.get("id"))
 
         # Thông tin tổng quan
 
@@ -95,74 +147,59 @@ def process_fund_data(fund_detail):
         return None, None, None, None, None
 
 
+def _attach_fund_info(df, funds_df, with_nav_date=False):
+    """Gắn thông tin quỹ hiện tại (tên, loại, NAV, AUM) vào bảng snapshot"""
+    if df.empty:
+        return pd.DataFrame()
+    info = pd.DataFrame(
+        {
+            "fund_code": funds_df["short_name"],
+            "fund_name": funds_df["name"],
+            "fund_type": funds_df["fund_type"],
+            "fund_nav": funds_df["nav"],
+            "fund_aum": funds_df["aum"] if "aum" in funds_df.columns else None,
+        }
+    )
+    if with_nav_date:
+        info["nav_date"] = funds_df[nav_date_column(funds_df)]
+    return df.merge(info, on="fund_code", how="inner")
+
+
+def get_holdings_index(holdings_combined):
+    """Chỉ mục ngược đã lưu; tạo tạm từ dữ liệu hiện có nếu chưa có file"""
+    return load_holdings_index() or HoldingsIndex.from_holdings(holdings_combined)
+
+
+@st.cache_data(ttl=3600)
+def get_fund_similarity(postings):
+    """Ma trận tương đồng giữa các quỹ, lưu cache theo phiên bản snapshot"""
+    return compute_fund_similarity(postings)
+
+
+@instrument("get_all_funds_data", cached=True)
 @st.cache_data(ttl=3600)
+@cache_miss
 def get_all_funds_data(funds_df, fund_type=None, with_progress=False):
-    """Lấy dữ liệu của tất cả các quỹ với hỗ trợ hiển thị tiến trình và timeout cho mỗi request"""
+    """Lấy dữ liệu của tất cả các quỹ, chỉ tải lại các quỹ có ngày NAV mới"""
 
     # Lọc quỹ theo loại nếu cần
     if fund_type and fund_type != "Tất cả":
         funds_df = funds_df[funds_df["fund_type"] == fund_type]
 
-    all_holdings = []
-    all_industries = []
-    all_assets = []
-
-    total_funds = len(funds_df)
-    failed_funds = []
-
-    if total_funds == 0:
+    if len(funds_df) == 0:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), []
 
     # Tạo thanh tiến trình nếu được yêu cầu
     progress = st.progress(0) if with_progress else None
     status_text = st.empty() if with_progress else None
 
-    for i, (_, fund_row) in enumerate(funds_df.iterrows()):
-        fund_code = fund_row["short_name"]
-        try:
-            if status_text:
-                status_text.text(f"Đang xử lý quỹ {i+1}/{total_funds}: {fund_code}")
-
-            # Gọi API với timeout
-            fund_detail = get_fund_detail(fund_code)
-            holdings_df, industry_df, asset_df, nav_df = process_fund_data(fund_detail)
-
-            # Xử lý danh mục cổ phiếu
-            if holdings_df is not None and not holdings_df.empty:
-                holdings_df["fund_code"] = fund_code
-                holdings_df["fund_name"] = fund_row["name"]
-                holdings_df["fund_type"] = fund_row["fund_type"]
-                # Thêm thông tin NAV của quỹ
-                holdings_df["fund_nav"] = fund_row["nav"]
-                holdings_df["fund_aum"] = fund_row.get("aum", None)
-                holdings_df["nav_date"] = fund_row.get("nav_date", None)
-                all_holdings.append(holdings_df)
-
-            # Xử lý phân bổ ngành
-            if industry_df is not None and not industry_df.empty:
-                industry_df["fund_code"] = fund_code
-                industry_df["fund_name"] = fund_row["name"]
-                industry_df["fund_type"] = fund_row["fund_type"]
-                industry_df["fund_nav"] = fund_row["nav"]
-                industry_df["fund_aum"] = fund_row.get("aum", None)
-                all_industries.append(industry_df)
-
-            # Xử lý phân bổ tài sản
-            if asset_df is not None and not asset_df.empty:
-                asset_df["fund_code"] = fund_code
-                asset_df["fund_name"] = fund_row["name"]
-                asset_df["fund_type"] = fund_row["fund_type"]
-                asset_df["fund_nav"] = fund_row["nav"]
-                asset_df["fund_aum"] = fund_row.get("aum", None)
-                all_assets.append(asset_df)
-
-        except Exception as e:
-            failed_funds.append(fund_code)
-            st.warning(f"Không thể lấy dữ liệu cho quỹ {fund_code}: {str(e)}")
-
-        # Cập nhật tiến trình
+    def on_progress(done, total, fund_code):
         if progress:
-            progress.progress((i + 1) / total_funds)
+            progress.progress(done / total)
+        if status_text:
+            status_text.text(f"Đang xử lý quỹ {done}/{total}: {fund_code}")
+
+    snapshots, failed_funds = sync_fund_snapshots(funds_df, on_progress=on_progress)
 
     # Xóa thanh tiến trình và thông báo
     if progress:
@@ -173,21 +210,47 @@ def get_all_funds_data(funds_df, fund_type=None, with_progress=False):
         else:
             status_text.text("Hoàn thành! Đã lấy dữ liệu tất cả các quỹ.")
 
-    # Kết hợp dữ liệu
-    holdings_combined = (
-        pd.concat(all_holdings, ignore_index=True) if all_holdings else pd.DataFrame()
-    )
-    industry_combined = (
-        pd.concat(all_industries, ignore_index=True) if all_industries else pd.DataFrame()
-    )
-    asset_combined = pd.concat(all_assets, ignore_index=True) if all_assets else pd.DataFrame()
+    holdings_combined = _attach_fund_info(snapshots["holdings"], funds_df, with_nav_date=True)
+    industry_combined = _attach_fund_info(snapshots["industries"], funds_df)
+    asset_combined = _attach_fund_info(snapshots["assets"], funds_df)
 
     return holdings_combined, industry_combined, asset_combined, failed_funds
 
 
+def display_fund_ownership(stock):
+    """Hiển thị các quỹ mở đang nắm giữ cổ phiếu từ chỉ mục đã lưu, không gọi API"""
+    holdings_index = load_holdings_index()
+    if holdings_index is None:
+        st.info("Chưa có dữ liệu danh mục quỹ. Mở trang phân tích quỹ để tải dữ liệu.")
+        return
+
+    postings = holdings_index.funds_holding(stock)
+    if postings.empty:
+        st.info(f"Không có quỹ mở nào trên Fmarket đang nắm giữ {stock}.")
+        return
+
+    st.caption(
+        f"{len(postings)}/{holdings_index.total_funds} quỹ nắm giữ, "
+        f"tỷ trọng trung bình {postings['weight'].mean():.2f}%"
+    )
+    st.dataframe(
+        postings[["fund_code", "weight", "nav_date"]],
+        column_config={
+            "fund_code": st.column_config.TextColumn("Mã quỹ"),
+            "weight": st.column_config.ProgressColumn(
+                "Tỷ trọng (%)", format="%.2f%%", min_value=0, max_value=postings["weight"].max()
+            ),
+            "nav_date": st.column_config.TextColumn("Ngày cập nhật"),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+
 # ----- VISUALIZATION HELPER FUNCTIONS -----
 
 
+@memoize_figure(page="fund")
 def create_bar_chart(
     df,
     x,
@@ -244,6 +307,7 @@ def create_bar_chart(
     return fig
 
 
+@memoize_figure(page="fund")
 def create_pie_chart(
     df,
     values,
@@ -281,6 +345,7 @@ def create_pie_chart(
     return fig
 
 
+@memoize_figure(page="fund")
 def create_treemap(df, path, values, color, title, height=600, color_scale="Viridis"):
     """Tạo biểu đồ treemap có thể tái sử dụng với nhiều tùy chỉnh hơn"""
     if df is None or df.empty:
@@ -306,6 +371,7 @@ def create_treemap(df, path, values, color, title, height=600, color_scale="Viri
     return fig
 
 
+@memoize_figure(page="fund")
 def create_scatter_plot(
     df, x, y, title, labels, color=None, size=None, hover_name=None, trend_line=False, height=500
 ):
@@ -368,6 +434,290 @@ def format_number(value, prefix="", suffix=""):
     return f"{prefix}{value:,.2f}{suffix}"
 
 
+# ----- FRAGMENTS: CHẠY LẠI ĐỘC LẬP KHI ĐỔI WIDGET -----
+
+
+@section("fund_popular_table")
+def _popular_stocks_table(stock_summary):
+    # Hiển thị bảng dữ liệu đầy đủ
+    st.subheader("Bảng tổng hợp tất cả cổ phiếu")
+
+    # Hiển thị số cột tùy chọn
+    num_stocks = st.slider("Số lượng cổ phiếu hiển thị", 10, 100, 50)
+
+    # Sắp xếp và hiển thị
+    sorted_summary = stock_summary.sort_values("fund_count", ascending=False).head(num_stocks)
+
+    # Hiển thị bảng dữ liệu
+    display_df = sorted_summary[
+        [
+            "stockCode",
+            "fund_count",
+            "fund_percent",
+            "avg_weight",
+            "max_weight",
+            "min_weight",
+            "std_weight",
+        ]
+    ]
+    display_df.columns = [
+        "Mã CP",
+        "Số quỹ",
+        "% số quỹ",
+        "Tỷ trọng TB (%)",
+        "Tỷ trọng Max (%)",
+        "Tỷ trọng Min (%)",
+        "Độ lệch chuẩn (%)",
+    ]
+
+    st.dataframe(
+        display_df.style.format(
+            {
+                "% số quỹ": "{:.2f}%",
+                "Tỷ trọng TB (%)": "{:.2f}%",
+                "Tỷ trọng Max (%)": "{:.2f}%",
+                "Tỷ trọng Min (%)": "{:.2f}%",
+                "Độ lệch chuẩn (%)": "{:.2f}%",
+            }
+        ),
+        height=500,
+        use_container_width=True,
+    )
+
+
+@section("fund_popular_details")
+def _popular_stock_details(holdings_index, funds_df, weight_col, total_funds):
+    # Hiển thị danh sách quỹ nắm giữ cho một cổ phiếu cụ thể
+    st.subheader("Xem chi tiết cổ phiếu")
+    stock_summary = holdings_index.summary
+
+    # Chọn cổ phiếu để xem chi tiết
+    selected_stock = st.selectbox(
+        "Chọn cổ phiếu để xem danh sách quỹ nắm giữ",
+        options=sorted(stock_summary["stockCode"].unique()),
+        format_func=lambda x: f"{x} - {stock_summary[stock_summary['stockCode'] == x]['stock_name'].values[0]}",
+    )
+
+    # Lọc dữ liệu cho cổ phiếu đã chọn
+    stock_details = _attach_fund_info(
+        holdings_index.funds_holding(selected_stock).rename(columns={"weight": weight_col}),
+        funds_df,
+    )
+
+    if not stock_details.empty:
+        # Hiển thị thông tin chi tiết
+        stock_name = stock_details["stockCode"].iloc[0]
+        fund_count = len(stock_details["fund_code"].unique())
+        avg_weight = stock_details[weight_col].mean()
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            custom_metric("Cổ phiếu", f"{selected_stock} - {stock_name}")
+        with col2:
+            custom_metric("Số quỹ nắm giữ", f"{fund_count} ({fund_count/total_funds*100:.1f}%)")
+        with col3:
+            custom_metric("Tỷ trọng trung bình", f"{avg_weight:.2f}%")
+
+        # Biểu đồ tỷ trọng của cổ phiếu trong các quỹ
+        stock_details_sorted = stock_details.sort_values(weight_col, ascending=False)
+
+        fig = create_bar_chart(
+            stock_details_sorted,
+            x="fund_code",
+            y=weight_col,
+            title=f"Tỷ trọng của {selected_stock} trong các quỹ",
+            labels={"fund_code": "Mã quỹ", weight_col: "Tỷ trọng (%)"},
+            text=weight_col,
+            color="fund_type",
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Hiển thị bảng dữ liệu
+        st.dataframe(
+            stock_details_sorted[["fund_code", "fund_name", "fund_type", weight_col, "nav_date"]]
+            .rename(
+                columns={
+                    "fund_code": "Mã quỹ",
+                    "fund_name": "Tên quỹ",
+                    "fund_type": "Loại quỹ",
+                    weight_col: "Tỷ trọng (%)",
+                    "nav_date": "Ngày cập nhật",
+                }
+            )
+            .style.format(
+                {
+                    "Tỷ trọng (%)": "{:.2f}%",
+                }
+            ),
+            height=400,
+            use_container_width=True,
+        )
+
+    else:
+        st.info(f"Không tìm thấy dữ liệu cho cổ phiếu {selected_stock}")
+
+
+@section("fund_industry_table")
+def _industry_table(industry_group_summary):
+    # Hiển thị bảng dữ liệu đầy đủ
+    st.subheader("Bảng tổng hợp tất cả ngành")
+
+    # Hiển thị số cột tùy chọn
+    num_industries = st.slider(
+        "Số lượng ngành hiển thị",
+        10,
+        len(industry_group_summary),
+        min(20, len(industry_group_summary)),
+    )
+
+    # Sort options
+    sort_options = {
+        "Tỷ trọng trung bình (giảm dần)": ("avg_weight", False),
+        "Tỷ trọng cao nhất (giảm dần)": ("max_weight", False),
+        "Số quỹ phân bổ (giảm dần)": ("fund_count", False),
+        "Tên ngành (A-Z)": ("industry", True),
+    }
+
+    sort_by = st.selectbox("Sắp xếp theo", list(sort_options.keys()))
+    sort_col, ascending = sort_options[sort_by]
+
+    # Sắp xếp và hiển thị
+    sorted_summary = industry_group_summary.sort_values(sort_col, ascending=ascending).head(
+        num_industries
+    )
+
+    # Hiển thị bảng dữ liệu
+    display_df = sorted_summary[
+        ["industry", "avg_weight", "max_weight", "min_weight", "std_weight", "fund_count"]
+    ]
+    display_df.columns = [
+        "Ngành",
+        "Tỷ trọng TB (%)",
+        "Tỷ trọng Max (%)",
+        "Tỷ trọng Min (%)",
+        "Độ lệch chuẩn (%)",
+        "Số quỹ",
+    ]
+
+    st.dataframe(
+        display_df.style.format(
+            {
+                "Tỷ trọng TB (%)": "{:.2f}%",
+                "Tỷ trọng Max (%)": "{:.2f}%",
+                "Tỷ trọng Min (%)": "{:.2f}%",
+                "Độ lệch chuẩn (%)": "{:.2f}%",
+            }
+        ),
+        height=500,
+        use_container_width=True,
+    )
+
+
+@section("fund_industry_details")
+def _industry_details(
+    industry_summary, industry_group_summary, industry_combined, weight_col, total_funds
+):
+    # Phân tích chi tiết từng ngành
+    st.subheader("Xem chi tiết ngành")
+
+    # Chọn ngành để xem chi tiết
+    selected_industry_group = st.selectbox(
+        "Chọn ngành để xem danh sách quỹ phân bổ",
+        options=sorted(industry_group_summary["industry"].unique()),
+    )
+
+    # Tìm tất cả ngành thuộc nhóm đã chọn
+    industry_names = industry_summary[industry_summary["industry"] == selected_industry_group][
+        "industry"
+    ].unique()
+
+    # Lọc dữ liệu cho ngành đã chọn
+    industry_details = industry_combined[industry_combined["industry"].isin(industry_names)]
+
+    if not industry_details.empty:
+        # Hiển thị thông tin chi tiết
+        fund_count = len(industry_details["fund_code"].unique())
+        avg_weight = industry_details[weight_col].mean()
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            custom_metric("Ngành", selected_industry_group)
+        with col2:
+            custom_metric("Số quỹ phân bổ", f"{fund_count} ({fund_count/total_funds*100:.1f}%)")
+        with col3:
+            custom_metric("Tỷ trọng trung bình", f"{avg_weight:.2f}%")
+
+        # Biểu đồ tỷ trọng của ngành trong các quỹ
+        industry_details_sorted = industry_details.sort_values(weight_col, ascending=False)
+        fig = create_bar_chart(
+            industry_details_sorted,
+            x="fund_code",
+            y=weight_col,
+            title=f"Tỷ trọng của ngành {selected_industry_group} trong các quỹ",
+            labels={"fund_code": "Mã quỹ", weight_col: "Tỷ trọng (%)"},
+            text=weight_col,
+            color="fund_type",
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Hiển thị bảng dữ liệu
+        st.dataframe(
+            industry_details_sorted[
+                ["fund_code", "fund_name", "fund_type", "industry", weight_col]
+            ]
+            .rename(
+                columns={
+                    "fund_code": "Mã quỹ",
+                    "fund_name": "Tên quỹ",
+                    "fund_type": "Loại quỹ",
+                    "industry": "Tên ngành chi tiết",
+                    weight_col: "Tỷ trọng (%)",
+                }
+            )
+            .style.format(
+                {
+                    "Tỷ trọng (%)": "{:.2f}%",
+                }
+            ),
+            height=400,
+            use_container_width=True,
+        )
+
+    else:
+        st.info(f"Không tìm thấy dữ liệu cho ngành {selected_industry_group}")
+
+
+@section("fund_similar")
+def _similar_funds(funds, similarity, funds_df):
+    st.subheader("Quỹ có danh mục tương đồng nhất")
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        selected_fund = st.selectbox("Chọn quỹ", options=funds.tolist())
+    with col2:
+        num_similar = st.slider("Số quỹ hiển thị", 3, 15, 5)
+
+    similar_funds = most_similar_funds(funds, similarity, selected_fund, num_similar)
+    fund_names = funds_df.set_index("short_name")["name"]
+    similar_df = pd.DataFrame(
+        {
+            "Mã quỹ": similar_funds.index,
+            "Tên quỹ": fund_names.reindex(similar_funds.index).to_numpy(),
+            "Tương đồng": similar_funds.to_numpy(),
+        }
+    )
+    st.dataframe(
+        similar_df,
+        column_config={
+            "Tương đồng": st.column_config.ProgressColumn(
+                "Tương đồng", format="%.2f", min_value=0, max_value=1
+            )
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+
 # ----- LOAD DATA -----
 def display_fund_data():
     # Tải danh sách quỹ
@@ -396,6 +746,8 @@ def display_fund_data():
             "Phân tích quỹ",
             "Cổ phiếu phổ biến",
             "Phân tích ngành",
+            "So sánh quỹ",
+            "Hiệu suất quỹ",
         ],
         icons=["bar-chart-fill", "graph-up", "pie-chart-fill", "cash-coin", "arrows-angle-expand"],
         menu_icon="cast",
@@ -898,23 +1250,12 @@ def display_fund_data():
             else "netAssetsPercent"
         )
 
-        stock_summary = (
-            holdings_combined.groupby("stockCode")
-            .agg(
-                stock_name=("stockCode", "first"),
-                avg_weight=((weight_col), "mean"),
-                max_weight=((weight_col), "max"),
-                min_weight=((weight_col), "min"),
-                std_weight=((weight_col), "std"),
-                fund_count=("fund_code", "nunique"),
-                fund_list=("fund_code", lambda x: ", ".join(sorted(x.unique()))),
-            )
-            .reset_index()
+        # Tra cứu từ chỉ mục ngược cổ phiếu -> quỹ, dựng sẵn khi làm mới snapshot
+        holdings_index = get_holdings_index(holdings_combined).for_funds(
+            holdings_combined["fund_code"].unique()
         )
-
-        # Tính tỷ lệ phần trăm số quỹ nắm giữ
-        total_funds = holdings_combined["fund_code"].nunique()
-        stock_summary["fund_percent"] = stock_summary["fund_count"] / total_funds * 100
+        stock_summary = holdings_index.summary
+        total_funds = holdings_index.total_funds
 
         # Hiển thị biểu đồ và bảng dữ liệu
         col1, col2 = st.columns([3, 2])
@@ -992,119 +1333,9 @@ def display_fund_data():
                 """
                 )
 
-        # Hiển thị bảng dữ liệu đầy đủ
-        st.subheader("Bảng tổng hợp tất cả cổ phiếu")
-
-        # Hiển thị số cột tùy chọn
-        num_stocks = st.slider("Số lượng cổ phiếu hiển thị", 10, 100, 50)
-
-        # Sắp xếp và hiển thị
-        sorted_summary = stock_summary
-
-        # Hiển thị bảng dữ liệu
-        display_df = sorted_summary[
-            [
-                "stockCode",
-                "fund_count",
-                "fund_percent",
-                "avg_weight",
-                "max_weight",
-                "min_weight",
-                "std_weight",
-            ]
-        ]
-        display_df.columns = [
-            "Mã CP",
-            "Số quỹ",
-            "% số quỹ",
-            "Tỷ trọng TB (%)",
-            "Tỷ trọng Max (%)",
-            "Tỷ trọng Min (%)",
-            "Độ lệch chuẩn (%)",
-        ]
-
-        st.dataframe(
-            display_df.style.format(
-                {
-                    "% số quỹ": "{:.2f}%",
-                    "Tỷ trọng TB (%)": "{:.2f}%",
-                    "Tỷ trọng Max (%)": "{:.2f}%",
-                    "Tỷ trọng Min (%)": "{:.2f}%",
-                    "Độ lệch chuẩn (%)": "{:.2f}%",
-                }
-            ),
-            height=500,
-            use_container_width=True,
-        )
-
-        # Hiển thị danh sách quỹ nắm giữ cho một cổ phiếu cụ thể
-        st.subheader("Xem chi tiết cổ phiếu")
-
-        # Chọn cổ phiếu để xem chi tiết
-        selected_stock = st.selectbox(
-            "Chọn cổ phiếu để xem danh sách quỹ nắm giữ",
-            options=sorted(stock_summary["stockCode"].unique()),
-            format_func=lambda x: f"{x} - {stock_summary[stock_summary['stockCode'] == x]['stock_name'].values[0]}",
-        )
-
-        # Lọc dữ liệu cho cổ phiếu đã chọn
-        stock_details = holdings_combined[holdings_combined["stockCode"] == selected_stock]
-
-        if not stock_details.empty:
-            # Hiển thị thông tin chi tiết
-            stock_name = stock_details["stockCode"].iloc[0]
-            fund_count = len(stock_details["fund_code"].unique())
-            avg_weight = stock_details[weight_col].mean()
-
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                custom_metric("Cổ phiếu", f"{selected_stock} - {stock_name}")
-            with col2:
-                custom_metric(
-                    "Số quỹ nắm giữ", f"{fund_count} ({fund_count/total_funds*100:.1f}%)"
-                )
-            with col3:
-                custom_metric("Tỷ trọng trung bình", f"{avg_weight:.2f}%")
-
-            # Biểu đồ tỷ trọng của cổ phiếu trong các quỹ
-            stock_details_sorted = stock_details.sort_values(weight_col, ascending=False)
-
-            fig = create_bar_chart(
-                stock_details_sorted,
-                x="fund_code",
-                y=weight_col,
-                title=f"Tỷ trọng của {selected_stock} trong các quỹ",
-                labels={"fund_code": "Mã quỹ", weight_col: "Tỷ trọng (%)"},
-                text=weight_col,
-                color="fund_type",
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-            # Hiển thị bảng dữ liệu
-            st.dataframe(
-                stock_details_sorted[
-                    ["fund_code", "fund_name", "fund_type", weight_col, "nav_date"]
-                ]
-                .rename(
-                    columns={
-                        "fund_code": "Mã quỹ",
-                        "fund_name": "Tên quỹ",
-                        "fund_type": "Loại quỹ",
-                        weight_col: "Tỷ trọng (%)",
-                        "nav_date": "Ngày cập nhật",
-                    }
-                )
-                .style.format(
-                    {
-                        "Tỷ trọng (%)": "{:.2f}%",
-                    }
-                ),
-                height=400,
-                use_container_width=True,
-            )
+        _popular_stocks_table(stock_summary)
 
-        else:
-            st.info(f"Không tìm thấy dữ liệu cho cổ phiếu {selected_stock}")
+        _popular_stock_details(holdings_index, funds_df, weight_col, total_funds)
 
     # ----- TAB 3: PHÂN TÍCH NGÀNH -----
     elif selected_tab == "Phân tích ngành":
@@ -1248,126 +1479,139 @@ def display_fund_data():
                 """
                 )
 
-        # Hiển thị bảng dữ liệu đầy đủ
-        st.subheader("Bảng tổng hợp tất cả ngành")
+        _industry_table(industry_group_summary)
 
-        # Hiển thị số cột tùy chọn
-        num_industries = st.slider(
-            "Số lượng ngành hiển thị",
-            10,
-            len(industry_group_summary),
-            min(20, len(industry_group_summary)),
+        _industry_details(
+            industry_summary, industry_group_summary, industry_combined, weight_col, total_funds
         )
 
-        # Sort options
-        sort_options = {
-            "Tỷ trọng trung bình (giảm dần)": ("avg_weight", False),
-            "Tỷ trọng cao nhất (giảm dần)": ("max_weight", False),
-            "Số quỹ phân bổ (giảm dần)": ("fund_count", False),
-            "Tên ngành (A-Z)": ("industry", True),
-        }
+    # ----- TAB 4: SO SÁNH QUỸ -----
+    elif selected_tab == "So sánh quỹ":
+        st.header("So sánh mức độ trùng lặp danh mục giữa các quỹ")
 
-        sort_by = st.selectbox("Sắp xếp theo", list(sort_options.keys()))
-        sort_col, ascending = sort_options[sort_by]
+        col1, col2 = st.columns([1, 2])
 
-        # Sắp xếp và hiển thị
-        sorted_summary = industry_group_summary.sort_values(sort_col, ascending=ascending).head(
-            num_industries
-        )
+        with col1:
+            fund_types = ["Tất cả", "Quỹ cân bằng", "Quỹ cổ phiếu"]
+            compare_fund_type = st.selectbox("Chọn loại quỹ", fund_types, index=2)
+            similarity_metric = st.radio(
+                "Thước đo tương đồng", ["Weighted Jaccard", "Cosine"], horizontal=True
+            )
 
-        # Hiển thị bảng dữ liệu
-        display_df = sorted_summary[
-            ["industry", "avg_weight", "max_weight", "min_weight", "std_weight", "fund_count"]
-        ]
-        display_df.columns = [
-            "Ngành",
-            "Tỷ trọng TB (%)",
-            "Tỷ trọng Max (%)",
-            "Tỷ trọng Min (%)",
-            "Độ lệch chuẩn (%)",
-            "Số quỹ",
-        ]
+        with col2:
+            st.info(
+                """
+                So sánh danh mục cổ phiếu giữa các quỹ theo tỷ trọng nắm giữ:
+                - **Weighted Jaccard**: tổng tỷ trọng nhỏ hơn / tổng tỷ trọng lớn hơn trên từng mã
+                - **Cosine**: góc giữa hai vector tỷ trọng, ít nhạy với quy mô danh mục
+                - Giá trị 1 là trùng hoàn toàn, 0 là không có cổ phiếu chung
+                """
+            )
 
-        st.dataframe(
-            display_df.style.format(
-                {
-                    "Tỷ trọng TB (%)": "{:.2f}%",
-                    "Tỷ trọng Max (%)": "{:.2f}%",
-                    "Tỷ trọng Min (%)": "{:.2f}%",
-                    "Độ lệch chuẩn (%)": "{:.2f}%",
-                }
-            ),
-            height=500,
-            use_container_width=True,
-        )
+        with st.spinner("Đang tải dữ liệu tất cả các quỹ..."):
+            holdings_combined, industry_combined, asset_combined, failed_funds = (
+                get_all_funds_data(funds_df, fund_type=compare_fund_type, with_progress=True)
+            )
 
-        # Phân tích chi tiết từng ngành
-        st.subheader("Xem chi tiết ngành")
+        if holdings_combined.empty:
+            st.error("Không có dữ liệu danh mục đầu tư cho các quỹ đã chọn.")
+            st.stop()
 
-        # Chọn ngành để xem chi tiết
-        selected_industry_group = st.selectbox(
-            "Chọn ngành để xem danh sách quỹ phân bổ",
-            options=sorted(industry_group_summary["industry"].unique()),
+        holdings_index = get_holdings_index(holdings_combined).for_funds(
+            holdings_combined["fund_code"].unique()
         )
+        funds, cosine, jaccard = get_fund_similarity(holdings_index.postings)
+        similarity = jaccard if similarity_metric == "Weighted Jaccard" else cosine
+
+        heatmap_fig = px.imshow(
+            similarity,
+            x=funds,
+            y=funds,
+            zmin=0,
+            zmax=1,
+            color_continuous_scale=px.colors.sequential.Blues,
+            title=f"Ma trận tương đồng danh mục ({similarity_metric})",
+            labels={"color": "Tương đồng"},
+        )
+        heatmap_fig.update_layout(height=max(500, 18 * len(funds)))
+        st.plotly_chart(heatmap_fig, use_container_width=True)
 
-        # Tìm tất cả ngành thuộc nhóm đã chọn
-        industry_names = industry_summary[industry_summary["industry"] == selected_industry_group][
-            "industry"
-        ].unique()
+        _similar_funds(funds, similarity, funds_df)
 
-        # Lọc dữ liệu cho ngành đã chọn
-        industry_details = industry_combined[industry_combined["industry"].isin(industry_names)]
+    # ----- TAB 5: HIỆU SUẤT QUỸ -----
+    elif selected_tab == "Hiệu suất quỹ":
+        st.header("Xếp hạng hiệu suất và rủi ro các quỹ")
 
-        if not industry_details.empty:
-            # Hiển thị thông tin chi tiết
-            fund_count = len(industry_details["fund_code"].unique())
-            avg_weight = industry_details[weight_col].mean()
+        col1, col2 = st.columns([1, 2])
 
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                custom_metric("Ngành", selected_industry_group)
-            with col2:
-                custom_metric(
-                    "Số quỹ phân bổ", f"{fund_count} ({fund_count/total_funds*100:.1f}%)"
-                )
-            with col3:
-                custom_metric("Tỷ trọng trung bình", f"{avg_weight:.2f}%")
-
-            # Biểu đồ tỷ trọng của ngành trong các quỹ
-            industry_details_sorted = industry_details.sort_values(weight_col, ascending=False)
-            fig = create_bar_chart(
-                industry_details_sorted,
-                x="fund_code",
-                y=weight_col,
-                title=f"Tỷ trọng của ngành {selected_industry_group} trong các quỹ",
-                labels={"fund_code": "Mã quỹ", weight_col: "Tỷ trọng (%)"},
-                text=weight_col,
-                color="fund_type",
+        with col1:
+            fund_types = ["Tất cả"] + sorted(funds_df["fund_type"].unique().tolist())
+            perf_fund_type = st.selectbox("Chọn loại quỹ", fund_types)
+            sort_by = st.selectbox(
+                "Xếp hạng theo",
+                ["Sharpe", "Lợi nhuận 1Y (%)", "Lợi nhuận 3M (%)", "Max drawdown (%)"],
             )
-            st.plotly_chart(fig, use_container_width=True)
 
-            # Hiển thị bảng dữ liệu
-            st.dataframe(
-                industry_details_sorted[
-                    ["fund_code", "fund_name", "fund_type", "industry", weight_col]
-                ]
-                .rename(
-                    columns={
-                        "fund_code": "Mã quỹ",
-                        "fund_name": "Tên quỹ",
-                        "fund_type": "Loại quỹ",
-                        "industry": "Tên ngành chi tiết",
-                        weight_col: "Tỷ trọng (%)",
-                    }
-                )
-                .style.format(
-                    {
-                        "Tỷ trọng (%)": "{:.2f}%",
-                    }
-                ),
-                height=400,
-                use_container_width=True,
+        with col2:
+            st.info(
+                """
+                Các chỉ số được tính trên lịch sử NAV 1 năm gần nhất của từng quỹ:
+                - **Biến động năm**: độ lệch chuẩn lợi nhuận ngày × √252
+                - **Max drawdown**: mức giảm sâu nhất từ đỉnh
+                - **Sharpe**: lợi nhuận năm hóa / biến động năm
+                - **Tương quan VNINDEX**: tương quan lợi nhuận ngày với chỉ số
+                """
             )
 
-        else:
-            st.info(f"Không tìm thấy dữ liệu cho ngành {selected_industry_group}")
+        with st.spinner("Đang cập nhật lịch sử NAV các quỹ..."):
+            performance, matrix, failed_funds = get_funds_performance(funds_df, with_progress=True)
+
+        if failed_funds:
+            st.warning(
+                f"Không thể cập nhật NAV của {len(failed_funds)} quỹ: {', '.join(failed_funds[:5])}"
+            )
+
+        if performance.empty:
+            st.error("Không có dữ liệu NAV cho các quỹ.")
+            st.stop()
+
+        fund_info = funds_df.set_index("short_name")[["name", "fund_type"]]
+        ranking = fund_info.join(performance, how="inner")
+        if perf_fund_type != "Tất cả":
+            ranking = ranking[ranking["fund_type"] == perf_fund_type]
+        ranking = ranking.sort_values(sort_by, ascending=False).reset_index(names="Mã quỹ")
+
+        scatter_fig = px.scatter(
+            ranking,
+            x="Biến động năm (%)",
+            y="Lợi nhuận 1Y (%)",
+            color="fund_type",
+            hover_name="Mã quỹ",
+            text="Mã quỹ",
+            title="Lợi nhuận 1 năm và biến động",
+            labels={"fund_type": "Loại quỹ"},
+        )
+        scatter_fig.update_traces(textposition="top center")
+        st.plotly_chart(scatter_fig, use_container_width=True)
+
+        st.dataframe(
+            ranking.rename(columns={"name": "Tên quỹ", "fund_type": "Loại quỹ"}),
+            column_config={
+                col: st.column_config.NumberColumn(col, format="%.2f")
+                for col in performance.columns
+                if col != "Số phiên"
+            },
+            hide_index=True,
+            use_container_width=True,
+        )
+
+        # So sánh NAV chuẩn hóa của các quỹ đứng đầu
+        top_funds = ranking["Mã quỹ"].head(5).tolist()
+        normalized = matrix[top_funds].iloc[-TRADING_DAYS:]
+        normalized = normalized / normalized.bfill().iloc[0] * 100
+        nav_fig = px.line(
+            normalized,
+            title="NAV chuẩn hóa (gốc 100) của 5 quỹ đứng đầu",
+            labels={"index": "Ngày", "value": "NAV chuẩn hóa", "fund_code": "Mã quỹ"},
+        )
+        st.plotly_chart(nav_fig, use_container_width=True)
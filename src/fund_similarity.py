@@ -0,0 +1,102 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.config import EXTERNAL_DATA_DIR
+
+SIMILARITY_DIR = EXTERNAL_DATA_DIR / "funds" / "similarity"
+
+
+def build_weight_matrix(postings):
+    """Ma trận thưa quỹ x cổ phiếu với giá trị là tỷ trọng (%)"""
+    fund_ids, funds = pd.factorize(postings["fund_code"], sort=True)
+    stock_ids, stocks = pd.factorize(postings["stockCode"], sort=True)
+    matrix = sparse.csr_matrix(
+        (postings["weight"].to_numpy(dtype=float), (fund_ids, stock_ids)),
+        shape=(len(funds), len(stocks)),
+    )
+    matrix.sum_duplicates()
+    return matrix, np.asarray(funds), np.asarray(stocks)
+
+
+def cosine_similarity(matrix):
+    """Cosine giữa các dòng qua một phép nhân ma trận thưa"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    normalized = sparse.diags(1 / norms) @ matrix
+    return (normalized @ normalized.T).toarray()
+
+
+def _level_matrix(matrix):
+    """Tách tỷ trọng thành các bậc: min(a, b) = sum_k delta_k * [a >= v_k] * [b >= v_k]
+
+    Trong mỗi cột, tỷ trọng sắp tăng dần v_1 <= v_2 <= ...; bậc k có độ cao
+    delta_k = v_k - v_(k-1). Quỹ ở vị trí thứ r của cột đạt r bậc đầu tiên.
+    """
+    coo = matrix.tocoo()
+    order = np.lexsort((coo.data, coo.col))
+    rows, cols, values = coo.row[order], coo.col[order], coo.data[order]
+
+    position = np.arange(len(values))
+    col_start = np.searchsorted(cols, cols, side="left")
+    delta = np.where(position == col_start, values, np.diff(values, prepend=0.0))
+
+    # Quỹ ở vị trí p nhận các bậc col_start..p của cột mình
+    counts = position - col_start + 1
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    level_rows = np.repeat(rows, counts)
+    level_ids = np.repeat(col_start, counts) + offsets
+    levels = sparse.csr_matrix(
+        (np.ones(len(level_rows)), (level_rows, level_ids)), shape=(matrix.shape[0], len(values))
+    )
+    return levels, delta
+
+
+def weighted_jaccard_similarity(matrix):
+    """Weighted Jaccard: sum(min) / sum(max) cho mọi cặp quỹ
+
+    sum(min) = L @ diag(delta) @ L.T với L là ma trận bậc thưa (xem `_level_matrix`), một phép
+    nhân ma trận thưa. L có m(m+1)/2 phần tử khác 0 cho mã được m quỹ nắm giữ (~100 quỹ x
+    ~600 mã trên Fmarket: vài trăm nghìn phần tử). sum(max) = tổng dòng i + tổng dòng j - sum(min).
+    """
+    levels, delta = _level_matrix(matrix)
+    sum_min = (levels @ sparse.diags(delta) @ levels.T).toarray()
+
+    row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+    sum_max = row_sums[:, None] + row_sums[None, :] - sum_min
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(sum_max > 0, sum_min / sum_max, 0.0)
+    return jaccard
+
+
+def snapshot_key(postings):
+    """Khóa phiên bản snapshot: băm các cặp (quỹ, ngày NAV)"""
+    pairs = postings[["fund_code", "nav_date"]].drop_duplicates().astype(str)
+    pairs = pairs.sort_values(["fund_code", "nav_date"])
+    payload = "|".join(pairs["fund_code"] + "@" + pairs["nav_date"])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def compute_fund_similarity(postings, cache_dir=SIMILARITY_DIR):
+    """Tính (hoặc đọc từ cache theo snapshot) ma trận tương đồng cosine và weighted Jaccard"""
+    path = cache_dir / f"{snapshot_key(postings)}.npz"
+    if path.exists():
+        cached = np.load(path, allow_pickle=False)
+        return cached["funds"], cached["cosine"], cached["jaccard"]
+
+    matrix, funds, _ = build_weight_matrix(postings)
+    cosine = cosine_similarity(matrix)
+    jaccard = weighted_jaccard_similarity(matrix)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, funds=funds.astype(str), cosine=cosine, jaccard=jaccard)
+    return funds, cosine, jaccard
+
+
+def most_similar_funds(funds, similarity, fund_code, n=5):
+    """Các quỹ có danh mục giống quỹ đã chọn nhất"""
+    position = int(np.flatnonzero(funds == fund_code)[0])
+    scores = pd.Series(similarity[position], index=funds).drop(fund_code)
+    return scores.nlargest(n)
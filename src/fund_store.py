@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+
+from src.config import EXTERNAL_DATA_DIR
+from src.holdings_index import INDEX_PATH, HoldingsIndex
+from src.instrumentation import log_error, submit
+
+FUND_DIR = EXTERNAL_DATA_DIR / "funds"
+MANIFEST_PATH = FUND_DIR / "manifest.json"
+FUND_DETAIL_URL = "https://api.fmarket.vn/home/product/{}"
+
+SNAPSHOT_TABLES = {
+    "holdings": "productTopHoldingList",
+    "industries": "productIndustriesHoldingList",
+    "assets": "productAssetHoldingList",
+}
+
+_lock = threading.Lock()
+
+
+def request_with_retry(method, url, timeout=10, retries=2, backoff=1.0, **kwargs):
+    """Gửi request tới Fmarket, thử lại khi lỗi mạng hoặc lỗi máy chủ"""
+    for attempt in range(retries + 1):
+        try:
+            response = requests.request(method, url, timeout=timeout, verify=False, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2**attempt))
+
+
+def fetch_fund_detail(fund_code, timeout=10, retries=2, backoff=1.0):
+    """Lấy chi tiết quỹ từ Fmarket"""
+    return request_with_retry("GET", FUND_DETAIL_URL.format(fund_code), timeout, retries, backoff)
+
+
+def split_fund_detail(fund_detail):
+    """Tách danh mục cổ phiếu, phân bổ ngành và phân bổ tài sản của một quỹ"""
+    data = (fund_detail or {}).get("data") or {}
+    return {name: pd.DataFrame(data.get(key) or []) for name, key in SNAPSHOT_TABLES.items()}
+
+
+def nav_date_column(funds_df):
+    return "nav_date" if "nav_date" in funds_df.columns else "nav_update_at"
+
+
+def _read_manifest():
+    if not MANIFEST_PATH.exists():
+        return {}
+    return json.loads(MANIFEST_PATH.read_text())
+
+
+def _read_snapshot(name):
+    path = FUND_DIR / f"{name}.parquet"
+    return pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=["fund_code"])
+
+
+def _write_snapshot(name, df):
+    # Cột lồng (dict/list) từ API được lưu dạng JSON để ghi Parquet ổn định
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        if df[col].map(lambda v: isinstance(v, (dict, list))).any():
+            df[col] = df[col].map(
+                lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+            )
+    path = FUND_DIR / f"{name}.parquet"
+    tmp_path = path.with_suffix(".tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _save(snapshots, manifest):
+    FUND_DIR.mkdir(parents=True, exist_ok=True)
+    for name, df in snapshots.items():
+        _write_snapshot(name, df)
+    tmp_path = MANIFEST_PATH.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def sync_fund_snapshots(
+    funds_df, max_workers=8, timeout=10, retries=2, on_progress=None, force=False
+):
+    """Cập nhật snapshot danh mục cho các quỹ có ngày NAV mới
+
+    Chỉ những quỹ có `nav_date` khác với lần lưu trước mới được tải lại. Các request chạy song song
+    trong thread pool; `on_progress(done, total, fund_code)` được gọi từ thread gọi hàm.
+    Trả về dict snapshot (holdings, industries, assets) và danh sách quỹ lỗi.
+    """
+    with _lock:
+        return _sync_fund_snapshots(funds_df, max_workers, timeout, retries, on_progress, force)
+
+
+def _sync_fund_snapshots(funds_df, max_workers, timeout, retries, on_progress, force):
+    date_col = nav_date_column(funds_df)
+    nav_dates = dict(zip(funds_df["short_name"], funds_df[date_col].astype(str)))
+    manifest = _read_manifest()
+    snapshots = {name: _read_snapshot(name) for name in SNAPSHOT_TABLES}
+
+    stale = [
+        code for code, nav_date in nav_dates.items() if force or manifest.get(code) != nav_date
+    ]
+    failed = []
+    fresh = {name: [] for name in SNAPSHOT_TABLES}
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                submit(executor, fetch_fund_detail, code, timeout, retries): code for code in stale
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                code = futures[future]
+                try:
+                    parts = split_fund_detail(future.result())
+                    for name, df in parts.items():
+                        fresh[name].append(df.assign(fund_code=code))
+                    manifest[code] = nav_dates[code]
+                except Exception as e:
+                    log_error(f"Lỗi khi lấy dữ liệu quỹ {code}", e)
+                    failed.append(code)
+                if on_progress:
+                    on_progress(done, len(stale), code)
+
+        refreshed = set(stale) - set(failed)
+        for name in SNAPSHOT_TABLES:
+            kept = snapshots[name][~snapshots[name]["fund_code"].isin(refreshed)]
+            frames = [df for df in [kept] + fresh[name] if not df.empty]
+            snapshots[name] = pd.concat(frames, ignore_index=True) if frames else kept
+        _save(snapshots, manifest)
+
+    # Chỉ mục ngược cổ phiếu -> quỹ được dựng lại mỗi khi snapshot thay đổi
+    if stale or not INDEX_PATH.exists():
+        HoldingsIndex.from_holdings(snapshots["holdings"], manifest).save()
+
+    return snapshots, failed
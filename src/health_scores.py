@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+
+KEYS = ["ticker", "yearReport"]
+
+IS_COLUMNS = [
+    "Net Profit For the Year",
+    "Net Sales",
+    "Gross Profit",
+    "Profit before tax",
+    "Selling Expenses",
+    "General & Admin Expenses",
+]
+BS_COLUMNS = [
+    "TOTAL ASSETS (Bn. VND)",
+    "CURRENT ASSETS (Bn. VND)",
+    "Current liabilities (Bn. VND)",
+    "Long-term liabilities (Bn. VND)",
+    "LIABILITIES (Bn. VND)",
+    "OWNER'S EQUITY(Bn.VND)",
+    "Common shares (Bn. VND)",
+    "Accounts receivable (Bn. VND)",
+    "Fixed assets (Bn. VND)",
+    "Undistributed earnings (Bn. VND)",
+]
+CF_COLUMNS = [
+    "Net cash inflows/outflows from operating activities",
+    "Depreciation and Amortisation",
+]
+
+F_SCORE_CRITERIA = [
+    "ROA > 0",
+    "ROA Increasing",
+    "Operating CF > 0",
+    "CF > ROA",
+    "Decreasing LT Debt Ratio",
+    "Increasing Current Ratio",
+    "No New Shares",
+    "Increasing Gross Margin",
+    "Increasing Asset Turnover",
+]
+Z_SCORE_COMPONENTS = [
+    "Working Capital/Total Assets",
+    "Retained Earnings/Total Assets",
+    "EBIT/Total Assets",
+    "Equity/Total Liabilities",
+    "Sales/Total Assets",
+]
+M_SCORE_COMPONENTS = [
+    "Days Sales in Receivables Index (DSRI)",
+    "Gross Margin Index (GMI)",
+    "Asset Quality Index (AQI)",
+    "Sales Growth Index (SGI)",
+    "Depreciation Index (DEPI)",
+    "SG&A Expense Index (SGAI)",
+    "Total Accruals to Total Assets (TATA)",
+    "Leverage Index (LVGI)",
+]
+
+
+def _select(df, columns, ticker=None):
+    if "ticker" not in df.columns:
+        df = df.assign(ticker=ticker)
+    return (
+        df.reindex(columns=KEYS + columns)
+        .drop_duplicates(subset=KEYS, keep="first")
+        .set_index(KEYS)
+        .astype(float)
+    )
+
+
+def align_statements(is_df, bs_df, cf_df, ticker=None):
+    """Align income statement, balance sheet and cash flow panels on (ticker, yearReport).
+
+    Each input may hold many tickers and years. `ticker` is used when the frames come from a
+    single-stock vnstock call without a ticker column.
+    """
+    panel = pd.concat(
+        [
+            _select(is_df, IS_COLUMNS, ticker),
+            _select(bs_df, BS_COLUMNS, ticker),
+            _select(cf_df, CF_COLUMNS, ticker),
+        ],
+        axis=1,
+        join="inner",
+    )
+    return panel.sort_index()
+
+
+def previous_year(panel):
+    """Shift every column by one fiscal year within each ticker."""
+    return panel.groupby(level="ticker").shift(1)
+
+
+def _safe_div(num, den):
+    return num / den.where(den != 0)
+
+
+def compute_f_score(panel, prev=None):
+    """Piotroski F-Score criteria for every (ticker, year) row. First year of a ticker is NaN."""
+    prev = previous_year(panel) if prev is None else prev
+    total_assets = panel["TOTAL ASSETS (Bn. VND)"]
+    prev_total_assets = prev["TOTAL ASSETS (Bn. VND)"]
+
+    roa = _safe_div(panel["Net Profit For the Year"], total_assets)
+    prev_roa = _safe_div(prev["Net Profit For the Year"], prev_total_assets)
+    op_cash_flow = panel["Net cash inflows/outflows from operating activities"]
+
+    lt_debt_ratio = _safe_div(panel["Long-term liabilities (Bn. VND)"], total_assets)
+    prev_lt_debt_ratio = _safe_div(prev["Long-term liabilities (Bn. VND)"], prev_total_assets)
+    current_ratio = _safe_div(
+        panel["CURRENT ASSETS (Bn. VND)"], panel["Current liabilities (Bn. VND)"]
+    )
+    prev_current_ratio = _safe_div(
+        prev["CURRENT ASSETS (Bn. VND)"], prev["Current liabilities (Bn. VND)"]
+    )
+    gross_margin = _safe_div(panel["Gross Profit"], panel["Net Sales"])
+    prev_gross_margin = _safe_div(prev["Gross Profit"], prev["Net Sales"])
+    asset_turnover = _safe_div(panel["Net Sales"], total_assets)
+    prev_asset_turnover = _safe_div(prev["Net Sales"], prev_total_assets)
+
+    scores = pd.DataFrame(
+        {
+            "ROA > 0": roa > 0,
+            "ROA Increasing": roa > prev_roa,
+            "Operating CF > 0": op_cash_flow > 0,
+            "CF > ROA": _safe_div(op_cash_flow, total_assets) > roa,
+            "Decreasing LT Debt Ratio": lt_debt_ratio < prev_lt_debt_ratio,
+            "Increasing Current Ratio": current_ratio > prev_current_ratio,
+            "No New Shares": panel["Common shares (Bn. VND)"] <= prev["Common shares (Bn. VND)"],
+            "Increasing Gross Margin": gross_margin > prev_gross_margin,
+            "Increasing Asset Turnover": asset_turnover > prev_asset_turnover,
+        },
+        index=panel.index,
+    ).astype(float)
+    scores["F-Score"] = scores.sum(axis=1)
+
+    # Cần năm trước để so sánh
+    has_prev = prev_total_assets.notna()
+    return scores.where(has_prev)
+
+
+def compute_z_score(panel):
+    """Altman Z-Score with weighted components and raw ratios A..E for every (ticker, year) row."""
+    total_assets = panel["TOTAL ASSETS (Bn. VND)"]
+    total_liabilities = panel["LIABILITIES (Bn. VND)"]
+    working_capital = panel["CURRENT ASSETS (Bn. VND)"] - panel["Current liabilities (Bn. VND)"]
+
+    raw = pd.DataFrame(
+        {
+            "A": _safe_div(working_capital, total_assets),
+            "B": _safe_div(panel["Undistributed earnings (Bn. VND)"], total_assets),
+            "C": _safe_div(panel["Profit before tax"], total_assets),
+            "D": _safe_div(panel["OWNER'S EQUITY(Bn.VND)"], total_liabilities),
+            "E": _safe_div(panel["Net Sales"], total_assets),
+        },
+        index=panel.index,
+    )
+    weights = np.array([1.2, 1.4, 3.3, 0.6, 1.0])
+    weighted = raw * weights
+    weighted.columns = Z_SCORE_COMPONENTS
+
+    result = pd.concat([weighted, raw], axis=1)
+    result["Z-Score"] = weighted.sum(axis=1, min_count=len(weights))
+    return result
+
+
+def compute_m_score(panel, prev=None):
+    """Beneish M-Score and its eight indices. Rows with a zero or missing denominator are NaN."""
+    prev = previous_year(panel) if prev is None else prev
+    sales = panel["Net Sales"]
+    prev_sales = prev["Net Sales"]
+    total_assets = panel["TOTAL ASSETS (Bn. VND)"]
+    prev_total_assets = prev["TOTAL ASSETS (Bn. VND)"]
+
+    dsri = _safe_div(
+        _safe_div(panel["Accounts receivable (Bn. VND)"], sales),
+        _safe_div(prev["Accounts receivable (Bn. VND)"], prev_sales),
+    )
+    gmi = _safe_div(
+        _safe_div(prev["Gross Profit"], prev_sales), _safe_div(panel["Gross Profit"], sales)
+    )
+    aqi = _safe_div(
+        _safe_div(total_assets - panel["CURRENT ASSETS (Bn. VND)"], total_assets),
+        _safe_div(prev_total_assets - prev["CURRENT ASSETS (Bn. VND)"], prev_total_assets),
+    )
+    sgi = _safe_div(sales, prev_sales)
+    depi = _safe_div(
+        _safe_div(prev["Depreciation and Amortisation"], prev["Fixed assets (Bn. VND)"]),
+        _safe_div(panel["Depreciation and Amortisation"], panel["Fixed assets (Bn. VND)"]),
+    )
+    sga = panel["Selling Expenses"] + panel["General & Admin Expenses"]
+    prev_sga = prev["Selling Expenses"] + prev["General & Admin Expenses"]
+    sgai = _safe_div(_safe_div(sga, sales), _safe_div(prev_sga, prev_sales))
+    tata = _safe_div(
+        panel["Net Profit For the Year"]
+        - panel["Net cash inflows/outflows from operating activities"],
+        total_assets,
+    )
+    lvgi = _safe_div(
+        _safe_div(panel["LIABILITIES (Bn. VND)"], total_assets),
+        _safe_div(prev["LIABILITIES (Bn. VND)"], prev_total_assets),
+    )
+
+    components = pd.DataFrame(
+        dict(zip(M_SCORE_COMPONENTS, [dsri, gmi, aqi, sgi, depi, sgai, tata, lvgi])),
+        index=panel.index,
+    )
+    coefficients = np.array([0.92, 0.528, 0.404, 0.892, 0.115, -0.172, 4.679, -0.327])
+    components["M-Score"] = -4.84 + (components[M_SCORE_COMPONENTS] * coefficients).sum(
+        axis=1, min_count=len(coefficients)
+    )
+    return components.replace([np.inf, -np.inf], np.nan)
+
+
+def score_universe(is_df, bs_df, cf_df):
+    """F/Z/M scores for every ticker and year of aligned statement panels."""
+    panel = align_statements(is_df, bs_df, cf_df)
+    prev = previous_year(panel)
+    return pd.concat(
+        [
+            compute_f_score(panel, prev)["F-Score"],
+            compute_z_score(panel)["Z-Score"],
+            compute_m_score(panel, prev)["M-Score"],
+        ],
+        axis=1,
+    ).reset_index()
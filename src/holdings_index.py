@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.config import EXTERNAL_DATA_DIR
+
+INDEX_PATH = EXTERNAL_DATA_DIR / "funds" / "holdings_index.parquet"
+POSTING_COLUMNS = ["stockCode", "fund_code", "weight", "nav_date"]
+
+
+def holdings_weight_column(holdings):
+    return "netAssetPercent" if "netAssetPercent" in holdings.columns else "netAssetsPercent"
+
+
+class HoldingsIndex:
+    """Chỉ mục ngược mã cổ phiếu -> danh sách (quỹ, tỷ trọng, ngày NAV)
+
+    Các posting được sắp xếp theo mã cổ phiếu rồi tỷ trọng giảm dần, nên tra cứu một mã chỉ là
+    tìm nhị phân trên mảng mã và cắt lát. Bảng tổng hợp và thứ tự xếp hạng được tính một lần.
+    """
+
+    def __init__(self, postings):
+        postings = postings.sort_values(["stockCode", "weight"], ascending=[True, False])
+        self.postings = postings.reset_index(drop=True)
+        self._codes = self.postings["stockCode"].to_numpy(dtype=str)
+        self._summary = None
+        self._subsets = {}
+
+    @classmethod
+    def from_holdings(cls, holdings, nav_dates=None):
+        """Tạo chỉ mục từ bảng snapshot danh mục (một dòng cho mỗi cặp quỹ - cổ phiếu)"""
+        if holdings.empty:
+            return cls(pd.DataFrame(columns=POSTING_COLUMNS))
+        weight_col = holdings_weight_column(holdings)
+        postings = pd.DataFrame(
+            {
+                "stockCode": holdings["stockCode"].astype(str),
+                "fund_code": holdings["fund_code"].astype(str),
+                "weight": pd.to_numeric(holdings[weight_col], errors="coerce"),
+            }
+        )
+        if nav_dates is not None:
+            postings["nav_date"] = postings["fund_code"].map(nav_dates)
+        elif "nav_date" in holdings.columns:
+            postings["nav_date"] = holdings["nav_date"].astype(str)
+        else:
+            postings["nav_date"] = None
+        return cls(postings.dropna(subset=["weight"]))
+
+    def funds_holding(self, stock):
+        """Các quỹ nắm giữ một mã, tỷ trọng giảm dần"""
+        start = np.searchsorted(self._codes, stock, side="left")
+        end = np.searchsorted(self._codes, stock, side="right")
+        return self.postings.iloc[start:end]
+
+    def for_funds(self, fund_codes):
+        """Chỉ mục con cho một nhóm quỹ (ví dụ theo loại quỹ), được ghi nhớ lại"""
+        key = frozenset(fund_codes)
+        if key not in self._subsets:
+            mask = self.postings["fund_code"].isin(key)
+            self._subsets[key] = HoldingsIndex(self.postings[mask])
+        return self._subsets[key]
+
+    @property
+    def summary(self):
+        """Thống kê theo mã: số quỹ, tỷ trọng TB/max/min/std và danh sách quỹ"""
+        if self._summary is None:
+            total_funds = self.postings["fund_code"].nunique()
+            groups = self.postings.groupby("stockCode", sort=True)
+            summary = groups["weight"].agg(
+                avg_weight="mean", max_weight="max", min_weight="min", std_weight="std"
+            )
+            summary["fund_count"] = groups["fund_code"].nunique()
+            summary["fund_list"] = (
+                self.postings.sort_values(["stockCode", "fund_code"])
+                .drop_duplicates(["stockCode", "fund_code"])
+                .groupby("stockCode")["fund_code"]
+                .agg(", ".join)
+            )
+            summary["fund_percent"] = summary["fund_count"] / max(total_funds, 1) * 100
+            summary = summary.reset_index()
+            summary.insert(1, "stock_name", summary["stockCode"])
+            self._summary = summary
+        return self._summary
+
+    @property
+    def total_funds(self):
+        return self.postings["fund_code"].nunique()
+
+    def top(self, n, by="fund_count"):
+        """Top N mã theo số quỹ nắm giữ hoặc tỷ trọng trung bình"""
+        return self.summary.nlargest(n, by)
+
+    def save(self, path=INDEX_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        self.postings.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+_loaded = {}
+
+
+def load_holdings_index(path=INDEX_PATH):
+    """Đọc chỉ mục đã lưu; chỉ đọc lại file khi snapshot quỹ được làm mới"""
+    if not path.exists():
+        return None
+    mtime = path.stat().st_mtime
+    if _loaded.get("mtime") != mtime:
+        _loaded["index"] = HoldingsIndex(pd.read_parquet(path))
+        _loaded["mtime"] = mtime
+    return _loaded["index"]
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+# Bộ chỉ báo mặc định cho các biểu đồ phân tích dòng tiền
+DEFAULT_INDICATORS = {
+    "sma": {"close": (5, 10, 20), "BUY": (5,), "SELL": (5,)},
+    "ema": (12, 26),
+    "rsi": 14,
+    "macd": (12, 26, 9),
+    "bollinger": (20, 2),
+    "atr": 14,
+    "obv": True,
+    "mfi": 14,
+    "volatility": (10, 20),
+}
+
+
+class _Windows:
+    """Bộ nhớ tạm các phép rolling/ewm để các chỉ báo dùng chung (vd. MA20 và BB middle)"""
+
+    def __init__(self, df):
+        self.df = df
+        self._cache = {}
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def series(self, column):
+        return self._get(("series", column), lambda: self.df[column].astype(float))
+
+    def diff(self, column):
+        return self._get(("diff", column), lambda: self.series(column).diff())
+
+    def returns(self):
+        return self._get(("returns",), lambda: self.series("close").pct_change())
+
+    def sma(self, column, window):
+        return self._get(
+            ("sma", column, window), lambda: self.series(column).rolling(window).mean()
+        )
+
+    def std(self, column, window):
+        return self._get(
+            ("std", column, window), lambda: self.series(column).rolling(window).std()
+        )
+
+    def ema(self, column, span):
+        return self._get(
+            ("ema", column, span),
+            lambda: self.series(column).ewm(span=span, adjust=False).mean(),
+        )
+
+    def wilder(self, name, values, period):
+        """Làm trơn kiểu Wilder (alpha = 1/period), dùng cho RSI và ATR"""
+        return self._get(
+            ("wilder", name, period),
+            lambda: values.ewm(alpha=1 / period, min_periods=period, adjust=False).mean(),
+        )
+
+    def has(self, *columns):
+        return all(column in self.df.columns for column in columns)
+
+
+def _sma_name(column, window):
+    return f"MA_{window}" if column == "close" else f"{column}_MA_{window}"
+
+
+def compute_indicators(df, spec=None):
+    """Tính một lượt mọi chỉ báo khai báo trong `spec` cho khung OHLCV (+ dòng tiền)
+
+    `df` cần cột `close`; `high`, `low`, `volume` dùng cho ATR, OBV và MFI nếu có.
+    Trả về DataFrame chỉ gồm các cột chỉ báo, cùng index với `df`, không sửa `df`.
+    """
+    spec = DEFAULT_INDICATORS if spec is None else spec
+    windows = _Windows(df)
+    out = {}
+
+    for column, periods in spec.get("sma", {}).items():
+        if windows.has(column):
+            for window in periods:
+                out[_sma_name(column, window)] = windows.sma(column, window)
+
+    for span in spec.get("ema", ()):
+        out[f"EMA_{span}"] = windows.ema("close", span)
+
+    if spec.get("rsi"):
+        period = spec["rsi"]
+        delta = windows.diff("close")
+        gain = windows.wilder("gain", delta.clip(lower=0), period)
+        loss = windows.wilder("loss", -delta.clip(upper=0), period)
+        out["RSI"] = 100 * gain / (gain + loss).replace(0, np.nan)
+
+    if spec.get("macd"):
+        fast, slow, signal = spec["macd"]
+        macd = windows.ema("close", fast) - windows.ema("close", slow)
+        out["MACD"] = macd
+        out["MACD_signal"] = macd.ewm(span=signal, adjust=False).mean()
+        out["MACD_hist"] = macd - out["MACD_signal"]
+
+    if spec.get("bollinger"):
+        window, width = spec["bollinger"]
+        middle = windows.sma("close", window)
+        band = windows.std("close", window) * width
+        out["BB_middle"] = middle
+        out["BB_upper"] = middle + band
+        out["BB_lower"] = middle - band
+
+    if spec.get("atr"):
+        close = windows.series("close")
+        prev_close = close.shift(1)
+        if windows.has("high", "low"):
+            high, low = windows.series("high"), windows.series("low")
+            true_range = pd.concat(
+                [high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1
+            ).max(axis=1)
+        else:
+            true_range = windows.diff("close").abs()
+        out["ATR"] = windows.wilder("true_range", true_range, spec["atr"])
+
+    if spec.get("obv") and windows.has("volume"):
+        direction = np.sign(windows.diff("close")).fillna(0)
+        out["OBV"] = (direction * windows.series("volume")).cumsum()
+
+    if spec.get("mfi") and windows.has("volume"):
+        period = spec["mfi"]
+        if windows.has("high", "low"):
+            high, low = windows.series("high"), windows.series("low")
+            typical = (high + low + windows.series("close")) / 3
+        else:
+            typical = windows.series("close")
+        money_flow = typical * windows.series("volume")
+        change = typical.diff()
+        positive = money_flow.where(change > 0, 0.0).rolling(period).sum()
+        negative = money_flow.where(change < 0, 0.0).rolling(period).sum()
+        out["MFI"] = 100 * positive / (positive + negative).replace(0, np.nan)
+
+    volatility = spec.get("volatility", ())
+    if volatility:
+        returns = windows.returns()
+        out["daily_return"] = returns
+        for window in volatility:
+            out[f"volatility_{window}d"] = returns.rolling(window).std() * np.sqrt(TRADING_DAYS)
+
+    return pd.DataFrame(out, index=df.index)
@@ -0,0 +1,171 @@
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+# Số lượt gọi gần nhất được giữ lại để tính tổng hợp và xuất JSON
+MAX_RECORDS = 5000
+
+_lock = threading.Lock()
+_records = deque(maxlen=MAX_RECORDS)
+# Các span đang mở trong context hiện tại; luồng con nhận được qua `submit`
+_spans = contextvars.ContextVar("instrumentation_spans", default=())
+
+
+def _count_rows(result):
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(result)
+    if isinstance(result, (tuple, list)):
+        counts = [len(r) for r in result if isinstance(r, (pd.DataFrame, pd.Series))]
+        return sum(counts) if counts else None
+    return None
+
+
+def add_bytes(n):
+    """Cộng số byte tải về cho mọi span đang mở, kể cả span của luồng đã giao việc"""
+    spans = _spans.get()
+    if spans:
+        with _lock:
+            for record in spans:
+                record["bytes"] += n
+
+
+def log_error(message, error):
+    """Ghi lỗi đã được xử lý vào log và vào span trong cùng đang mở (nếu có)
+
+    Lỗi ở luồng con giao việc qua `submit` được ghi vào span của luồng giao việc.
+    """
+    logger.opt(depth=1).warning(f"{message}: {error}")
+    spans = _spans.get()
+    if spans:
+        with _lock:
+            spans[-1]["error"] = spans[-1]["error"] or type(error).__name__
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit chạy `fn` trong bản sao context hiện tại để byte tải ở luồng con
+    được cộng vào các span đang mở của luồng giao việc"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def cache_miss(func):
+    """Đặt bên trong @st.cache_data: thân hàm chỉ chạy khi cache miss"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        spans = _spans.get()
+        if spans:
+            spans[-1]["cache"] = "miss"
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def span(name, cached=False):
+    """Đo thời gian thực, thời gian CPU của luồng, số byte tải về và số dòng của một khối lệnh
+
+    Trả về bản ghi để khối lệnh tự điền `rows` nếu cần. Với `cached=True` lượt gọi được
+    tính là hit trừ khi hàm bên trong được đánh dấu `cache_miss`.
+    """
+    record = {
+        "name": name,
+        "started_at": datetime.now().isoformat(timespec="milliseconds"),
+        "thread": threading.current_thread().name,
+        "wall_seconds": None,
+        "cpu_seconds": None,
+        "bytes": 0,
+        "cache": "hit" if cached else None,
+        "rows": None,
+        "error": None,
+    }
+    token = _spans.set(_spans.get() + (record,))
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_seconds"] = time.perf_counter() - wall
+        record["cpu_seconds"] = time.thread_time() - cpu
+        _spans.reset(token)
+        with _lock:
+            _records.append(record)
+
+
+def instrument(name=None, cached=False):
+    """Decorator ghi nhận mỗi lượt gọi hàm; đặt ngoài cùng, trên @st.cache_data nếu có"""
+
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label, cached=cached) as record:
+                result = func(*args, **kwargs)
+                record["rows"] = _count_rows(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def records():
+    with _lock:
+        return pd.DataFrame(list(_records))
+
+
+def call_stats():
+    """Tổng hợp theo hàm: số lượt gọi, thời gian, CPU, byte, hit/miss và số dòng"""
+    df = records()
+    if df.empty:
+        return pd.DataFrame()
+    df["hit"] = df["cache"] == "hit"
+    df["miss"] = df["cache"] == "miss"
+    stats = df.groupby("name").agg(
+        calls=("name", "size"),
+        wall_total=("wall_seconds", "sum"),
+        wall_mean=("wall_seconds", "mean"),
+        wall_p95=("wall_seconds", lambda s: s.quantile(0.95)),
+        wall_max=("wall_seconds", "max"),
+        cpu_total=("cpu_seconds", "sum"),
+        bytes_total=("bytes", "sum"),
+        hits=("hit", "sum"),
+        misses=("miss", "sum"),
+        rows_total=("rows", "sum"),
+        errors=("error", "count"),
+    )
+    stats["hit_rate"] = stats["hits"] / (stats["hits"] + stats["misses"]).replace(0, np.nan)
+    return stats.sort_values("wall_total", ascending=False)
+
+
+def export_json(path=None):
+    """Tổng hợp và các lượt gọi gần nhất dạng JSON; ghi ra file nếu có `path`"""
+    payload = json.dumps(
+        {
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "stats": json.loads(call_stats().reset_index().to_json(orient="records")),
+            "records": json.loads(records().to_json(orient="records")),
+        },
+        ensure_ascii=False,
+        indent=2,
+    )
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(payload)
+    return payload
+
+
+def reset():
+    with _lock:
+        _records.clear()
@@ -1,16 +1,42 @@
+import hashlib
 import os
 import ssl
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 
-import httpx
+import numpy as np
+import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
-from google import genai
 
 ssl._create_default_https_context = ssl._create_unverified_context
 # Khởi tạo đối tượng GeminiAI với API key của bạn
 load_dotenv()
 
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+MODEL = "gemini-2.0-flash"
+# LLM_BACKEND=stub dùng mô hình giả lập cục bộ (chạy offline, không cần API key)
+BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+PROMPT_TEMPLATE = (
+    "Đóng vai trò là một chuyên viên phân tích tài chính. Tôi sẽ cung cấp bản tóm tắt dữ liệu "
+    "gồm thống kê chính và các dòng dữ liệu đã lấy mẫu. Hãy đọc, xử lý và phân tích dữ liệu đó, "
+    "cung cấp các nhận định về tình hình tài chính hoặc xu hướng dựa trên số liệu, trả lời dưới "
+    "dạng bảng markdown. {prompt}. Dữ liệu chi tiết:\n{data}"
+)
+
+# Giới hạn kích thước phần dữ liệu trong prompt
+MAX_SUMMARY_ROWS = 30
+MAX_SUMMARY_CHARS = 6000
+SIGNIFICANT_DIGITS = 4
+
+CACHE_TTL = timedelta(hours=6)
+CACHE_MAX_ENTRIES = 128
+
+# Thời gian tối đa cho một lượt phân tích và chu kỳ cập nhật giao diện khi đang sinh chữ
+TIMEOUT_SECONDS = 120
+POLL_SECONDS = 0.3
 
 generation_config = {
     "temperature": 1,
@@ -20,9 +46,334 @@ generation_config = {
     "response_mime_type": "text/plain",
 }
 
+_client = None
+_client_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+_metrics = deque(maxlen=200)
+
+
+def get_client():
+    """Tạo client Gemini ở lần gọi đầu tiên thay vì lúc import module"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai
+
+            _client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        return _client
+
+
+def _estimate_tokens(text):
+    """Ước lượng số token (~4 ký tự/token) khi backend không trả về usage"""
+    return max(1, len(text) // 4)
+
+
+class StubModel:
+    """Mô hình giả lập: trả lời xác định từ prompt, dùng để chạy thử khi không có mạng"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.usage = None
+
+    def generate(self, model, prompt):
+        return "".join(self.stream(model, prompt))
+
+    def stream(self, model, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        text = (
+            f"| Mô hình | Độ dài prompt | Mã prompt |\n|---|---|---|\n"
+            f"| {model} (stub) | {len(prompt)} ký tự | {digest} |"
+        )
+        for word in text.split(" "):
+            time.sleep(self.delay)
+            yield word + " "
+        self.usage = {
+            "prompt_tokens": _estimate_tokens(prompt),
+            "output_tokens": len(text.split()),
+        }
+
+
+class GeminiModel:
+    def __init__(self):
+        self.usage = None
 
-def analysis_with_ai(df, prompt):
-    if st.button("Phân tích dữ liệu với AI"):
-        prompt = f"Đóng vai trò là một chuyên viên phân tích tài chính. Tôi sẽ cung cấp bảng dữ liệu dưới dạng bảng Markdown. Hãy đọc, xử lý và phân tích dữ liệu đó, cung cấp các nhận định về tình hình tài chính hoặc xu hướng dựa trên số liệu trong bảng trả lời dưới dạng bảng markdown. {prompt}.Dữ liệu chi tiết:  {df.to_string()} "
-        res = client.models.generate_content(model="gemini-2.0-flash", contents=prompt)
+    def generate(self, model, prompt):
+        res = get_client().models.generate_content(model=model, contents=prompt)
         return res.text
+
+    def stream(self, model, prompt):
+        for chunk in get_client().models.generate_content_stream(model=model, contents=prompt):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage is not None:
+                self.usage = {
+                    "prompt_tokens": usage.prompt_token_count,
+                    "output_tokens": usage.candidates_token_count,
+                }
+            if chunk.text:
+                yield chunk.text
+
+
+def get_backend(name=None):
+    return StubModel() if (name or BACKEND) == "stub" else GeminiModel()
+
+
+def _round(values):
+    """Làm tròn theo số chữ số có nghĩa để giữ được cả giá (hàng chục nghìn) lẫn tỷ lệ (0.0x)"""
+    values = values.astype(float)
+    magnitude = np.floor(np.log10(np.abs(values.where(values != 0))))
+    decimals = (SIGNIFICANT_DIGITS - 1 - magnitude).clip(lower=0).fillna(0).astype(int)
+    return pd.Series(
+        [round(v, d) if pd.notna(v) else v for v, d in zip(values, decimals)], index=values.index
+    )
+
+
+def _format(value):
+    return np.format_float_positional(value, trim="-")
+
+
+def _sample_rows(df, max_rows):
+    """Lấy mẫu đều theo thời gian, luôn giữ dòng đầu và dòng cuối"""
+    if len(df) <= max_rows:
+        return df
+    positions = np.unique(np.linspace(0, len(df) - 1, max_rows).round().astype(int))
+    return df.iloc[positions]
+
+
+def compact_data(df, max_rows=MAX_SUMMARY_ROWS, max_chars=MAX_SUMMARY_CHARS):
+    """Tóm tắt DataFrame thành văn bản có giới hạn độ dài
+
+    Gồm thống kê chính tính sẵn (đầu/cuối kỳ, thay đổi, min, max, trung bình) của các cột số
+    và các dòng lấy mẫu đều đã làm tròn, thay cho toàn bộ `df.to_string()`.
+    """
+    numeric = df.select_dtypes(include="number")
+    first, last = numeric.iloc[0], numeric.iloc[-1]
+    stats = pd.DataFrame(
+        {
+            "đầu kỳ": first,
+            "cuối kỳ": last,
+            "thay đổi %": (last / first.replace(0, np.nan) - 1) * 100,
+            "min": numeric.min(),
+            "max": numeric.max(),
+            "trung bình": numeric.mean(),
+        }
+    ).apply(_round)
+
+    rows = numeric.apply(_round)
+    labels = df.select_dtypes(exclude="number")
+    if not labels.empty:
+        rows = pd.concat([labels.astype(str), rows], axis=1)
+
+    while True:
+        sample = _sample_rows(rows, max_rows)
+        text = (
+            f"Số dòng gốc: {len(df)}\n\n"
+            f"Thống kê chính:\n{stats.to_string(float_format=_format)}\n\n"
+            f"Dữ liệu lấy mẫu ({len(sample)} dòng):\n"
+            f"{sample.to_string(index=False, float_format=_format)}"
+        )
+        if len(text) <= max_chars or max_rows <= 2:
+            return text[:max_chars]
+        max_rows //= 2
+
+
+def build_prompt(prompt, data):
+    return PROMPT_TEMPLATE.format(prompt=prompt.strip(), data=data)
+
+
+def cache_key(model, prompt, data, backend=None):
+    # Backend nằm trong khóa: câu trả lời của stub không được dùng lại cho lượt gọi thật
+    payload = "\x1f".join([backend or BACKEND, model, PROMPT_TEMPLATE, prompt.strip(), data])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at < datetime.now():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return text
+
+
+def _cache_put(key, text):
+    with _cache_lock:
+        _cache[key] = (datetime.now() + CACHE_TTL, text)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+class AnalysisJob:
+    """Một lượt phân tích chạy ở luồng nền; giao diện đọc dần `text` trong lúc mô hình sinh chữ"""
+
+    def __init__(self, model, prompt, key, backend=None, timeout=TIMEOUT_SECONDS):
+        self.model = model
+        self.prompt = prompt
+        self.key = key
+        self.backend = get_backend(backend)
+        self.timeout = timeout
+        self.status = "running"
+        self.error = None
+        self.cached = False
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self._chunks = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_cache(cls, model, prompt, key, text, backend=None):
+        job = cls(model, prompt, key, backend)
+        job._chunks.append(text)
+        job.cached = True
+        job.first_token_at = job.started_at
+        job._finish("done")
+        return job
+
+    @property
+    def text(self):
+        with self._lock:
+            return "".join(self._chunks)
+
+    @property
+    def running(self):
+        return self.status == "running"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self, status="cancelled"):
+        """Dừng nhận thêm chữ; luồng nền tự thoát ở chunk kế tiếp"""
+        self._cancel.set()
+        self._finish(status)
+
+    def check_timeout(self):
+        """Gọi từ giao diện: hết giờ cả khi backend đang treo chờ chunk đầu tiên"""
+        if self.running and time.perf_counter() - self.started_at > self.timeout:
+            self.cancel("timeout")
+
+    def _run(self):
+        try:
+            for chunk in self.backend.stream(self.model, self.prompt):
+                if self._cancel.is_set():
+                    break
+                with self._lock:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.perf_counter()
+                    self._chunks.append(chunk)
+                self.check_timeout()
+            self._finish("done")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self._finish("error")
+
+    def _finish(self, status):
+        with self._lock:
+            if self.status != "running":
+                return
+            self.status = status
+            self.finished_at = time.perf_counter()
+        if status == "done" and not self.cached:
+            _cache_put(self.key, self.text)
+        _metrics.append(self.metrics())
+
+    def metrics(self):
+        end = self.finished_at or time.perf_counter()
+        # Lượt trả từ cache không gọi mô hình nên không tốn token
+        usage = (
+            {"prompt_tokens": 0, "output_tokens": 0}
+            if self.cached
+            else getattr(self.backend, "usage", None) or {}
+        )
+        return {
+            "time": datetime.now(),
+            "model": self.model,
+            "status": self.status,
+            "cached": self.cached,
+            "ttft_s": (
+                round(self.first_token_at - self.started_at, 3) if self.first_token_at else None
+            ),
+            "latency_s": round(end - self.started_at, 3),
+            "prompt_tokens": usage.get("prompt_tokens", _estimate_tokens(self.prompt)),
+            "output_tokens": usage.get("output_tokens", _estimate_tokens(self.text)),
+        }
+
+
+def start_analysis(df, prompt, model=MODEL, backend=None, timeout=TIMEOUT_SECONDS):
+    """Khởi động phân tích ở luồng nền; trả về ngay job đã hoàn tất nếu có trong cache"""
+    data = compact_data(df)
+    key = cache_key(model, prompt, data, backend)
+    text = _cache_get(key)
+    if text is not None:
+        return AnalysisJob.from_cache(model, prompt, key, text, backend)
+    job = AnalysisJob(model, build_prompt(prompt, data), key, backend, timeout)
+    return job.start()
+
+
+def generate_analysis(df, prompt, model=MODEL, backend=None, timeout=TIMEOUT_SECONDS):
+    """Bản đồng bộ: chờ job chạy xong và trả về toàn bộ câu trả lời"""
+    job = start_analysis(df, prompt, model, backend, timeout)
+    while job.running:
+        time.sleep(0.05)
+        job.check_timeout()
+    if job.error:
+        raise RuntimeError(job.error)
+    return job.text
+
+
+def call_metrics():
+    """Độ trễ, thời gian tới token đầu và số token của các lượt gọi gần đây"""
+    return pd.DataFrame(list(_metrics))
+
+
+def _render_job(state_key):
+    job = st.session_state.get(state_key)
+    if job is None:
+        return
+    job.check_timeout()
+    if job.running:
+        st.markdown(job.text + "▌")
+        st.button("Dừng phân tích", key=f"{state_key}_cancel", on_click=job.cancel)
+        return
+
+    if job.text:
+        st.success(job.text)
+    if job.status == "error":
+        st.error(f"Lỗi khi phân tích AI: {job.error}")
+    elif job.status in ("cancelled", "timeout"):
+        st.warning("Đã dừng phân tích." if job.status == "cancelled" else "Quá thời gian chờ.")
+    metrics = job.metrics()
+    st.caption(
+        f"Token đầu: {metrics['ttft_s']}s · Tổng: {metrics['latency_s']}s · "
+        f"Token vào/ra: {metrics['prompt_tokens']}/{metrics['output_tokens']}"
+        + (" · cache" if job.cached else "")
+    )
+    if st.session_state.pop(f"{state_key}_polling", False):
+        # Job vừa xong trong lúc fragment đang tự làm mới: chạy lại một lần để tắt polling
+        st.rerun()
+
+
+def analysis_with_ai(df, prompt, model=MODEL, key="ai_analysis"):
+    """Nút phân tích AI: sinh chữ ở luồng nền, chỉ phần kết quả được vẽ lại khi có chữ mới"""
+    if st.button("Phân tích dữ liệu với AI", key=f"{key}_button"):
+        previous = st.session_state.get(key)
+        if previous is not None and previous.running:
+            previous.cancel()
+        st.session_state[key] = start_analysis(df, prompt, model)
+
+    job = st.session_state.get(key)
+    if job is None:
+        return None
+    polling = job.running
+    st.session_state[f"{key}_polling"] = polling
+    st.fragment(_render_job, run_every=POLL_SECONDS if polling else None)(key)
+    return job
@@ -0,0 +1,100 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+# Khóa đọc-sửa-ghi file manifest giữa các luồng
+_lock = threading.Lock()
+# Batch đang mở trong context hiện tại; luồng con nhận được qua `instrumentation.submit`
+_batch = contextvars.ContextVar("manifest_batch", default=None)
+
+
+class Manifest:
+    """Manifest JSON của một kho dữ liệu theo mã (ngày backfill, lần kiểm tra cuối)
+
+    Ngoài batch mỗi lần cập nhật ghi lại file (nguyên tử). Trong `batch()` file chỉ được đọc
+    một lần và ghi một lần khi batch kết thúc, tránh đọc/ghi lại toàn bộ manifest cho mỗi mã.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        return json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def _write(self, manifest):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, self.path)
+
+    def get(self, stock):
+        current = _batch.get()
+        if current is not None:
+            return current.get(self, stock)
+        return self.read().get(stock)
+
+    def update(self, stock, entry):
+        current = _batch.get()
+        if current is not None:
+            current.update(self, stock, entry)
+            return
+        with _lock:
+            manifest = self.read()
+            manifest[stock] = entry
+            self._write(manifest)
+
+
+class ManifestBatch:
+    """Các cập nhật manifest đang chờ ghi của một batch, theo từng file"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._pending = {}
+
+    def get(self, manifest, stock):
+        with self._lock:
+            pending = self._pending.get(manifest.path, {})
+            if stock in pending:
+                return pending[stock]
+            if manifest.path not in self._snapshots:
+                self._snapshots[manifest.path] = manifest.read()
+            return self._snapshots[manifest.path].get(stock)
+
+    def update(self, manifest, stock, entry):
+        with self._lock:
+            self._pending.setdefault(manifest.path, {})[stock] = entry
+
+    def flush(self):
+        with self._lock, _lock:
+            for path, entries in self._pending.items():
+                manifest = Manifest(path)
+                # Đọc lại để giữ các mục được ghi ngoài batch trong lúc batch chạy
+                current = manifest.read()
+                current.update(entries)
+                manifest._write(current)
+            self._pending.clear()
+            self._snapshots.clear()
+
+
+@contextmanager
+def batch():
+    """Gom các cập nhật manifest trong context hiện tại, ghi mỗi file một lần khi kết thúc
+
+    Chỉ các lời gọi trong cùng context (và luồng con được giao việc qua
+    `instrumentation.submit`) dùng batch; các luồng khác vẫn ghi manifest ngay như thường.
+    Batch lồng nhau dùng chung batch ngoài cùng.
+    """
+    current = _batch.get()
+    if current is not None:
+        yield current
+        return
+    current = ManifestBatch()
+    token = _batch.set(current)
+    try:
+        yield current
+    finally:
+        _batch.reset(token)
+        current.flush()
@@ -11,6 +11,9 @@ from vnstock import Vnstock
 
 from src.config import RAW_DATA_DIR
 from src.features import fetch_cashflow_market
+from src.figure_cache import memoize_figure
+from src.instrumentation import cache_miss, instrument, submit
+from src.sections import section
 
 
 def get_list_stock(exchange):
@@ -22,16 +25,229 @@ def get_list_stock(exchange):
     return df["symbol"].to_list()
 
 
-def overview_market():
-    st.title("Vincent Stock Market Dashboard")
-    date = datetime.now().strftime("%Y-%m-%d")
-    date = st.date_input("Chọn ngày", date)
-    # Allow user to choose between VN100 or all stocks
-    stock_list_choice = st.radio("Chọn danh sách cổ phiếu:", ["VN100", "Tất cả cổ phiếu sàn HOSE"])
-    if stock_list_choice == "VN100":
-        stock_by_exchange = pd.read_csv(RAW_DATA_DIR / "list_VN100.csv")["symbol"].tolist()
-    else:
-        stock_by_exchange = pd.read_csv(RAW_DATA_DIR / "list_stock.csv")["symbol"].tolist()
+@memoize_figure(page="overview_market")
+def plot_top_trading_value(volume_df):
+    """Top 10 mã theo giá trị giao dịch"""
+    # Plot total trading value for top 10 stocks
+    fig = px.bar(
+        volume_df,
+        x="code",
+        y="totalVal",
+        title="Top 10 Cổ Phiếu theo Khối Lượng Giao Dịch",
+        text_auto=".2s",
+        color="totalVal",
+        color_continuous_scale="Viridis",
+        labels={"totalVal": "Total Trading Value", "code": "Stock Code"},
+    )
+    fig.update_layout(xaxis_title="Stock Code", yaxis_title="Total Value")
+    return fig
+
+
+@memoize_figure(page="overview_market")
+def plot_buy_sell_balance(df):
+    """Giá trị mua/bán chủ động và tỷ lệ mua của từng mã"""
+    # Create a figure with buy/sell ratio
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    # Add total values
+    buy_sell_df = df.sort_values(by="totalVal", ascending=False)
+
+    # Add bars for buy and sell values
+    fig.add_trace(
+        go.Bar(
+            x=buy_sell_df["code"],
+            y=buy_sell_df["totalBuyVal"],
+            name="Total Buy Value",
+            marker_color="green",
+            opacity=0.7,
+        )
+    )
+
+    fig.add_trace(
+        go.Bar(
+            x=buy_sell_df["code"],
+            y=buy_sell_df["totalSellVal"],
+            name="Total Sell Value",
+            marker_color="red",
+            opacity=0.7,
+        )
+    )
+
+    # Add line for buy proportion
+    fig.add_trace(
+        go.Scatter(
+            x=buy_sell_df["code"],
+            y=buy_sell_df["buyProportion"],
+            mode="lines+markers",
+            name="Buy Proportion (%)",
+            marker=dict(size=8, color="blue"),
+            line=dict(width=2),
+        ),
+        secondary_y=True,
+    )
+
+    # Add 50% line to show equal buy/sell
+    fig.add_trace(
+        go.Scatter(
+            x=buy_sell_df["code"],
+            y=[50] * len(buy_sell_df),
+            mode="lines",
+            name="Equal Buy/Sell (50%)",
+            line=dict(color="orange", width=1, dash="dash"),
+        ),
+        secondary_y=True,
+    )
+
+    # Update layout
+    fig.update_layout(
+        title_text="Buy vs. Sell Values by Stock",
+        barmode="group",
+        xaxis_title="Stock Code",
+        yaxis_title="Value",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+    )
+
+    fig.update_yaxes(title_text="Value", secondary_y=False)
+    fig.update_yaxes(title_text="Buy Proportion (%)", secondary_y=True)
+    return fig
+
+
+@memoize_figure(page="overview_market")
+def plot_net_value_by_category(net_df):
+    """Giá trị ròng theo nhóm nhà giao dịch của 10 mã lớn nhất"""
+    # Create figure for net values
+    fig = px.bar(
+        net_df.head(10),
+        x="code",
+        y=["netTopVal", "netMidVal", "netBotVal"],
+        title="Net Buy/Sell Value by Trader Category (Top/Mid/Bot)",
+        labels={"value": "Net Value", "code": "Stock Code", "variable": "Trader Category"},
+        color_discrete_map={
+            "netTopVal": "#1f77b4",
+            "netMidVal": "#ff7f0e",
+            "netBotVal": "#2ca02c",
+        },
+        barmode="group",
+    )
+
+    fig.update_layout(
+        xaxis_title="Stock Code",
+        yaxis_title="Net Value (Buy - Sell)",
+        legend_title="Trader Category",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+    )
+
+    # Add a horizontal line at y=0
+    fig.add_shape(
+        type="line",
+        x0=-0.5,
+        y0=0,
+        x1=len(net_df.head(10)) - 0.5,
+        y1=0,
+        line=dict(color="black", width=1, dash="dash"),
+    )
+    return fig
+
+
+@memoize_figure(page="overview_market")
+def plot_trader_activity(top_trader_net, mid_trader_net, bot_trader_net):
+    """Giá trị ròng toàn thị trường theo nhóm nhà giao dịch"""
+    fig = px.bar(
+        x=["Top Traders", "Mid Traders", "Bot Traders"],
+        y=[top_trader_net, mid_trader_net, bot_trader_net],
+        title="Net Activity by Trader Category (Market-wide)",
+        labels={"x": "Trader Category", "y": "Net Value"},
+        color=["Top Traders", "Mid Traders", "Bot Traders"],
+        text_auto=".2s",
+    )
+
+    fig.update_layout(xaxis_title="Trader Category", yaxis_title="Net Value")
+    return fig
+
+
+@memoize_figure(page="overview_market")
+def plot_trader_concentration(df, trader_type):
+    """Mức độ tập trung mua/bán của một nhóm nhà giao dịch"""
+    net_col = f"net{trader_type}Val"
+
+    # Create a scatter plot of concentration metrics
+    fig = px.scatter(
+        df,
+        x=f"{trader_type.lower()}BuyConcentration",
+        y=f"{trader_type.lower()}SellConcentration",
+        size="totalVal",
+        color=net_col,
+        hover_name="code",
+        text="code",
+        title=f"Phân tích lựa chọn các nhà giao dịch {trader_type}",
+        labels={
+            f"{trader_type.lower()}BuyConcentration": f"{trader_type} Trader Buy Concentration (%)",
+            f"{trader_type.lower()}SellConcentration": f"{trader_type} Trader Sell Concentration (%)",
+            "totalVal": "Total Trading Value",
+            net_col: f"Net {trader_type} Trader Value",
+        },
+        color_continuous_scale="RdYlGn",
+        range_color=[-df[net_col].abs().max(), df[net_col].abs().max()],
+    )
+
+    # Add 45-degree line (equal buy/sell concentration)
+    max_val = max(
+        df[f"{trader_type.lower()}BuyConcentration"].max(),
+        df[f"{trader_type.lower()}SellConcentration"].max(),
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=[0, max_val],
+            y=[0, max_val],
+            mode="lines",
+            line=dict(color="orange", width=1, dash="dash"),
+            name="Equal Concentration",
+        )
+    )
+
+    fig.update_traces(
+        textposition="top center", marker=dict(line=dict(width=1, color="DarkSlateGrey"))
+    )
+    text_all = df["code"]
+    top_symbols = df.nlargest(30, "totalVal")["code"].tolist()
+    text_top30 = df["code"].where(df["code"].isin(top_symbols), "")
+
+    fig.update_layout(
+        xaxis_title=f"{trader_type} Trader Buy Concentration (%)",
+        yaxis_title=f"{trader_type} Trader Sell Concentration (%)",
+        updatemenus=[
+            {
+                "buttons": [
+                    {
+                        "label": "Top 30",
+                        "method": "update",
+                        "args": [{"text": [text_top30]}],  # list text cùng độ dài
+                    },
+                    {"label": "All", "method": "update", "args": [{"text": [text_all]}]},
+                    {
+                        "label": "None",
+                        "method": "update",
+                        "args": [{"text": [""]}],  # ẩn hết
+                    },
+                ],
+                "direction": "down",
+            }
+        ],
+    )
+    return fig
+
+
+def get_stock_list(choice):
+    if choice == "VN100":
+        return pd.read_csv(RAW_DATA_DIR / "list_VN100.csv")["symbol"].tolist()
+    return pd.read_csv(RAW_DATA_DIR / "list_stock.csv")["symbol"].tolist()
+
+
+@instrument("get_market_cashflow", cached=True)
+@st.cache_data(ttl=3600)
+@cache_miss
+def get_market_cashflow(stock_list, date, with_progress=False):
+    """Dòng tiền chủ động của danh sách mã trong ngày, lấy đa luồng"""
 
     # --- ĐA LUỒNG ---
     def fetch_one(ticker):
@@ -43,22 +259,35 @@ def overview_market():
             return pd.DataFrame()  # hoặc None
 
     dfs = []
-    progress_bar = st.progress(0, text="Đang lấy dữ liệu các mã...")
+    progress_bar = st.progress(0, text="Đang lấy dữ liệu các mã...") if with_progress else None
 
     with ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {executor.submit(fetch_one, ticker): ticker for ticker in stock_by_exchange}
-        total = len(stock_by_exchange)
+        futures = {submit(executor, fetch_one, ticker): ticker for ticker in stock_list}
+        total = len(stock_list)
         for i, future in enumerate(as_completed(futures), 1):
             df_cf = future.result()
             if df_cf is not None and not df_cf.empty:
                 dfs.append(df_cf)
-            progress_bar.progress(i / total, text=f"Đã lấy {i}/{total} mã...")
+            if progress_bar:
+                progress_bar.progress(i / total, text=f"Đã lấy {i}/{total} mã...")
 
-    progress_bar.empty()  # Ẩn progress bar khi xong
+    if progress_bar:
+        progress_bar.empty()  # Ẩn progress bar khi xong
 
-    if dfs:
-        df = pd.concat(dfs, ignore_index=True)
-    else:
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+
+@section("overview_market")
+def overview_market():
+    st.title("Vincent Stock Market Dashboard")
+    date = datetime.now().strftime("%Y-%m-%d")
+    date = st.date_input("Chọn ngày", date)
+    # Allow user to choose between VN100 or all stocks
+    stock_list_choice = st.radio("Chọn danh sách cổ phiếu:", ["VN100", "Tất cả cổ phiếu sàn HOSE"])
+    stock_by_exchange = tuple(get_stock_list(stock_list_choice))
+
+    df = get_market_cashflow(stock_by_exchange, date, with_progress=True)
+    if df.empty:
         st.error("Không lấy được dữ liệu cho bất kỳ mã nào!")
         return
 
@@ -85,18 +314,7 @@ def overview_market():
         # Sort by total value
         volume_df = df.sort_values(by="totalVal", ascending=False).head(10)
 
-        # Plot total trading value for top 10 stocks
-        fig = px.bar(
-            volume_df,
-            x="code",
-            y="totalVal",
-            title="Top 10 Cổ Phiếu theo Khối Lượng Giao Dịch",
-            text_auto=".2s",
-            color="totalVal",
-            color_continuous_scale="Viridis",
-            labels={"totalVal": "Total Trading Value", "code": "Stock Code"},
-        )
-        fig.update_layout(xaxis_title="Stock Code", yaxis_title="Total Value")
+        fig = plot_top_trading_value(volume_df)
         st.plotly_chart(fig, use_container_width=True)
 
         # Key insights
@@ -127,69 +345,7 @@ def overview_market():
         )
         df["buyProportion"] = df["totalBuyVal"] / (df["totalBuyVal"] + df["totalSellVal"]) * 100
 
-        # Create a figure with buy/sell ratio
-        fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-        # Add total values
-        buy_sell_df = df.sort_values(by="totalVal", ascending=False)
-
-        # Add bars for buy and sell values
-        fig.add_trace(
-            go.Bar(
-                x=buy_sell_df["code"],
-                y=buy_sell_df["totalBuyVal"],
-                name="Total Buy Value",
-                marker_color="green",
-                opacity=0.7,
-            )
-        )
-
-        fig.add_trace(
-            go.Bar(
-                x=buy_sell_df["code"],
-                y=buy_sell_df["totalSellVal"],
-                name="Total Sell Value",
-                marker_color="red",
-                opacity=0.7,
-            )
-        )
-
-        # Add line for buy proportion
-        fig.add_trace(
-            go.Scatter(
-                x=buy_sell_df["code"],
-                y=buy_sell_df["buyProportion"],
-                mode="lines+markers",
-                name="Buy Proportion (%)",
-                marker=dict(size=8, color="blue"),
-                line=dict(width=2),
-            ),
-            secondary_y=True,
-        )
-
-        # Add 50% line to show equal buy/sell
-        fig.add_trace(
-            go.Scatter(
-                x=buy_sell_df["code"],
-                y=[50] * len(buy_sell_df),
-                mode="lines",
-                name="Equal Buy/Sell (50%)",
-                line=dict(color="orange", width=1, dash="dash"),
-            ),
-            secondary_y=True,
-        )
-
-        # Update layout
-        fig.update_layout(
-            title_text="Buy vs. Sell Values by Stock",
-            barmode="group",
-            xaxis_title="Stock Code",
-            yaxis_title="Value",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-        )
-
-        fig.update_yaxes(title_text="Value", secondary_y=False)
-        fig.update_yaxes(title_text="Buy Proportion (%)", secondary_y=True)
+        fig = plot_buy_sell_balance(df)
 
         st.plotly_chart(fig, use_container_width=True)
 
@@ -222,37 +378,7 @@ def overview_market():
         # Sort by absolute net value
         net_df = df.sort_values(by="netVal", key=abs, ascending=False)
 
-        # Create figure for net values
-        fig = px.bar(
-            net_df.head(10),
-            x="code",
-            y=["netTopVal", "netMidVal", "netBotVal"],
-            title="Net Buy/Sell Value by Trader Category (Top/Mid/Bot)",
-            labels={"value": "Net Value", "code": "Stock Code", "variable": "Trader Category"},
-            color_discrete_map={
-                "netTopVal": "#1f77b4",
-                "netMidVal": "#ff7f0e",
-                "netBotVal": "#2ca02c",
-            },
-            barmode="group",
-        )
-
-        fig.update_layout(
-            xaxis_title="Stock Code",
-            yaxis_title="Net Value (Buy - Sell)",
-            legend_title="Trader Category",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-        )
-
-        # Add a horizontal line at y=0
-        fig.add_shape(
-            type="line",
-            x0=-0.5,
-            y0=0,
-            x1=len(net_df.head(10)) - 0.5,
-            y1=0,
-            line=dict(color="black", width=1, dash="dash"),
-        )
+        fig = plot_net_value_by_category(net_df)
 
         st.plotly_chart(fig, use_container_width=True)
 
@@ -281,16 +407,7 @@ def overview_market():
         mid_trader_net = df["netMidVal"].sum()
         bot_trader_net = df["netBotVal"].sum()
 
-        fig = px.bar(
-            x=["Top Traders", "Mid Traders", "Bot Traders"],
-            y=[top_trader_net, mid_trader_net, bot_trader_net],
-            title="Net Activity by Trader Category (Market-wide)",
-            labels={"x": "Trader Category", "y": "Net Value"},
-            color=["Top Traders", "Mid Traders", "Bot Traders"],
-            text_auto=".2s",
-        )
-
-        fig.update_layout(xaxis_title="Trader Category", yaxis_title="Net Value")
+        fig = plot_trader_activity(top_trader_net, mid_trader_net, bot_trader_net)
 
         st.plotly_chart(fig, use_container_width=True)
 
@@ -306,77 +423,13 @@ def overview_market():
             # Dynamic column names based on trader type
             buy_col = f"{trader_type.lower()}ActiveBuyVal"
             sell_col = f"{trader_type.lower()}ActiveSellVal"
-            net_col = f"net{trader_type}Val"
 
             # Calculate concentration metrics
             df[f"{trader_type.lower()}BuySellRatio"] = df[buy_col] / df[sell_col]
             df[f"{trader_type.lower()}BuyConcentration"] = df[buy_col] / df["totalVal"] * 100
             df[f"{trader_type.lower()}SellConcentration"] = df[sell_col] / df["totalVal"] * 100
 
-            # Create a scatter plot of concentration metrics
-            fig = px.scatter(
-                df,
-                x=f"{trader_type.lower()}BuyConcentration",
-                y=f"{trader_type.lower()}SellConcentration",
-                size="totalVal",
-                color=net_col,
-                hover_name="code",
-                text="code",
-                title=f"Phân tích lựa chọn các nhà giao dịch {trader_type}",
-                labels={
-                    f"{trader_type.lower()}BuyConcentration": f"{trader_type} Trader Buy Concentration (%)",
-                    f"{trader_type.lower()}SellConcentration": f"{trader_type} Trader Sell Concentration (%)",
-                    "totalVal": "Total Trading Value",
-                    net_col: f"Net {trader_type} Trader Value",
-                },
-                color_continuous_scale="RdYlGn",
-                range_color=[-df[net_col].abs().max(), df[net_col].abs().max()],
-            )
-
-            # Add 45-degree line (equal buy/sell concentration)
-            max_val = max(
-                df[f"{trader_type.lower()}BuyConcentration"].max(),
-                df[f"{trader_type.lower()}SellConcentration"].max(),
-            )
-            fig.add_trace(
-                go.Scatter(
-                    x=[0, max_val],
-                    y=[0, max_val],
-                    mode="lines",
-                    line=dict(color="orange", width=1, dash="dash"),
-                    name="Equal Concentration",
-                )
-            )
-
-            fig.update_traces(
-                textposition="top center", marker=dict(line=dict(width=1, color="DarkSlateGrey"))
-            )
-            text_all = df["code"]
-            top_symbols = df.nlargest(30, "totalVal")["code"].tolist()
-            text_top30 = df["code"].where(df["code"].isin(top_symbols), "")
-
-            fig.update_layout(
-                xaxis_title=f"{trader_type} Trader Buy Concentration (%)",
-                yaxis_title=f"{trader_type} Trader Sell Concentration (%)",
-                updatemenus=[
-                    {
-                        "buttons": [
-                            {
-                                "label": "Top 30",
-                                "method": "update",
-                                "args": [{"text": [text_top30]}],  # list text cùng độ dài
-                            },
-                            {"label": "All", "method": "update", "args": [{"text": [text_all]}]},
-                            {
-                                "label": "None",
-                                "method": "update",
-                                "args": [{"text": [""]}],  # ẩn hết
-                            },
-                        ],
-                        "direction": "down",
-                    }
-                ],
-            )
+            fig = plot_trader_concentration(df, trader_type)
 
             st.plotly_chart(fig, use_container_width=True)
 
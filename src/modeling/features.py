@@ -0,0 +1,234 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+from tqdm import tqdm
+
+from src.bar_store import BARS_DIR, read_bars, sync_bars, sync_universe
+from src.config import PROCESSED_DATA_DIR
+from src.foreign_store import FOREIGN_DIR, read_foreign, sync_foreign
+from src.modeling import registry
+from src.scan import list_universe
+
+app = typer.Typer()
+
+FEATURES_PATH = PROCESSED_DATA_DIR / "features.parquet"
+FEATURES_MANIFEST_PATH = PROCESSED_DATA_DIR / "features_manifest.json"
+FEATURES_ARTIFACT = "features"
+MIN_ROWS = 10
+
+# Đúng thứ tự cột của data/interim/cluster_data.csv
+FEATURE_COLUMNS = [
+    "code",
+    "foreign_holding",
+    "foreign_room_growth",
+    "sum_foreign_net_buy_3",
+    "close",
+    "close_pct_change_5",
+    "momentum_5",
+    "volatility_5",
+    "volume",
+    "vol_MA5",
+    "volume_change_3",
+    "sharpe",
+    "sortino",
+    "price_growth_5",
+    "foreign_holding_growth",
+    "avg_volume_5",
+]
+
+
+def calculate_sharpe_sortino(df, risk_free_rate=0.0):
+    daily_returns = df["close"].pct_change().dropna()
+    if len(daily_returns) < MIN_ROWS:
+        return np.nan, np.nan
+    sharpe = (daily_returns.mean() - risk_free_rate) / daily_returns.std()
+    downside_std = daily_returns[daily_returns < 0].std()
+    sortino = (
+        (daily_returns.mean() - risk_free_rate) / downside_std if downside_std != 0 else np.nan
+    )
+    return sharpe, sortino
+
+
+def compute_features(code, bars, foreign):
+    """Đặc trưng phân cụm của một mã từ nến ngày và dữ liệu khối ngoại (như notebook phân cụm)"""
+    if len(bars) < MIN_ROWS or len(foreign) < MIN_ROWS:
+        return None
+    foreign = foreign[["time", "totalRoom", "currentRoom"]].drop_duplicates("time")
+    foreign = foreign.assign(foreign_holding=foreign["totalRoom"] - foreign["currentRoom"])
+    bars = bars[["time", "close", "volume"]].drop_duplicates("time")
+
+    df = pd.merge(foreign, bars, on="time", how="inner").sort_values("time")
+    if len(df) < MIN_ROWS:
+        return None
+
+    df["foreign_holding_change"] = df["foreign_holding"].diff()
+    df["foreign_room_growth"] = df["foreign_holding"].pct_change(5)
+    df["foreign_net_buy_3"] = df["foreign_holding_change"].rolling(3).sum()
+    df["close_pct_change_5"] = df["close"].pct_change(5)
+    df["momentum_5"] = df["close"] - df["close"].shift(5)
+    df["volatility_5"] = df["close"].rolling(5).std()
+    df["volume_change_3"] = df["volume"].pct_change(3)
+    df["vol_MA5"] = df["volume"].rolling(5).mean()
+
+    sharpe, sortino = calculate_sharpe_sortino(df)
+
+    df = df.dropna().reset_index(drop=True)
+    if len(df) < 5:
+        return None
+    last = df.iloc[-1]
+    return {
+        "code": code,
+        "foreign_holding": last["foreign_holding"],
+        "foreign_room_growth": last["foreign_room_growth"],
+        "sum_foreign_net_buy_3": last["foreign_net_buy_3"],
+        "close": last["close"],
+        "close_pct_change_5": last["close_pct_change_5"],
+        "momentum_5": last["momentum_5"],
+        "volatility_5": last["volatility_5"],
+        "volume": last["volume"],
+        "vol_MA5": last["vol_MA5"],
+        "volume_change_3": last["volume_change_3"],
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "price_growth_5": (df["close"].iloc[-1] - df["close"].iloc[-5]) / df["close"].iloc[-5],
+        "foreign_holding_growth": (df["foreign_holding"].iloc[-1] - df["foreign_holding"].iloc[0])
+        / max(1, abs(df["foreign_holding"].iloc[0])),
+        "avg_volume_5": df["volume"].rolling(5).mean().iloc[-1],
+    }
+
+
+def _ticker_features(task):
+    """Chạy trong tiến trình con: tự đọc kho của mã để không phải truyền DataFrame qua pickle"""
+    code, start, end = task
+    try:
+        bars = read_bars(code)
+        foreign = read_foreign(code)
+        bars = bars[(bars["time"] >= start) & (bars["time"] <= end)]
+        foreign = foreign[(foreign["time"] >= start) & (foreign["time"] <= end)]
+        return code, compute_features(code, bars, foreign)
+    except Exception as e:
+        return code, f"{type(e).__name__}: {e}"
+
+
+def source_key(code, start):
+    """Dấu vết dữ liệu nguồn: đổi khi kho nến/khối ngoại của mã được ghi lại"""
+    parts = [start.strftime("%Y-%m-%d")]
+    for path in (BARS_DIR / f"{code}.parquet", FOREIGN_DIR / f"{code}.parquet"):
+        parts.append(str(path.stat().st_mtime_ns) if path.exists() else "-")
+    return "|".join(parts)
+
+
+def features_key(symbols, start, end):
+    """Khóa registry của bảng đặc trưng: mã nguồn, danh sách cột và trạng thái kho của từng mã"""
+    data = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "sources": {code: source_key(code, start) for code in symbols},
+    }
+    config = {"columns": FEATURE_COLUMNS, "min_rows": MIN_ROWS}
+    return registry.artifact_key(
+        FEATURES_ARTIFACT, registry.code_version(compute_features), config, data
+    )
+
+
+def build_features(symbols, start, end, output_path=FEATURES_PATH, max_workers=None, force=False):
+    """Tính lại đặc trưng cho các mã có dữ liệu mới và ghép với bảng cũ"""
+    manifest_path = output_path.with_name(FEATURES_MANIFEST_PATH.name)
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+    previous = (
+        pd.read_parquet(output_path)
+        if output_path.exists() and not force
+        else pd.DataFrame(columns=FEATURE_COLUMNS)
+    )
+
+    keys = {code: source_key(code, start) for code in symbols}
+    # Mã không có trong bảng cũ (vd. lần chạy trước chỉ một sàn) phải tính lại dù manifest khớp
+    stored = set(previous["code"])
+    due = [
+        code for code in symbols if force or manifest.get(code) != keys[code] or code not in stored
+    ]
+    logger.info(f"{len(due)}/{len(symbols)} symbols have new data")
+
+    rows, failed = [], 0
+    if due:
+        tasks = [(code, start, end) for code in due]
+        chunksize = max(1, len(tasks) // ((max_workers or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(_ticker_features, tasks, chunksize=chunksize)
+            for code, result in tqdm(results, total=len(tasks)):
+                if isinstance(result, str):
+                    logger.warning(f"{code}: {result}")
+                    failed += 1
+                    continue
+                if result is not None:
+                    rows.append(result)
+                manifest[code] = keys[code]
+
+    recomputed = set(due)
+    kept = previous[~previous["code"].isin(recomputed) & previous["code"].isin(symbols)]
+    features = pd.concat([kept, pd.DataFrame(rows, columns=FEATURE_COLUMNS)], ignore_index=True)
+    features = features.astype({column: float for column in FEATURE_COLUMNS[1:]})
+    features = features.replace([np.inf, -np.inf], np.nan).sort_values("code")
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(".tmp")
+    features.reset_index(drop=True).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return features, failed
+
+
+@app.command()
+def main(
+    output_path: Path = FEATURES_PATH,
+    start_date: str = "2025-01-01",
+    exchange: Optional[List[str]] = typer.Option(None, help="Giới hạn theo sàn (HSX, HNX...)"),
+    sync: bool = typer.Option(True, help="Cập nhật kho nến và khối ngoại trước khi tính"),
+    max_workers: Optional[int] = typer.Option(None, help="Số tiến trình (mặc định: số core)"),
+    force: bool = typer.Option(False, help="Tính lại toàn bộ, bỏ qua manifest"),
+):
+    symbols = list_universe(exchange)
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp.now().normalize()
+
+    if sync:
+        for name, sync_one in (("bars", sync_bars), ("foreign", sync_foreign)):
+            logger.info(f"Syncing {name} for {len(symbols)} symbols...")
+            _, failed = sync_universe(symbols, sync_one, start=start)
+            if failed:
+                logger.warning(f"{len(failed)} symbols failed to sync {name}")
+
+    key = features_key(symbols, start, end)
+    if registry.exists(FEATURES_ARTIFACT, key) and not force:
+        logger.info(f"Features {key} are up to date, skipping build")
+        # Luôn ghi lại bảng của đúng khóa này: file hiện có có thể là của vũ trụ mã khác
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_suffix(".tmp")
+        registry.load(FEATURES_ARTIFACT, key).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+        registry.set_latest(FEATURES_ARTIFACT, key)
+        return
+
+    features, failed = build_features(
+        symbols, start, end, output_path, max_workers=max_workers, force=force
+    )
+    if not failed:
+        registry.save(
+            FEATURES_ARTIFACT,
+            key,
+            features.reset_index(drop=True),
+            inputs={"symbols": len(symbols), "start": start, "end": end},
+            rows=len(features),
+        )
+    logger.success(f"Saved {len(features)} feature rows to {output_path} ({failed} failed)")
+
+
+if __name__ == "__main__":
+    app()
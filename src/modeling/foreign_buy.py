@@ -0,0 +1,202 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import classification_report
+from tqdm import tqdm
+
+from src.bar_store import read_bars, sync_bars, sync_universe
+from src.config import PROCESSED_DATA_DIR
+from src.foreign_store import read_foreign, sync_foreign
+from src.modeling import registry
+from src.modeling.features import source_key
+from src.scan import list_universe
+
+app = typer.Typer()
+
+FOREIGN_BUY_ARTIFACT = "foreign_buy"
+# Ma trận đặc trưng phiên mới nhất của cả vũ trụ (.npy để đọc bằng memory-map) và chỉ mục mã
+LATEST_FEATURES_PATH = PROCESSED_DATA_DIR / "foreign_buy_features.npy"
+LATEST_INDEX_PATH = PROCESSED_DATA_DIR / "foreign_buy_index.parquet"
+
+MIN_ROWS = 21
+HORIZON = 5
+THRESHOLD = 0.05
+LATEST_LOOKBACK_DAYS = 90
+
+FEATURE_COLS = [
+    "close",
+    "volume",
+    "MA5",
+    "MA20",
+    "vol_MA20",
+    "foreign_holding",
+    "foreign_MA5",
+    "foreign_net_buy",
+    "price_change",
+    "volume_change",
+]
+
+
+def compute_frame(code, bars, foreign):
+    """Đặc trưng theo phiên của một mã (giống notebook phân cụm, phần mô hình khối ngoại)"""
+    if bars.empty or foreign.empty:
+        return None
+    foreign = foreign[["time", "totalRoom", "currentRoom"]].drop_duplicates("time", keep="last")
+    foreign = foreign.assign(foreign_holding=foreign["totalRoom"] - foreign["currentRoom"])
+    bars = bars[["time", "close", "volume"]].drop_duplicates("time", keep="last")
+    df = pd.merge(foreign, bars, on="time", how="inner").sort_values("time")
+    if len(df) < MIN_ROWS:
+        return None
+
+    df["MA5"] = df["close"].rolling(5).mean()
+    df["MA20"] = df["close"].rolling(20).mean()
+    df["vol_MA20"] = df["volume"].rolling(20).mean()
+    df["foreign_MA5"] = df["foreign_holding"].rolling(5).mean()
+    df["foreign_net_buy"] = df["foreign_holding"].diff()
+    df["price_change"] = df["close"].pct_change()
+    df["volume_change"] = df["volume"].pct_change()
+    df = df.replace([np.inf, -np.inf], np.nan).dropna().reset_index(drop=True)
+    df["symbol"] = code
+    return df[["symbol", "time"] + FEATURE_COLS]
+
+
+def add_label(df, threshold=THRESHOLD, days=HORIZON):
+    """target = 1 nếu giá đóng cửa sau `days` phiên tăng từ `threshold` trở lên"""
+    future = df.groupby("symbol")["close"].shift(-days)
+    target = ((future - df["close"]) / df["close"] >= threshold).astype(float)
+    return df.assign(target=target.where(future.notna()))
+
+
+def _ticker_frame(task):
+    """Chạy trong tiến trình con: tự đọc kho của mã như build_features"""
+    code, start, end = task
+    try:
+        bars = read_bars(code)
+        foreign = read_foreign(code)
+        bars = bars[(bars["time"] >= start) & (bars["time"] <= end)]
+        foreign = foreign[(foreign["time"] >= start) & (foreign["time"] <= end)]
+        return code, compute_frame(code, bars, foreign)
+    except Exception as e:
+        return code, f"{type(e).__name__}: {e}"
+
+
+def build_frames(symbols, start, end, max_workers=None):
+    """Đặc trưng theo phiên của nhiều mã, tính song song trên nhiều tiến trình"""
+    tasks = [(code, start, end) for code in symbols]
+    chunksize = max(1, len(tasks) // ((max_workers or os.cpu_count() or 1) * 4))
+    frames = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(_ticker_frame, tasks, chunksize=chunksize)
+        for code, result in tqdm(results, total=len(tasks)):
+            if isinstance(result, str):
+                logger.warning(f"{code}: {result}")
+            elif result is not None:
+                frames.append(result)
+    if not frames:
+        return pd.DataFrame(columns=["symbol", "time"] + FEATURE_COLS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def save_latest_features(frame, features_path=LATEST_FEATURES_PATH, index_path=LATEST_INDEX_PATH):
+    """Lưu phiên mới nhất của từng mã: ma trận float64 liên tục (.npy) và chỉ mục mã"""
+    latest = frame.sort_values("time").groupby("symbol").tail(1).reset_index(drop=True)
+    features_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = features_path.with_suffix(".tmp.npy")
+    np.save(tmp_path, np.ascontiguousarray(latest[FEATURE_COLS].to_numpy(dtype=np.float64)))
+    os.replace(tmp_path, features_path)
+    tmp_path = index_path.with_suffix(".tmp")
+    latest[["symbol", "time", "close"]].to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, index_path)
+    return latest
+
+
+def refresh_latest_features(
+    symbols, end=None, lookback_days=LATEST_LOOKBACK_DAYS, max_workers=None
+):
+    """Chỉ dựng lại đặc trưng phiên mới nhất (đủ cửa sổ MA20) cho việc chấm điểm hằng ngày"""
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp.now().normalize()
+    start = end - pd.Timedelta(days=lookback_days)
+    return save_latest_features(build_frames(symbols, start, end, max_workers))
+
+
+def train_model(frame):
+    """Huấn luyện trên 80% phiên đầu (không xáo trộn), đánh giá trên 20% còn lại"""
+    labeled = add_label(frame.sort_values(["time", "symbol"], kind="stable"))
+    labeled = labeled.dropna(subset=FEATURE_COLS + ["target"])
+    X = labeled[FEATURE_COLS].to_numpy(dtype=np.float64)
+    y = labeled["target"].astype(int).to_numpy()
+
+    split = int(len(labeled) * 0.8)
+    model = HistGradientBoostingClassifier(max_iter=100, random_state=42)
+    model.fit(X[:split], y[:split])
+    report = classification_report(y[split:], model.predict(X[split:]), digits=3)
+    return model, report
+
+
+def model_key(symbols, start, end):
+    config = {
+        "features": FEATURE_COLS,
+        "horizon": HORIZON,
+        "threshold": THRESHOLD,
+        "min_rows": MIN_ROWS,
+    }
+    data = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "sources": {code: source_key(code, start) for code in symbols},
+    }
+    return registry.artifact_key(
+        FOREIGN_BUY_ARTIFACT, registry.code_version(compute_frame), config, data
+    )
+
+
+@app.command()
+def main(
+    start_date: str = "2024-10-01",
+    exchange: Optional[List[str]] = typer.Option(["HSX"], help="Giới hạn theo sàn (HSX, HNX...)"),
+    sync: bool = typer.Option(True, help="Cập nhật kho nến và khối ngoại trước khi huấn luyện"),
+    max_workers: Optional[int] = typer.Option(None, help="Số tiến trình (mặc định: số core)"),
+    force: bool = typer.Option(False, help="Huấn luyện lại dù đã có artifact cùng khóa"),
+):
+    symbols = list_universe(exchange)
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp.now().normalize()
+
+    if sync:
+        for name, sync_one in (("bars", sync_bars), ("foreign", sync_foreign)):
+            logger.info(f"Syncing {name} for {len(symbols)} symbols...")
+            _, failed = sync_universe(symbols, sync_one, start=start)
+            if failed:
+                logger.warning(f"{len(failed)} symbols failed to sync {name}")
+
+    key = model_key(symbols, start, end)
+    if registry.exists(FOREIGN_BUY_ARTIFACT, key) and not force:
+        registry.set_latest(FOREIGN_BUY_ARTIFACT, key)
+        logger.info(f"Foreign-buy model {key} is up to date, skipping training")
+        return
+
+    frame = build_frames(symbols, start, end, max_workers)
+    logger.info(f"Training foreign-buy model on {len(frame)} rows...")
+    model, report = train_model(frame)
+    logger.info(f"Hold-out report:\n{report}")
+
+    registry.save(
+        FOREIGN_BUY_ARTIFACT,
+        key,
+        {"model": model, "features": FEATURE_COLS},
+        inputs={"symbols": len(symbols), "start": start, "end": end},
+        rows=len(frame),
+        report=report,
+    )
+    save_latest_features(frame)
+    logger.success(f"Saved foreign-buy model {key}")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,29 +1,114 @@
+import os
+import threading
+import time
 from pathlib import Path
+from typing import List, Optional
 
+import numpy as np
+import pandas as pd
 import typer
 from loguru import logger
-from tqdm import tqdm
 
-from src.config import MODELS_DIR, PROCESSED_DATA_DIR
+from src.config import PROCESSED_DATA_DIR
+from src.modeling import registry
+from src.modeling.foreign_buy import (
+    FOREIGN_BUY_ARTIFACT,
+    LATEST_FEATURES_PATH,
+    LATEST_INDEX_PATH,
+    refresh_latest_features,
+)
+from src.scan import list_universe
 
 app = typer.Typer()
 
+PREDICTIONS_DIR = PROCESSED_DATA_DIR / "predictions"
+LATEST_PREDICTIONS_PATH = PREDICTIONS_DIR / "foreign_buy_latest.parquet"
+TOP_PREDICTIONS_PATH = PROCESSED_DATA_DIR / "ml_top_foreign_buy_stock.csv"
+BATCH_SIZE = 4096
+
+_lock = threading.Lock()
+_models = {}
+
+
+def load_model(key=None):
+    """Nạp mô hình từ registry một lần cho mỗi tiến trình; tự nạp lại khi có bản mới nhất khác"""
+    key = key or registry.latest_key(FOREIGN_BUY_ARTIFACT)
+    with _lock:
+        if key not in _models:
+            _models.clear()
+            _models[key] = registry.load(FOREIGN_BUY_ARTIFACT, key)
+        return _models[key]
+
+
+def load_features(features_path=LATEST_FEATURES_PATH, index_path=LATEST_INDEX_PATH):
+    """Ma trận đặc trưng (memory-map, không đọc cả file vào RAM) và chỉ mục mã tương ứng"""
+    return np.load(features_path, mmap_mode="r"), pd.read_parquet(index_path)
+
+
+def score(model, X, batch_size=BATCH_SIZE):
+    """Xác suất lớp 1 cho từng dòng của X, chấm theo lô để giới hạn bộ nhớ tạm"""
+    if len(X) == 0:
+        return np.empty(0)
+    return np.concatenate(
+        [
+            model.predict_proba(np.asarray(X[i : i + batch_size]))[:, 1]
+            for i in range(0, len(X), batch_size)
+        ]
+    )
+
+
+def predict_universe(
+    model_key=None,
+    features_path=LATEST_FEATURES_PATH,
+    index_path=LATEST_INDEX_PATH,
+    batch_size=BATCH_SIZE,
+):
+    """Chấm điểm phiên mới nhất của toàn bộ vũ trụ, sắp xếp theo xác suất giảm dần"""
+    bundle = load_model(model_key)
+    X, index = load_features(features_path, index_path)
+    predictions = index.assign(predict_prob=score(bundle["model"], X, batch_size))
+    return predictions.sort_values("predict_prob", ascending=False).reset_index(drop=True)
+
+
+def save_predictions(predictions, output_dir=PREDICTIONS_DIR):
+    """Ghi bản có phiên bản theo thời điểm chấm và cập nhật bản mới nhất (ghi nguyên tử)"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    version_path = output_dir / f"foreign_buy_{pd.Timestamp.now():%Y%m%d_%H%M%S}.parquet"
+    predictions.to_parquet(version_path, index=False)
+    latest_path = output_dir / LATEST_PREDICTIONS_PATH.name
+    tmp_path = latest_path.with_suffix(".tmp")
+    predictions.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, latest_path)
+    return version_path
+
+
+def read_latest_predictions(path=LATEST_PREDICTIONS_PATH):
+    if not path.exists():
+        return pd.DataFrame(columns=["symbol", "time", "close", "predict_prob"])
+    return pd.read_parquet(path)
+
 
 @app.command()
 def main(
-    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
-    features_path: Path = PROCESSED_DATA_DIR / "test_features.csv",
-    model_path: Path = MODELS_DIR / "model.pkl",
-    predictions_path: Path = PROCESSED_DATA_DIR / "test_predictions.csv",
-    # -----------------------------------------
+    model_key: Optional[str] = typer.Option(None, help="Khóa mô hình (mặc định: bản mới nhất)"),
+    output_dir: Path = PREDICTIONS_DIR,
+    refresh: bool = typer.Option(True, help="Dựng lại đặc trưng phiên mới nhất từ kho dữ liệu"),
+    exchange: Optional[List[str]] = typer.Option(None, help="Giới hạn theo sàn (HSX, HNX...)"),
+    max_workers: Optional[int] = typer.Option(None, help="Số tiến trình dựng đặc trưng"),
+    top_n: int = 20,
 ):
-    # ---- REPLACE THIS WITH YOUR OWN CODE ----
-    logger.info("Performing inference for model...")
-    for i in tqdm(range(10), total=10):
-        if i == 5:
-            logger.info("Something happened for iteration 5.")
-    logger.success("Inference complete.")
-    # -----------------------------------------
+    if refresh:
+        symbols = list_universe(exchange)
+        logger.info(f"Refreshing latest features for {len(symbols)} symbols...")
+        refresh_latest_features(symbols, max_workers=max_workers)
+
+    started = time.perf_counter()
+    predictions = predict_universe(model_key)
+    logger.info(f"Scored {len(predictions)} symbols in {time.perf_counter() - started:.3f}s")
+
+    version_path = save_predictions(predictions, output_dir)
+    predictions.head(top_n).to_csv(TOP_PREDICTIONS_PATH, index=False)
+    logger.success(f"Saved predictions to {version_path}")
 
 
 if __name__ == "__main__":
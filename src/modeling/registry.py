@@ -0,0 +1,150 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import joblib
+import pandas as pd
+from loguru import logger
+
+from src.config import MODELS_DIR
+
+REGISTRY_DIR = MODELS_DIR / "registry"
+ARTIFACT_FILE = "artifact.joblib"
+METADATA_FILE = "metadata.json"
+LATEST_FILE = "latest.json"
+
+_lock = threading.Lock()
+_load_stats = {}
+
+
+def _digest(payload):
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def code_version(*objects):
+    """Dấu vết mã nguồn: hash nội dung file của các module/hàm tạo ra artifact"""
+    sha = hashlib.sha256()
+    for obj in objects:
+        sha.update(Path(inspect.getsourcefile(obj)).read_bytes())
+    return sha.hexdigest()[:16]
+
+
+def file_hash(*paths):
+    """Hash nội dung các file dữ liệu đầu vào (file không tồn tại tính là rỗng)"""
+    sha = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        if path.exists():
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+        sha.update(b"\0")
+    return sha.hexdigest()[:16]
+
+
+def artifact_key(name, code, config, data):
+    """Khóa nội dung của artifact từ (phiên bản mã, cấu hình đặc trưng, khoảng dữ liệu)"""
+    return _digest({"name": name, "code": code, "config": config, "data": data})
+
+
+def artifact_dir(name, key):
+    return REGISTRY_DIR / name / key
+
+
+def exists(name, key):
+    path = artifact_dir(name, key)
+    return (path / ARTIFACT_FILE).exists() and (path / METADATA_FILE).exists()
+
+
+def latest_key(name):
+    path = REGISTRY_DIR / name / LATEST_FILE
+    return json.loads(path.read_text())["key"] if path.exists() else None
+
+
+def set_latest(name, key):
+    path = REGISTRY_DIR / name / LATEST_FILE
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"key": key, "updated_at": pd.Timestamp.now().isoformat()}))
+    os.replace(tmp_path, path)
+
+
+def save(name, key, obj, inputs=None, **metadata):
+    """Lưu artifact (không nén để đọc được bằng memory-map) kèm metadata, đánh dấu là bản mới nhất
+
+    Ghi vào thư mục tạm rồi đổi tên, nên tiến trình khác không bao giờ đọc phải bản dở dang.
+    """
+    path = artifact_dir(name, key)
+    tmp_dir = path.with_name(f".{key}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    started = time.perf_counter()
+    joblib.dump(obj, tmp_dir / ARTIFACT_FILE)
+    metadata = {
+        "name": name,
+        "key": key,
+        "created_at": pd.Timestamp.now().isoformat(),
+        "inputs": inputs or {},
+        "size_bytes": (tmp_dir / ARTIFACT_FILE).stat().st_size,
+        "save_seconds": round(time.perf_counter() - started, 4),
+        **metadata,
+    }
+    (tmp_dir / METADATA_FILE).write_text(json.dumps(metadata, indent=2, default=str))
+
+    with _lock:
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_dir, path)
+        set_latest(name, key)
+    logger.info(f"Registered {name}/{key} ({metadata['size_bytes'] / 1e6:.2f} MB)")
+    return path
+
+
+def load(name, key=None, mmap_mode="r"):
+    """Nạp artifact theo khóa (mặc định bản mới nhất)
+
+    Mảng NumPy được memory-map từ file nên nhiều tiến trình (vd. nhiều replica Streamlit)
+    dùng chung một bản trong page cache thay vì mỗi tiến trình giữ một bản trong RAM.
+    """
+    key = key or latest_key(name)
+    if key is None or not exists(name, key):
+        raise FileNotFoundError(f"Không có artifact {name}/{key} trong {REGISTRY_DIR}")
+    started = time.perf_counter()
+    obj = joblib.load(artifact_dir(name, key) / ARTIFACT_FILE, mmap_mode=mmap_mode)
+    seconds = time.perf_counter() - started
+    with _lock:
+        _load_stats[name] = {"key": key, "load_seconds": round(seconds, 4), "mmap_mode": mmap_mode}
+    logger.debug(f"Loaded {name}/{key} in {seconds:.3f}s")
+    return obj
+
+
+def read_metadata(name, key=None):
+    key = key or latest_key(name)
+    path = artifact_dir(name, key) / METADATA_FILE if key else None
+    return json.loads(path.read_text()) if path and path.exists() else None
+
+
+def list_artifacts(name):
+    """Metadata của mọi phiên bản đã lưu của một artifact, mới nhất trước"""
+    root = REGISTRY_DIR / name
+    if not root.exists():
+        return pd.DataFrame()
+    rows = [
+        json.loads((path / METADATA_FILE).read_text())
+        for path in root.iterdir()
+        if (path / METADATA_FILE).exists()
+    ]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).sort_values("created_at", ascending=False).reset_index(drop=True)
+
+
+def load_stats():
+    """Thời gian nạp gần nhất của từng artifact trong tiến trình hiện tại"""
+    with _lock:
+        return {name: dict(stats) for name, stats in _load_stats.items()}
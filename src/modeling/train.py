@@ -1,29 +1,248 @@
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
 import typer
+from joblib import Parallel, delayed
 from loguru import logger
-from tqdm import tqdm
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_selection import RFE
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import StandardScaler
 
-from src.config import MODELS_DIR, PROCESSED_DATA_DIR
+from src.config import PROCESSED_DATA_DIR
+from src.modeling import registry
+from src.modeling.features import FEATURES_PATH
 
 app = typer.Typer()
 
+CLUSTER_ARTIFACT = "clustering"
+CORR_THRESHOLD = 0.9
+N_SELECTED_FEATURES = 8
+K_RANGE = range(3, 10)
+RANDOM_STATE = 42
+
+# Profile vector đặt tên cụm (z-score trung bình của cụm so với profile)
+PROFILES = {
+    "Dẫn dắt": {"volume": 1, "close_pct_change_5": 1},
+    "Tiềm năng": {"momentum_5": 1, "close_pct_change_5": 1, "volatility_5": 1},
+    "Báo bão": {"volatility_5": 1, "momentum_5": -1, "close_pct_change_5": -1},
+    "Bluechip ngoại": {"sum_foreign_net_buy_3": 1, "foreign_holding": 1},
+}
+DEFAULT_LABEL = "Trung lập"
+
+
+@contextmanager
+def stage(name):
+    """Ghi log thời gian chạy của từng bước"""
+    started = time.perf_counter()
+    yield
+    logger.info(f"[{name}] {time.perf_counter() - started:.2f}s")
+
+
+def load_features(path):
+    path = Path(path)
+    if path.suffix == ".csv":
+        return pd.read_csv(path, index_col=0)
+    return pd.read_parquet(path)
+
+
+def clean_features(df):
+    """Bỏ mã thiếu quá 2 đặc trưng, điền 0 cho phần còn thiếu"""
+    return df.dropna(thresh=df.shape[1] - 2).fillna(0).reset_index(drop=True)
+
+
+def drop_correlated(df, columns, threshold=CORR_THRESHOLD):
+    corr = df[columns].corr().abs()
+    upper = corr.where(np.triu(np.ones(corr.shape), k=1).astype(bool))
+    dropped = [column for column in upper.columns if any(upper[column] > threshold)]
+    return [c for c in columns if c not in dropped], dropped
+
+
+def clip_bounds(df, columns, n_sigma=3):
+    """Ngưỡng cắt outlier theo quy tắc 3 sigma, lưu lại để dùng khi suy luận"""
+    mean, std = df[columns].mean(), df[columns].std()
+    return pd.DataFrame({"lower": mean - n_sigma * std, "upper": mean + n_sigma * std})
+
+
+def make_kmeans(k, minibatch=False, batch_size=1024):
+    if minibatch:
+        return MiniBatchKMeans(
+            n_clusters=k, random_state=RANDOM_STATE, n_init=20, batch_size=batch_size
+        )
+    return KMeans(n_clusters=k, random_state=RANDOM_STATE, n_init=20)
+
+
+def _fit_k(X, k, minibatch, batch_size):
+    model = make_kmeans(k, minibatch, batch_size)
+    labels = model.fit_predict(X)
+    return {
+        "k": k,
+        "model": model,
+        "silhouette": silhouette_score(X, labels),
+        "calinski": calinski_harabasz_score(X, labels),
+        "davies": davies_bouldin_score(X, labels),
+    }
+
+
+def sweep_k(X, k_range=K_RANGE, n_jobs=-1, minibatch=False, batch_size=1024):
+    """Thử các giá trị k song song trên nhiều core, trả về bảng điểm và mô hình theo k"""
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_k)(X, k, minibatch, batch_size) for k in k_range
+    )
+    models = {result["k"]: result.pop("model") for result in results}
+    return pd.DataFrame(results).set_index("k"), models
+
+
+def name_clusters(df, labels, features, profiles=PROFILES):
+    """Gán nhãn cụm theo profile có cosine similarity cao nhất với z-score trung bình của cụm"""
+    summary = df[features].groupby(labels).mean()
+    summary_std = (summary - summary.mean()) / summary.std()
+
+    names = {}
+    for cluster_id, row in summary_std.iterrows():
+        best_label, best_score = DEFAULT_LABEL, -1
+        for label, profile in profiles.items():
+            keys = list(profile)
+            if not all(k in row.index for k in keys):
+                continue
+            profile_vector = np.array([profile[k] for k in keys]).reshape(1, -1)
+            score = cosine_similarity(row[keys].to_numpy().reshape(1, -1), profile_vector)[0][0]
+            if score > best_score:
+                best_label, best_score = label, score
+        names[str(cluster_id)] = best_label
+    return names
+
+
+def mark_leaders(df, cluster_column, n=2):
+    """Đánh dấu n mã tăng giá 5 phiên mạnh nhất trong mỗi cụm"""
+    leaders = pd.Series("", index=df.index)
+    top = df.sort_values("close_pct_change_5", ascending=False).groupby(cluster_column).head(n)
+    leaders[top.index] = top["code"]
+    return leaders
+
+
+def market_share(df):
+    value_traded = df["close"] * df["volume"]
+    group_trade_value = value_traded.groupby(df["cluster_label"]).sum()
+    group_percent = (group_trade_value / group_trade_value.sum() * 100).round(2)
+    return pd.DataFrame(
+        {"Tổng GTGD (triệu)": (group_trade_value / 1e6).round(2), "Tỷ lệ (%)": group_percent}
+    )
+
+
+def train_clustering(df, n_jobs=-1, minibatch=False, batch_size=1024):
+    """Pipeline phân cụm: lọc tương quan, cắt outlier, RFE, chọn k, đặt tên cụm, PCA"""
+    with stage("clean"):
+        df = clean_features(df)
+        columns = [c for c in df.columns if c != "code"]
+        columns, dropped = drop_correlated(df, columns)
+        bounds = clip_bounds(df, columns)
+        df[columns] = df[columns].clip(bounds["lower"], bounds["upper"], axis=1)
+        logger.info(f"Dropped correlated features: {dropped}")
+
+    with stage("feature selection"):
+        X_full = StandardScaler().fit_transform(df[columns])
+        tmp_kmeans = make_kmeans(3, minibatch, batch_size).fit(X_full)
+        df["tmp_cluster"] = tmp_kmeans.labels_.astype(str)
+        selector = RFE(
+            RandomForestClassifier(n_estimators=100, random_state=RANDOM_STATE, n_jobs=n_jobs),
+            n_features_to_select=min(N_SELECTED_FEATURES, len(columns)),
+            step=1,
+        ).fit(X_full, df["tmp_cluster"])
+        selected = np.array(columns)[selector.support_].tolist()
+        logger.info(f"Selected features: {selected}")
+
+    with stage("k sweep"):
+        scaler = StandardScaler().fit(df[selected])
+        X = scaler.transform(df[selected])
+        scores, models = sweep_k(X, n_jobs=n_jobs, minibatch=minibatch, batch_size=batch_size)
+        best_k = int(scores["silhouette"].idxmax())
+        kmeans = models[best_k]
+        logger.info(f"Best k={best_k} (silhouette {scores.loc[best_k, 'silhouette']:.3f})")
+
+    with stage("label"):
+        df["cluster_kmeans"] = kmeans.labels_.astype(str)
+        cluster_names = name_clusters(df, df["cluster_kmeans"], selected)
+        df["cluster_label"] = df["cluster_kmeans"].map(cluster_names)
+        df["leader"] = mark_leaders(df, "cluster_kmeans")
+
+    with stage("pca"):
+        pca = PCA(n_components=2).fit(X)
+        df[["pca1", "pca2"]] = pca.transform(X)
+
+    artifacts = {
+        "scaler": scaler,
+        "model": kmeans,
+        "pca": pca,
+        "features": selected,
+        "clip_bounds": bounds.loc[selected],
+        "cluster_names": cluster_names,
+        "scores": scores,
+    }
+    return df, artifacts
+
+
+def clustering_key(features_path, minibatch=False, batch_size=1024):
+    config = {
+        "k_range": list(K_RANGE),
+        "corr_threshold": CORR_THRESHOLD,
+        "n_selected_features": N_SELECTED_FEATURES,
+        "random_state": RANDOM_STATE,
+        "minibatch": minibatch,
+        "batch_size": batch_size if minibatch else None,
+        "profiles": PROFILES,
+    }
+    data = {"features": registry.file_hash(features_path)}
+    return registry.artifact_key(
+        CLUSTER_ARTIFACT, registry.code_version(train_clustering), config, data
+    )
+
 
 @app.command()
 def main(
-    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
-    features_path: Path = PROCESSED_DATA_DIR / "features.csv",
-    labels_path: Path = PROCESSED_DATA_DIR / "labels.csv",
-    model_path: Path = MODELS_DIR / "model.pkl",
-    # -----------------------------------------
+    features_path: Path = FEATURES_PATH,
+    output_path: Path = PROCESSED_DATA_DIR / "quant_clustered_stock.csv",
+    market_share_path: Path = PROCESSED_DATA_DIR / "market_share_by_cluster.csv",
+    n_jobs: int = typer.Option(-1, help="Số core cho bước chọn k và RFE"),
+    minibatch: bool = typer.Option(False, help="Dùng MiniBatchKMeans cho vũ trụ lớn"),
+    batch_size: int = 1024,
+    force: bool = typer.Option(False, help="Huấn luyện lại dù đã có artifact cùng khóa"),
 ):
-    # ---- REPLACE THIS WITH YOUR OWN CODE ----
-    logger.info("Training some model...")
-    for i in tqdm(range(10), total=10):
-        if i == 5:
-            logger.info("Something happened for iteration 5.")
-    logger.success("Modeling training complete.")
-    # -----------------------------------------
+    key = clustering_key(features_path, minibatch, batch_size)
+    if registry.exists(CLUSTER_ARTIFACT, key) and not force:
+        logger.info(f"Clustering {key} is up to date, skipping training")
+        with stage("load"):
+            artifacts = registry.load(CLUSTER_ARTIFACT, key)
+            registry.set_latest(CLUSTER_ARTIFACT, key)
+        df = artifacts["table"]
+    else:
+        with stage("load"):
+            features = load_features(features_path)
+        logger.info(f"Training clustering on {len(features)} symbols...")
+
+        df, artifacts = train_clustering(features, n_jobs, minibatch, batch_size)
+        with stage("register"):
+            registry.save(
+                CLUSTER_ARTIFACT,
+                key,
+                {**artifacts, "table": df},
+                inputs={"features_path": features_path, "rows": len(features)},
+                best_k=int(artifacts["model"].n_clusters),
+            )
+
+    with stage("save"):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(output_path, index=False)
+        market_share(df).to_csv(market_share_path)
+
+    logger.info(f"Cluster sizes: {df['cluster_label'].value_counts().to_dict()}")
+    logger.success(f"Saved clustering {key} results to {output_path}")
 
 
 if __name__ == "__main__":
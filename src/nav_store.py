@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.fund_store import FUND_DIR, request_with_retry
+from src.instrumentation import log_error, submit
+
+NAV_HISTORY_PATH = FUND_DIR / "nav_history.parquet"
+NAV_MANIFEST_PATH = FUND_DIR / "nav_manifest.json"
+NAV_HISTORY_URL = "https://api.fmarket.vn/res/product/get-nav-history"
+
+# NAV quỹ mở cập nhật tối đa mỗi ngày một lần
+MIN_CHECK_INTERVAL = timedelta(hours=6)
+TRADING_DAYS = 252
+TRAILING_PERIODS = {"1M": 21, "3M": 63, "6M": 126, "1Y": 252}
+
+_lock = threading.Lock()
+
+
+def fund_id_column(funds_df):
+    return "fund_id_fmarket" if "fund_id_fmarket" in funds_df.columns else "id"
+
+
+def fetch_nav_history(product_id, from_date=None, timeout=10, retries=2):
+    """Lấy lịch sử NAV của một quỹ, chỉ từ `from_date` nếu có"""
+    payload = {
+        "isAllData": 0 if from_date else 1,
+        "productId": int(product_id),
+        "fromDate": from_date.strftime("%Y%m%d") if from_date else None,
+        "toDate": datetime.now().strftime("%Y%m%d"),
+    }
+    response = request_with_retry("POST", NAV_HISTORY_URL, timeout, retries, json=payload)
+    data = pd.DataFrame(response.get("data") or [])
+    if data.empty:
+        return pd.DataFrame(columns=["date", "nav_per_unit"])
+    return pd.DataFrame(
+        {"date": pd.to_datetime(data["navDate"]), "nav_per_unit": data["nav"].astype(float)}
+    )
+
+
+def load_nav_history(fund_codes=None):
+    """Đọc lịch sử NAV dạng dài (fund_code, date, nav_per_unit)"""
+    if not NAV_HISTORY_PATH.exists():
+        return pd.DataFrame(columns=["fund_code", "date", "nav_per_unit"])
+    filters = [("fund_code", "in", list(fund_codes))] if fund_codes is not None else None
+    return pd.read_parquet(NAV_HISTORY_PATH, filters=filters)
+
+
+def sync_nav_history(product_ids, max_workers=8, timeout=10, retries=2, on_progress=None):
+    """Bổ sung các điểm NAV mới cho các quỹ trong `product_ids` (mã quỹ -> productId Fmarket)
+
+    Mỗi quỹ chỉ tải phần lịch sử sau ngày NAV cuối đã lưu; quỹ vừa kiểm tra trong
+    MIN_CHECK_INTERVAL được bỏ qua. Trả về danh sách quỹ lỗi.
+    """
+    with _lock:
+        history = load_nav_history()
+        manifest = json.loads(NAV_MANIFEST_PATH.read_text()) if NAV_MANIFEST_PATH.exists() else {}
+        last_dates = history.groupby("fund_code")["date"].max()
+        now = datetime.now()
+
+        due = {
+            code: product_id
+            for code, product_id in product_ids.items()
+            if pd.notna(product_id)
+            and (
+                code not in manifest
+                or now - datetime.fromisoformat(manifest[code]) > MIN_CHECK_INTERVAL
+            )
+        }
+        if not due:
+            return []
+
+        new_points, failed = [], []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for code, product_id in due.items():
+                last_date = last_dates.get(code)
+                from_date = last_date + timedelta(days=1) if pd.notna(last_date) else None
+                future = submit(
+                    executor, fetch_nav_history, product_id, from_date, timeout, retries
+                )
+                futures[future] = code
+            for done, future in enumerate(as_completed(futures), start=1):
+                code = futures[future]
+                try:
+                    new_points.append(future.result().assign(fund_code=code))
+                    manifest[code] = now.isoformat()
+                except Exception as e:
+                    log_error(f"Lỗi khi lấy lịch sử NAV quỹ {code}", e)
+                    failed.append(code)
+                if on_progress:
+                    on_progress(done, len(due), code)
+
+        frames = [df for df in [history] + new_points if not df.empty]
+        if frames:
+            history = pd.concat(frames, ignore_index=True)
+            history = history.drop_duplicates(["fund_code", "date"], keep="last")
+            history = history.sort_values(["fund_code", "date"])
+            FUND_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = NAV_HISTORY_PATH.with_suffix(".tmp")
+            history[["fund_code", "date", "nav_per_unit"]].to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, NAV_HISTORY_PATH)
+        NAV_MANIFEST_PATH.write_text(json.dumps(manifest, indent=2))
+        return failed
+
+
+def nav_matrix(history):
+    """Ma trận ngày giao dịch x quỹ, NAV được điền tiếp cho các ngày quỹ không công bố"""
+    matrix = history.pivot_table(index="date", columns="fund_code", values="nav_per_unit")
+    if matrix.empty:
+        return matrix
+    business_days = pd.bdate_range(matrix.index.min(), matrix.index.max())
+    return matrix.reindex(business_days).ffill(limit=5)
+
+
+def fund_performance(matrix, benchmark=None, lookback=TRADING_DAYS, risk_free=0.0):
+    """Lợi nhuận, biến động, drawdown, Sharpe và tương quan với benchmark cho mọi quỹ cùng lúc
+
+    `matrix` là ma trận ngày x quỹ từ `nav_matrix`; `benchmark` là Series giá đóng cửa theo ngày
+    (ví dụ VNINDEX). Các chỉ số rủi ro tính trên `lookback` phiên gần nhất.
+    """
+    last = matrix.ffill().iloc[-1]
+    performance = pd.DataFrame(index=matrix.columns)
+    for label, periods in TRAILING_PERIODS.items():
+        past = matrix.iloc[-periods - 1] if len(matrix) > periods else np.nan
+        performance[f"Lợi nhuận {label} (%)"] = (last / past - 1) * 100
+
+    window = matrix.iloc[-lookback - 1 :]
+    returns = window.pct_change(fill_method=None)
+    volatility = returns.std() * np.sqrt(TRADING_DAYS)
+    annual_return = returns.mean() * TRADING_DAYS
+
+    performance["Biến động năm (%)"] = volatility * 100
+    performance["Max drawdown (%)"] = (window / window.cummax() - 1).min() * 100
+    performance["Sharpe"] = (annual_return - risk_free) / volatility.replace(0, np.nan)
+
+    if benchmark is not None and not benchmark.empty:
+        benchmark = benchmark.reindex(window.index).ffill()
+        performance["Tương quan VNINDEX"] = returns.corrwith(
+            benchmark.pct_change(fill_method=None)
+        )
+    performance["Số phiên"] = returns.notna().sum()
+    return performance.replace([np.inf, -np.inf], np.nan)
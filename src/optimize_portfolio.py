@@ -7,10 +7,13 @@ import plotly.graph_objects as go
 import streamlit as st
 from pyparsing import col
 from regex import D
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
 from streamlit_tags import st_tags
 from vnstock import Vnstock
 
 from src.config import PROCESSED_DATA_DIR
+from src.instrumentation import instrument
 from src.tcbs_stock_data import TCBSStockData
 
 
@@ -45,6 +48,7 @@ def get_port(price, N=252):
     return result
 
 
+@instrument()
 def calculate_optimal_portfolio(
     symbols, price, port, no_of_port=1000, risk_free_rate=0.05, nav=100.00
 ):
@@ -84,8 +88,88 @@ def calculate_optimal_portfolio(
     return optimal_portfolio
 
 
+def calculate_risk_parity_weights(cov, max_iter=1000, tol=1e-10):
+    """Tỷ trọng cân bằng rủi ro (ERC) bằng cyclical coordinate descent, O(n²) mỗi vòng lặp."""
+    cov = np.asarray(cov, dtype=float)
+    n = cov.shape[0]
+    budget = np.full(n, 1.0 / n)
+    diag = np.diag(cov)
+    x = budget / np.sqrt(diag)
+    sigma_x = cov @ x
+
+    for _ in range(max_iter):
+        x_old = x.copy()
+        for i in range(n):
+            # Giải phương trình bậc 2 theo x_i: a*x_i^2 + b*x_i - budget_i = 0
+            b = sigma_x[i] - diag[i] * x[i]
+            x_new = (-b + np.sqrt(b * b + 4 * diag[i] * budget[i])) / (2 * diag[i])
+            sigma_x += cov[:, i] * (x_new - x[i])
+            x[i] = x_new
+        if np.max(np.abs(x - x_old)) < tol * np.max(x):
+            break
+
+    return x / x.sum()
+
+
+def _cluster_variance(cov, items):
+    sub_cov = cov[np.ix_(items, items)]
+    ivp = 1.0 / np.diag(sub_cov)
+    ivp /= ivp.sum()
+    return ivp @ sub_cov @ ivp
+
+
+def calculate_hrp_weights(cov, corr):
+    """Tỷ trọng Hierarchical Risk Parity (López de Prado): phân cụm, sắp xếp và chia đôi đệ quy."""
+    cov = np.asarray(cov, dtype=float)
+    corr = np.clip(np.asarray(corr, dtype=float), -1.0, 1.0)
+    n = cov.shape[0]
+    if n == 1:
+        return np.ones(1)
+
+    dist = np.sqrt(np.clip((1.0 - corr) / 2.0, 0.0, None))
+    np.fill_diagonal(dist, 0.0)
+    link = linkage(squareform(dist, checks=False), method="single")
+    order = leaves_list(link)
+
+    weights = np.ones(n)
+    clusters = [order]
+    while clusters:
+        clusters = [
+            part for c in clusters if len(c) > 1 for part in (c[: len(c) // 2], c[len(c) // 2 :])
+        ]
+        for left, right in zip(clusters[::2], clusters[1::2]):
+            var_left = _cluster_variance(cov, left)
+            var_right = _cluster_variance(cov, right)
+            alpha = 1 - var_left / (var_left + var_right)
+            weights[left] *= alpha
+            weights[right] *= 1 - alpha
+
+    return weights / weights.sum()
+
+
+def calculate_risk_based_portfolio(symbols, price, nav=100.00):
+    """Danh mục Cân bằng rủi ro (ERC) và HRP trên cùng dữ liệu giá của get_port_price."""
+    port_ret = np.log(price[symbols] / price[symbols].shift(1))
+    cov = port_ret.cov() * 252
+    corr = port_ret.corr()
+
+    risk_parity = calculate_risk_parity_weights(cov.values)
+    hrp = calculate_hrp_weights(cov.values, corr.values)
+
+    risk_portfolio = pd.DataFrame(
+        {
+            "Stock": symbols,
+            "Cân Bằng Rủi Ro": risk_parity.round(decimals=2) * nav,
+            "Phân Cấp Rủi Ro": hrp.round(decimals=2) * nav,
+        }
+    )
+    risk_portfolio.set_index("Stock", inplace=True)
+
+    return risk_portfolio
+
+
 def plot_optimal_portfolio_chart(optimal_portfolio):
-    categories = ["Tối Ưu", "Tấn Công", "Phòng Thủ"]
+    categories = optimal_portfolio.columns.tolist()
     optimal_portfolio.reset_index(inplace=True)
     ma_co_phieu = optimal_portfolio["Stock"].tolist()
     data = optimal_portfolio[categories].values.T
@@ -123,7 +207,7 @@ def display_portfolio_analysis():
             text="Press enter to add more",
             value=["ACB", "CTG", "FPT", "MBB", "HPG"],
             suggestions=["ACB", "FPT", "MBB", "HPG"],
-            maxtags=5,
+            maxtags=-1,
             key="aljnf",
         )
         nav = st.text_input("Nhập NAV", value=100000000.00, max_chars=20)
@@ -138,17 +222,28 @@ def display_portfolio_analysis():
         port = get_port(price=price)
         st.dataframe(port, use_container_width=True)
         optimal_portfolio = calculate_optimal_portfolio(stocks, price, port, nav=nav)
+        optimal_portfolio = optimal_portfolio.join(
+            calculate_risk_based_portfolio(stocks, price, nav=nav)
+        )
         st.dataframe(optimal_portfolio, use_container_width=True)
         plot_optimal_portfolio_chart(optimal_portfolio)
 
     with col2:
         df_portfolio = pd.DataFrame(
             {
-                "Danh mục": ["Tối Ưu", "Tấn Công", "Phòng Thủ"],
+                "Danh mục": [
+                    "Tối Ưu",
+                    "Tấn Công",
+                    "Phòng Thủ",
+                    "Cân Bằng Rủi Ro",
+                    "Phân Cấp Rủi Ro",
+                ],
                 "Mô tả": [
                     "Danh mục tối ưu hóa lợi nhuận và rủi ro",
                     "Danh mục tập trung vào lợi nhuận cao",
                     "Danh mục tập trung vào rủi ro thấp",
+                    "Mỗi cổ phiếu đóng góp rủi ro bằng nhau (ERC)",
+                    "Phân bổ rủi ro theo cụm tương quan (HRP)",
                 ],
             }
         )
@@ -1,3 +1,6 @@
+import threading
+from datetime import datetime, timedelta
+
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -5,7 +8,11 @@ import requests
 import streamlit as st
 from vnstock import Vnstock
 
+from src.downsample import downsample_figure
+from src.foreign_store import load_foreign
+from src.instrumentation import instrument
 from src.tcbs_stock_data import TCBSStockData
+from src.timealign import asof_align
 
 cookies = {
     "vnds-uuid": "4408bacf-3ab6-44f4-a8bf-e1f775a4cfd1",
@@ -40,28 +47,41 @@ headers = {
 }
 
 
-def get_firm_pricing(symbol, start_date):
+# Cache khuyến nghị theo (mã, ngày bắt đầu), dùng chung cho các luồng tải song song
+PRICING_TTL = timedelta(hours=1)
+_pricing_lock = threading.Lock()
+_pricing_cache = {}
+
+
+def fetch_firm_pricing(symbol, start_date, timeout=10):
+    """Lấy khuyến nghị của các CTCK, không gọi streamlit nên chạy được trong thread pool"""
+    key = (symbol, start_date)
+    with _pricing_lock:
+        cached = _pricing_cache.get(key)
+    if cached is not None and datetime.now() - cached[0] < PRICING_TTL:
+        return cached[1].copy()
+
     api_url = f"https://api-finfo.vndirect.com.vn/v4/recommendations?q=code:{symbol}~reportDate:gte:{start_date}&size=100&sort=reportDate:DESC"
+    res = requests.get(url=api_url, headers=headers, cookies=cookies, timeout=timeout)
+    res.raise_for_status()
+    df = pd.DataFrame(res.json()["data"])
+    with _pricing_lock:
+        _pricing_cache[key] = (datetime.now(), df)
+    return df.copy()
+
+
+def get_firm_pricing(symbol, start_date):
     try:
-        res = requests.get(url=api_url, headers=headers, cookies=cookies)
-        res.raise_for_status()
-        data = res.json()
-        return pd.DataFrame(data["data"])
+        return fetch_firm_pricing(symbol, start_date)
     except requests.exceptions.RequestException as e:
         st.write("Yêu cầu không thành công:")
         return None
 
 
 def foreigner_trading_stock(stock, start, end):
-    api_url = f"https://api-finfo.vndirect.com.vn/v4/foreigns?sort=tradingDate&q=code:{stock}~tradingDate:gte:{start}~tradingDate:lte:{end}&size=365"
     try:
-        res = requests.get(url=api_url, headers=headers)
-        res.raise_for_status()
-        data = res.json()
-        df = pd.DataFrame(data["data"])
-        df.rename(columns={"tradingDate": "time"}, inplace=True)
-        return df
-    except requests.exceptions.RequestException as e:
+        return load_foreign(stock, start, end)
+    except Exception as e:
         st.write("Yêu cầu không thành công:")
         return None
 
@@ -109,8 +129,7 @@ def plot_firm_pricing(df):
 
 def plot_foreign_trading(stock, start_date, end_date):
     try:
-        df = pd.DataFrame(foreigner_trading_stock(stock, start_date, end_date))
-        df["time"] = pd.to_datetime(df["time"])
+        df = foreigner_trading_stock(stock, start_date, end_date)
         fig = go.Figure()
 
         fig.add_trace(
@@ -122,11 +141,10 @@ def plot_foreign_trading(stock, start_date, end_date):
             )
         )
         # Biểu đồ đường cho sở hữu nước ngoài
-        ratio = (df["totalRoom"] - df["currentRoom"]) / df["totalRoom"]
         fig.add_trace(
             go.Scatter(
                 x=df["time"],
-                y=round(ratio, 2) * 100,
+                y=df["ownership_ratio"].round(),
                 mode="lines",
                 name="(%) Sở hữu nước ngoài",
                 line=dict(color="blue"),
@@ -146,7 +164,7 @@ def plot_foreign_trading(stock, start_date, end_date):
             margin=dict(l=40, r=40, t=40, b=40),
         )
 
-        st.plotly_chart(fig)
+        st.plotly_chart(downsample_figure(fig))
     except:
         st.write("Không có dữ liệu")
 
@@ -179,29 +197,31 @@ def plot_proprietary_trading(stock, start_date, end_date):
             margin=dict(l=40, r=40, t=40, b=40),
         )
 
-        st.plotly_chart(fig)
+        st.plotly_chart(downsample_figure(fig))
     except:
         st.write("Không có dữ liệu")
 
 
 def get_stock_data_with_ratio(df_price, symbol, start_date, end_date):
-    foreign = foreigner_trading_stock(symbol, start=start_date, end=end_date)
-    foreign["time"] = pd.to_datetime(foreign["time"])
-    merged_df = pd.merge(df_price, foreign, on="time", how="right")
-    merged_df.ffill(inplace=True)
-    merged_df.dropna(subset=["currentRoom"], inplace=True)
-    merged_df["ratio"] = (merged_df["totalRoom"] - merged_df["currentRoom"]) / merged_df[
-        "totalRoom"
-    ]
-    result_df = merged_df[["time", "volume", "close", "ratio"]]
-    return result_df
-
-
+    foreign = load_foreign(symbol, start_date, end_date)
+    # Trục thời gian là các phiên có giá; tỷ lệ sở hữu lấy theo phiên gần nhất trong 7 ngày
+    result_df = asof_align(
+        df_price[["time", "volume", "close"]],
+        [(foreign, {"ownership_ratio": "ratio"})],
+        tolerance="7D",
+    )
+    result_df["ratio"] /= 100
+    return result_df.dropna(subset=["ratio"])
+
+
+@instrument()
 def get_stock_price(symbol, start_date, end_date, interval="1D"):
     tcbs = TCBSStockData(rate_limit_pause=0)
     df = tcbs.get_stock_data_by_date_range(symbol, start_date=start_date, end_date=end_date)
     df["time"] = pd.to_datetime(df["time"])
-    df["close"] = df["close"].astype(float) / 1000
+    # Giá theo đơn vị nghìn đồng cho cả OHLC
+    price_columns = [c for c in ("open", "high", "low", "close") if c in df.columns]
+    df[price_columns] = df[price_columns].astype(float) / 1000
     return df
 
 
@@ -246,7 +266,7 @@ def plot_close_price_and_ratio(df_price, symbol, start_date, end_date):
             margin=dict(l=40, r=40, t=40, b=40),
         )
 
-        st.plotly_chart(fig)
+        st.plotly_chart(downsample_figure(fig))
     except:
         st.write("Không có dữ liệu")
 
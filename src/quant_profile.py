@@ -11,7 +11,10 @@ from numpy import quantile
 from scipy.stats import norm
 from vnstock import Vnstock
 
+from src.downsample import downsample_figure
+from src.figure_cache import memoize_figure
 from src.plots import get_stock_price
+from src.timealign import asof_align
 
 
 def calculate_returns(df_data):
@@ -92,6 +95,7 @@ def calculate_drawdown_metrics(df_data, column="close"):
     return max_drawdown, max_duration
 
 
+@memoize_figure(page="quant")
 def plot_drawdown(df_data):
     """Plot drawdown chart using Plotly"""
     df_data = df_data[~df_data.index.duplicated(keep="first")]
@@ -108,6 +112,7 @@ def plot_drawdown(df_data):
     return fig
 
 
+@memoize_figure(page="quant")
 def plot_returns_distribution(ret_stock):
     """Plot returns distribution using Plotly"""
 
@@ -128,11 +133,8 @@ def calculate_quant_metrics(stock, end_date, years):
     df_index = get_stock_price(
         "VNINDEX", start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), interval="1D"
     )
-    df_data = df_price.merge(
-        df_index[["time", "close"]].rename(columns={"close": "close_index"}),
-        on="time",
-        how="inner",
-    )
+    df_data = asof_align(df_price, [(df_index, {"close": "close_index"})], tolerance="3D")
+    df_data.dropna(subset=["close_index"], inplace=True)
     df_data.set_index("time", inplace=True)
 
     # Calculate all metrics
@@ -182,7 +184,7 @@ def calculate_quant_metrics(stock, end_date, years):
     with tab1:
         st.dataframe(metrics_df.set_index("Chỉ số"), use_container_width=True)
     with tab2:
-        st.plotly_chart(plot_drawdown(df_data), use_container_width=True)
+        st.plotly_chart(downsample_figure(plot_drawdown(df_data)), use_container_width=True)
     with tab3:
         st.plotly_chart(plot_returns_distribution(ret_stock), use_container_width=True)
 
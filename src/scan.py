@@ -0,0 +1,255 @@
+import time
+import warnings
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+from numpy.lib.stride_tricks import sliding_window_view
+from tqdm import tqdm
+
+from src.bar_store import read_bars, sync_bars, sync_universe
+from src.config import PROCESSED_DATA_DIR, RAW_DATA_DIR
+from src.foreign_store import read_foreign, sync_foreign
+
+app = typer.Typer()
+
+LOOKBACK_DAYS = 180
+MA_WINDOW = 5
+VOLUME_WINDOW = 20
+BREAKOUT_WINDOW = 20
+RSI_PERIOD = 14
+VOLUME_SPIKE = 2.0
+MIN_STREAK = 3
+
+
+def list_universe(exchanges=None):
+    """Mã cổ phiếu trong list_stock.csv, có thể giới hạn theo sàn"""
+    stocks = pd.read_csv(RAW_DATA_DIR / "list_stock.csv")
+    stocks = stocks[stocks["type"] == "STOCK"]
+    if exchanges:
+        stocks = stocks[stocks["exchange"].isin(exchanges)]
+    return stocks["symbol"].drop_duplicates().tolist()
+
+
+def load_panel(symbols, read_one, columns, start, end):
+    """Ghép dữ liệu đã lưu của nhiều mã thành các ma trận ngày x mã (mỗi cột một DataFrame)"""
+    frames = []
+    for symbol in symbols:
+        df = read_one(symbol)
+        if df.empty:
+            continue
+        df = df.loc[(df["time"] >= start) & (df["time"] <= end), ["time"] + columns]
+        frames.append(df.assign(code=symbol))
+    if not frames:
+        return {column: pd.DataFrame() for column in columns}
+    long = pd.concat(frames, ignore_index=True)
+    return {
+        column: long.pivot_table(index="time", columns="code", values=column, aggfunc="last")
+        for column in columns
+    }
+
+
+def bottom_align(valid, *arrays):
+    """Dồn các phiên có dữ liệu của từng mã xuống cuối ma trận, giữ nguyên thứ tự
+
+    Sau bước này phiên cuối của mọi mã nằm cùng một dòng và các phép trượt/đếm chuỗi
+    chạy trên đúng các phiên của mã đó (giống dữ liệu từng mã sau khi merge inner).
+    """
+    order = np.argsort(valid, axis=0, kind="stable")
+    aligned_valid = np.take_along_axis(valid, order, axis=0)
+    aligned = []
+    for values in arrays:
+        values = np.take_along_axis(values.astype(float), order, axis=0)
+        values[~aligned_valid] = np.nan
+        aligned.append(values)
+    return aligned
+
+
+def rolling(values, window, func=np.nanmean, min_periods=1, include_current=True):
+    """Phép trượt theo trục thời gian cho mọi mã cùng lúc bằng sliding_window_view"""
+    n_rows, n_cols = values.shape
+    pad = window - 1 if include_current else window
+    padded = np.vstack([np.full((pad, n_cols), np.nan), values])
+    if not include_current:
+        padded = padded[:-1]
+    view = sliding_window_view(padded, window, axis=0)
+    counts = (~np.isnan(view)).sum(axis=-1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        result = func(view, axis=-1)
+    result[counts < min_periods] = np.nan
+    return result
+
+
+def trailing_streak(condition):
+    """Số phiên liên tiếp thỏa điều kiện, đếm ngược từ phiên cuối"""
+    return np.cumprod(condition[::-1], axis=0).sum(axis=0)
+
+
+def first_valid(values):
+    """Giá trị hợp lệ đầu tiên của mỗi cột"""
+    valid = ~np.isnan(values)
+    rows = valid.argmax(axis=0)
+    first = values[rows, np.arange(values.shape[1])]
+    first[~valid.any(axis=0)] = np.nan
+    return first
+
+
+def wilder_rsi(close, period=RSI_PERIOD):
+    delta = pd.DataFrame(np.diff(close, axis=0, prepend=np.nan))
+    gain = delta.clip(lower=0).ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    loss = (-delta).clip(lower=0).ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    total = (gain + loss).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, 100 * gain.to_numpy() / total, np.nan)
+
+
+def scan_foreign_ma(holding):
+    """Chuỗi phiên MA5 sở hữu nước ngoài tăng liên tiếp (consecutive_increase_MA.csv)"""
+    values = holding.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    (values,) = bottom_align(valid, values)
+    ma = rolling(values, MA_WINDOW)
+    rising = ma[1:] > ma[:-1]
+
+    first_ma, last_ma = first_valid(ma), ma[-1]
+    table = pd.DataFrame(
+        {
+            "code": holding.columns,
+            "consecutive_increase_MA": trailing_streak(rising),
+            "last_MA": last_ma,
+            "first_MA": first_ma,
+            "total_increase_MA": last_ma - first_ma,
+        }
+    )
+    table = table[valid.sum(axis=0) >= 2]
+    return table.sort_values("consecutive_increase_MA", ascending=False, kind="stable")
+
+
+def scan_foreign_price_volume(holding, close, volume):
+    """MA5 sở hữu nước ngoài, giá và khối lượng (so với MA20) cùng tăng liên tiếp"""
+    codes = holding.columns.intersection(close.columns)
+    index = holding.index.union(close.index)
+    holding, close, volume = (
+        df.reindex(index=index, columns=codes).to_numpy(dtype=float)
+        for df in (holding, close, volume)
+    )
+    valid = ~np.isnan(holding) & ~np.isnan(close) & ~np.isnan(volume)
+    holding, close, volume = bottom_align(valid, holding, close, volume)
+
+    ma = rolling(holding, MA_WINDOW)
+    volume_ma = rolling(volume, VOLUME_WINDOW)
+    condition = (ma[1:] > ma[:-1]) & (close[1:] > close[:-1]) & (volume[1:] > volume_ma[1:])
+
+    table = pd.DataFrame(
+        {
+            "code": codes,
+            "consecutive_increase_all": trailing_streak(condition),
+            "last_MA": ma[-1],
+            "last_close": close[-1],
+            "last_vol": volume[-1],
+        }
+    )
+    table = table[valid.sum(axis=0) >= 2]
+    return table.sort_values("consecutive_increase_all", ascending=False, kind="stable")
+
+
+def scan_price_signals(close, volume, high=None):
+    """Tín hiệu kỹ thuật cho cả thị trường: chuỗi MA5 tăng, breakout, RSI, đột biến khối lượng"""
+    codes = close.columns
+    close_values = close.to_numpy(dtype=float)
+    volume_values = volume.reindex_like(close).to_numpy(dtype=float)
+    high_values = high.reindex_like(close).to_numpy(dtype=float) if high is not None else None
+    valid = ~np.isnan(close_values) & ~np.isnan(volume_values)
+    arrays = [close_values, volume_values] + ([high_values] if high_values is not None else [])
+    aligned = bottom_align(valid, *arrays)
+    close_values, volume_values = aligned[0], aligned[1]
+    high_values = aligned[2] if high_values is not None else close_values
+
+    ma = rolling(close_values, MA_WINDOW, min_periods=MA_WINDOW)
+    prior_high = rolling(high_values, BREAKOUT_WINDOW, np.nanmax, include_current=False)
+    prior_volume = rolling(volume_values, VOLUME_WINDOW, include_current=False)
+    rsi = wilder_rsi(close_values)[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volume_ratio = volume_values[-1] / prior_volume[-1]
+    table = pd.DataFrame(
+        {
+            "code": codes,
+            "close": close_values[-1],
+            "volume": volume_values[-1],
+            "ma5_streak": trailing_streak(ma[1:] > ma[:-1]),
+            "breakout_20": close_values[-1] > prior_high[-1],
+            "rsi_14": rsi,
+            "rsi_signal": np.select([rsi >= 70, rsi <= 30], ["Quá mua", "Quá bán"], ""),
+            "volume_ratio": volume_ratio,
+            "volume_spike": volume_ratio >= VOLUME_SPIKE,
+        }
+    )
+    table["signal_count"] = (
+        (table["ma5_streak"] >= MIN_STREAK).astype(int)
+        + table["breakout_20"].astype(int)
+        + table["volume_spike"].astype(int)
+        + (table["rsi_signal"] != "").astype(int)
+    )
+    table = table[valid.sum(axis=0) > BREAKOUT_WINDOW]
+    return table.sort_values(
+        ["signal_count", "volume_ratio"], ascending=False, na_position="last"
+    ).reset_index(drop=True)
+
+
+@app.command()
+def main(
+    output_dir: Path = PROCESSED_DATA_DIR,
+    lookback_days: int = LOOKBACK_DAYS,
+    exchange: Optional[List[str]] = typer.Option(None, help="Giới hạn theo sàn (HSX, HNX...)"),
+    sync: bool = typer.Option(True, help="Cập nhật kho nến và khối ngoại trước khi quét"),
+    max_workers: int = 8,
+):
+    symbols = list_universe(exchange)
+    end = pd.Timestamp.now().normalize()
+    start = end - pd.Timedelta(days=lookback_days)
+
+    if sync:
+        for name, sync_one in (("bars", sync_bars), ("foreign", sync_foreign)):
+            logger.info(f"Syncing {name} for {len(symbols)} symbols...")
+            with tqdm(total=len(symbols)) as progress:
+                _, failed = sync_universe(
+                    symbols,
+                    sync_one,
+                    max_workers=max_workers,
+                    on_progress=lambda *_: progress.update(),
+                )
+            if failed:
+                logger.warning(f"{len(failed)} symbols failed to sync {name}")
+
+    started = time.perf_counter()
+    bars = load_panel(symbols, read_bars, ["high", "close", "volume"], start, end)
+    foreign = load_panel(symbols, read_foreign, ["totalRoom", "currentRoom"], start, end)
+    holding = foreign["totalRoom"] - foreign["currentRoom"]
+    logger.info(
+        f"Loaded panels {bars['close'].shape} bars, {holding.shape} foreign "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+    started = time.perf_counter()
+    outputs = {
+        "consecutive_increase_MA.csv": scan_foreign_ma(holding),
+        "top_foreign_buy_with_price_volume.csv": scan_foreign_price_volume(
+            holding, bars["close"], bars["volume"]
+        ),
+        "scan_signals.csv": scan_price_signals(bars["close"], bars["volume"], bars["high"]),
+    }
+    logger.info(f"Scanned universe in {time.perf_counter() - started:.2f}s")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for filename, table in outputs.items():
+        table.to_csv(output_dir / filename, index=False)
+        logger.success(f"Saved {filename} ({len(table)} rows)")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,122 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import requests
+
+from src.config import EXTERNAL_DATA_DIR
+from src.instrumentation import log_error
+
+SCREENER_URL = "https://screener-api.vndirect.com.vn/search_data"
+SCREENER_PATH = EXTERNAL_DATA_DIR / "screener.parquet"
+REFRESH_INTERVAL = timedelta(hours=1)
+
+BASE_FIELDS = [
+    "code",
+    "companyNameVi",
+    "floor",
+    "priceCr",
+    "quarterReportDate",
+    "annualReportDate",
+    "marketCapCr",
+    "netForBoughtValAvgCr20d",
+]
+# Trường bổ sung; nếu API từ chối, đồng bộ lại chỉ với BASE_FIELDS
+EXTRA_FIELDS = ["pe", "pb", "roae", "roaa", "dividendYield", "beta"]
+
+CONDITIONS = {
+    "GT": lambda x, v: x > v,
+    "GTE": lambda x, v: x >= v,
+    "LT": lambda x, v: x < v,
+    "LTE": lambda x, v: x <= v,
+    "EQ": lambda x, v: x == v,
+    "BETWEEN": lambda x, v: (x >= v[0]) & (x <= v[1]),
+    "IN": lambda x, v: np.isin(x, list(v)),
+}
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def fetch_screener(fields, timeout=15):
+    """Tải toàn bộ mã với các trường đã chọn từ screener VNDirect (không lọc)"""
+    payload = {"fields": ",".join(fields), "filters": [], "sort": "code:asc"}
+    response = requests.post(
+        SCREENER_URL,
+        json=payload,
+        headers={"Content-Type": "application/json"},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return pd.DataFrame(response.json().get("data", []))
+
+
+def sync_screener(force=False):
+    """Đồng bộ bảng screener cục bộ nếu bản lưu đã cũ hơn REFRESH_INTERVAL"""
+    with _lock:
+        if SCREENER_PATH.exists() and not force:
+            age = datetime.now() - datetime.fromtimestamp(SCREENER_PATH.stat().st_mtime)
+            if age < REFRESH_INTERVAL:
+                return False
+        try:
+            table = fetch_screener(BASE_FIELDS + EXTRA_FIELDS)
+        except requests.RequestException:
+            table = fetch_screener(BASE_FIELDS)
+        if table.empty:
+            return False
+
+        numeric = table.columns.difference(
+            ["code", "companyNameVi", "floor", "quarterReportDate", "annualReportDate"]
+        )
+        table[numeric] = table[numeric].apply(pd.to_numeric, errors="coerce")
+        table["synced_at"] = pd.Timestamp.now()
+
+        SCREENER_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = SCREENER_PATH.with_suffix(".tmp")
+        table.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, SCREENER_PATH)
+        return True
+
+
+def load_screener():
+    """Bảng screener cục bộ (đồng bộ nếu cần), giữ trong bộ nhớ tới khi file thay đổi"""
+    try:
+        sync_screener()
+    except Exception as e:
+        log_error("Lỗi khi đồng bộ screener", e)
+    if not SCREENER_PATH.exists():
+        return None
+    mtime = SCREENER_PATH.stat().st_mtime
+    if _cache.get("mtime") != mtime:
+        table = pd.read_parquet(SCREENER_PATH)
+        _cache["columns"] = {col: table[col].to_numpy() for col in table.columns}
+        _cache["table"] = table
+        _cache["mtime"] = mtime
+    return _cache["table"]
+
+
+def screen(filters, fields=None, sort="code:asc"):
+    """Lọc cục bộ với biểu thức dạng API VNDirect
+
+    `filters` là danh sách dict {"dbFilterCode", "condition", "value"} với condition thuộc
+    GT, GTE, LT, LTE, EQ, BETWEEN (value = (min, max)) hoặc IN. Các điều kiện được AND với nhau.
+    """
+    table = load_screener()
+    if table is None:
+        return None
+
+    columns = _cache["columns"]
+    mask = np.ones(len(table), dtype=bool)
+    for f in filters:
+        mask &= CONDITIONS[f["condition"]](columns[f["dbFilterCode"]], f["value"])
+
+    if fields:
+        result = table.loc[mask, [f for f in fields if f in table.columns]]
+    else:
+        result = table[mask]
+    if sort:
+        column, _, order = sort.partition(":")
+        result = result.sort_values(column, ascending=order != "desc")
+    return result.reset_index(drop=True)
@@ -0,0 +1,53 @@
+import time
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+
+RUNS_KEY = "_section_runs"
+SHOW_RUNS_KEY = "show_section_runs"
+
+
+def record_run(name):
+    """Ghi nhận một lần chạy của phần giao diện trong phiên hiện tại"""
+    runs = st.session_state.setdefault(RUNS_KEY, {})
+    entry = runs.setdefault(name, {"runs": 0, "last_run": None, "last_seconds": None})
+    entry["runs"] += 1
+    entry["last_run"] = datetime.now().strftime("%H:%M:%S")
+    return entry
+
+
+def section(name):
+    """Biến hàm vẽ thành st.fragment: đổi widget bên trong chỉ chạy lại phần này,
+    không chạy lại cả trang (và các lần lấy dữ liệu phía trên)"""
+
+    def decorator(render):
+        @wraps(render)
+        def wrapper(*args, **kwargs):
+            entry = record_run(name)
+            if st.session_state.get(SHOW_RUNS_KEY):
+                st.caption(f"↻ {name}: lần chạy thứ {entry['runs']} lúc {entry['last_run']}")
+            started = time.perf_counter()
+            try:
+                return render(*args, **kwargs)
+            finally:
+                entry["last_seconds"] = round(time.perf_counter() - started, 3)
+
+        return st.fragment(wrapper)
+
+    return decorator
+
+
+def render_rerun_panel():
+    """Bảng theo dõi các phần đã chạy lại trong phiên (đặt cuối sidebar)"""
+    with st.sidebar.expander("Theo dõi chạy lại"):
+        st.checkbox("Hiện số lần chạy trên từng phần", key=SHOW_RUNS_KEY)
+        runs = st.session_state.get(RUNS_KEY, {})
+        if runs:
+            st.dataframe(
+                pd.DataFrame.from_dict(runs, orient="index").rename_axis("Phần"),
+                use_container_width=True,
+            )
+        if st.button("Đặt lại bộ đếm"):
+            st.session_state.pop(RUNS_KEY, None)
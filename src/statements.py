@@ -0,0 +1,128 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+from vnstock import Vnstock
+
+from src.config import EXTERNAL_DATA_DIR
+from src.instrumentation import log_error
+
+STATEMENTS_DIR = EXTERNAL_DATA_DIR / "statements"
+STATEMENT_TYPES = ["income_statement", "balance_sheet", "cash_flow"]
+KEYS = ["ticker", "period", "yearReport", "lengthReport"]
+
+# Báo cáo năm gần như không đổi, chỉ thử lấy lại khi thiếu kỳ mới và lần lấy trước đã cũ
+RETRY_TTL = timedelta(days=7)
+
+_lock = threading.Lock()
+
+
+def _table_path(statement):
+    return STATEMENTS_DIR / f"{statement}.parquet"
+
+
+def _read_table(statement):
+    path = _table_path(statement)
+    if not path.exists():
+        return pd.DataFrame(columns=KEYS + ["fetched_at"])
+    return pd.read_parquet(path)
+
+
+def _write_table(statement, df):
+    STATEMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = _table_path(statement)
+    tmp_path = path.with_suffix(".tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _expected_latest(period, today=None):
+    """Kỳ báo cáo gần nhất đáng lẽ đã có, dạng (năm, kỳ)"""
+    today = today or datetime.now()
+    if period == "year":
+        return today.year - 1, 5
+    quarter = (today.month - 1) // 3
+    return (today.year, quarter) if quarter > 0 else (today.year - 1, 4)
+
+
+def _needs_refresh(stored, period, now=None):
+    if stored.empty:
+        return True
+    now = now or datetime.now()
+    latest = stored[["yearReport", "lengthReport"]].max(axis=0)
+    latest_key = (int(latest["yearReport"]), int(latest["lengthReport"]))
+    if period == "year":
+        latest_key = (latest_key[0], 5)
+    if latest_key >= _expected_latest(period, now):
+        return False
+    return now - pd.Timestamp(stored["fetched_at"].max()).to_pydatetime() > RETRY_TTL
+
+
+def _normalize(df, stock, period, fetched_at):
+    df = df.copy()
+    df["ticker"] = stock
+    df["period"] = period
+    if "lengthReport" not in df.columns:
+        df["lengthReport"] = 5
+    df["yearReport"] = df["yearReport"].astype(int)
+    df["lengthReport"] = df["lengthReport"].astype(int)
+    df["fetched_at"] = fetched_at
+    return df
+
+
+def fetch_statements(stock, period="year"):
+    """Tải 3 báo cáo tài chính từ vnstock"""
+    finance = Vnstock().stock(symbol=stock, source="TCBS").finance
+    return {
+        statement: getattr(finance, statement)(period=period, lang="en")
+        for statement in STATEMENT_TYPES
+    }
+
+
+def sync_statements(stock, period="year", force=False):
+    """Cập nhật kho báo cáo cho một mã khi xuất hiện kỳ báo cáo mới"""
+    stored = _read_table("income_statement")
+    stored = stored[(stored["ticker"] == stock) & (stored["period"] == period)]
+    if not force and not _needs_refresh(stored, period):
+        return False
+
+    try:
+        fetched = fetch_statements(stock, period)
+    except Exception as e:
+        if stored.empty:
+            raise
+        log_error(f"Lỗi khi cập nhật báo cáo tài chính {stock}", e)
+        return False
+
+    fetched_at = pd.Timestamp.now()
+    with _lock:
+        for statement, df in fetched.items():
+            table = _read_table(statement)
+            table = table[~((table["ticker"] == stock) & (table["period"] == period))]
+            new_rows = _normalize(df, stock, period, fetched_at)
+            table = (
+                pd.concat([table, new_rows], ignore_index=True) if not table.empty else new_rows
+            )
+            _write_table(statement, table.drop_duplicates(subset=KEYS, keep="last"))
+    return True
+
+
+def load_statement_table(statement, period="year"):
+    """Đọc toàn bộ một loại báo cáo của mọi mã đã lưu trong kho"""
+    table = _read_table(statement)
+    table = table[table["period"] == period]
+    return table.drop(columns=["period", "fetched_at"]).reset_index(drop=True)
+
+
+def get_statements(stock, period="year"):
+    """Đọc báo cáo KQKD, CĐKT, LCTT của một mã từ kho, mới nhất trước"""
+    sync_statements(stock, period)
+    result = []
+    for statement in STATEMENT_TYPES:
+        table = _read_table(statement)
+        df = table[(table["ticker"] == stock) & (table["period"] == period)]
+        df = df.drop(columns=["period", "fetched_at"])
+        df = df.sort_values(["yearReport", "lengthReport"], ascending=False)
+        result.append(df.reset_index(drop=True))
+    return tuple(result)
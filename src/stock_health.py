@@ -7,7 +7,19 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 from plotly.subplots import make_subplots
-from vnstock import Vnstock
+
+from src.dupont import DUPONT_METRICS, PERCENT_METRICS, compute_dupont, load_dupont_peers
+from src.health_scores import (
+    F_SCORE_CRITERIA,
+    M_SCORE_COMPONENTS,
+    Z_SCORE_COMPONENTS,
+    align_statements,
+    compute_f_score,
+    compute_m_score,
+    compute_z_score,
+    previous_year,
+)
+from src.statements import get_statements
 
 
 def display_dupont_analysis(stock):
@@ -45,10 +57,7 @@ def display_dupont_analysis(stock):
         st.warning("Chức năng này không hỗ trợ cho ngân hàng.")
         return
     else:
-        vn_stock = Vnstock().stock(symbol=stock, source="TCBS")
-        is_df = vn_stock.finance.income_statement(period="year", lang="en").head(8)
-        bs_df = vn_stock.finance.balance_sheet(period="year", lang="en").head(8)
-        cf_df = vn_stock.finance.cash_flow(period="year", lang="en").head(8)
+        is_df, bs_df, cf_df = (df.head(8) for df in load_statements(stock))
 
         """
         Hiển thị phân tích DuPont cho một công ty dựa trên dữ liệu bảng cân đối kế toán và báo cáo kết quả hoạt động kinh doanh.
@@ -65,66 +74,14 @@ def display_dupont_analysis(stock):
 
         st.header("Phân tích DuPont")
 
-        # Tạo dataframe để lưu dữ liệu phân tích DuPont
-        dupont_data = []
-
-        for year in years:
-            # Lấy dữ liệu cho năm hiện tại
-            current_bs = bs_df[bs_df["yearReport"] == year].iloc[0]
-            current_is = is_df[is_df["yearReport"] == year].iloc[0]
-
-            # Tính toán các thành phần phân tích DuPont
-            net_profit_margin = current_is["Net Profit For the Year"] / current_is["Net Sales"]
-            asset_turnover = current_is["Net Sales"] / current_bs["TOTAL ASSETS (Bn. VND)"]
-            equity_multiplier = (
-                current_bs["TOTAL ASSETS (Bn. VND)"] / current_bs["OWNER'S EQUITY(Bn.VND)"]
-            )
-
-            # ROA và ROE
-            roa = net_profit_margin * asset_turnover
-            roe = roa * equity_multiplier
-
-            # Phân tích DuPont mở rộng (5 thành phần)
-            tax_burden = (
-                current_is["Net Profit For the Year"] / current_is["Profit before tax"]
-            )  # Gánh nặng thuế
-            interest_burden = current_is["Profit before tax"] / (
-                current_is["Profit before tax"] + abs(current_is["Interest Expenses"])
-            )  # Gánh nặng lãi vay
-            operating_margin = (
-                current_is["Profit before tax"] + abs(current_is["Interest Expenses"])
-            ) / current_is[
-                "Net Sales"
-            ]  # Biên lợi nhuận hoạt động
-
-            dupont_data.append(
-                {
-                    "Năm": year,
-                    "Biên lợi nhuận ròng": net_profit_margin,
-                    "Hiệu suất sử dụng tài sản": asset_turnover,
-                    "Đòn bẩy tài chính": equity_multiplier,
-                    "ROA": roa,
-                    "ROE": roe,
-                    "Gánh nặng thuế": tax_burden,
-                    "Gánh nặng lãi vay": interest_burden,
-                    "Biên lợi nhuận hoạt động": operating_margin,
-                }
-            )
-
-        dupont_df = pd.DataFrame(dupont_data)
+        # Tính các thành phần DuPont cho tất cả các năm cùng lúc
+        dupont_df = compute_dupont(is_df.assign(ticker=stock), bs_df.assign(ticker=stock))
+        dupont_df = dupont_df.drop(columns="ticker")
 
         # Hiển thị 2 bảng: DuPont cơ bản và DuPont mở rộng
         st.subheader("1. Phân tích DuPont cơ bản")
 
-        basic_dupont = dupont_df.copy()
-
-        # Format các cột phần trăm
-        for col in ["Biên lợi nhuận ròng", "ROA", "ROE"]:
-            basic_dupont[col] = basic_dupont[col].apply(lambda x: f"{x*100:.2f}%")
-
-        # Format các cột tỷ số
-        for col in ["Hiệu suất sử dụng tài sản", "Đòn bẩy tài chính"]:
-            basic_dupont[col] = basic_dupont[col].apply(lambda x: f"{x:.2f}")
+        basic_dupont = _percent_view(dupont_df)
 
         st.dataframe(
             basic_dupont[
@@ -139,13 +96,17 @@ def display_dupont_analysis(stock):
             ],
             column_config={
                 "Năm": st.column_config.TextColumn("Năm"),
-                "Biên lợi nhuận ròng": st.column_config.TextColumn("Biên lợi nhuận ròng"),
-                "Hiệu suất sử dụng tài sản": st.column_config.TextColumn(
-                    "Hiệu suất sử dụng tài sản"
+                "Biên lợi nhuận ròng": st.column_config.NumberColumn(
+                    "Biên lợi nhuận ròng", format="%.2f%%"
+                ),
+                "Hiệu suất sử dụng tài sản": st.column_config.NumberColumn(
+                    "Hiệu suất sử dụng tài sản", format="%.2f"
                 ),
-                "Đòn bẩy tài chính": st.column_config.TextColumn("Đòn bẩy tài chính"),
-                "ROA": st.column_config.TextColumn("ROA"),
-                "ROE": st.column_config.TextColumn("ROE"),
+                "Đòn bẩy tài chính": st.column_config.NumberColumn(
+                    "Đòn bẩy tài chính", format="%.2f"
+                ),
+                "ROA": st.column_config.NumberColumn("ROA", format="%.2f%%"),
+                "ROE": st.column_config.NumberColumn("ROE", format="%.2f%%"),
             },
             hide_index=True,
             use_container_width=True,
@@ -177,22 +138,7 @@ def display_dupont_analysis(stock):
         # Hiển thị phân tích DuPont mở rộng
         st.subheader("2. Phân tích DuPont mở rộng")
 
-        extended_dupont = dupont_df.copy()
-
-        # Format các cột phần trăm
-        for col in [
-            "Biên lợi nhuận ròng",
-            "ROA",
-            "ROE",
-            "Gánh nặng thuế",
-            "Gánh nặng lãi vay",
-            "Biên lợi nhuận hoạt động",
-        ]:
-            extended_dupont[col] = extended_dupont[col].apply(lambda x: f"{x*100:.2f}%")
-
-        # Format các cột tỷ số
-        for col in ["Hiệu suất sử dụng tài sản", "Đòn bẩy tài chính"]:
-            extended_dupont[col] = extended_dupont[col].apply(lambda x: f"{x:.2f}")
+        extended_dupont = basic_dupont
 
         st.dataframe(
             extended_dupont[
@@ -208,12 +154,20 @@ def display_dupont_analysis(stock):
             ],
             column_config={
                 "Năm": st.column_config.TextColumn("Năm"),
-                "Gánh nặng thuế": st.column_config.TextColumn("Gánh nặng thuế"),
-                "Gánh nặng lãi vay": st.column_config.TextColumn("Gánh nặng lãi vay"),
-                "Biên lợi nhuận hoạt động": st.column_config.TextColumn("Biên LN hoạt động"),
-                "Hiệu suất sử dụng tài sản": st.column_config.TextColumn("Hiệu suất TS"),
-                "Đòn bẩy tài chính": st.column_config.TextColumn("Đòn bẩy TC"),
-                "ROE": st.column_config.TextColumn("ROE"),
+                "Gánh nặng thuế": st.column_config.NumberColumn(
+                    "Gánh nặng thuế", format="%.2f%%"
+                ),
+                "Gánh nặng lãi vay": st.column_config.NumberColumn(
+                    "Gánh nặng lãi vay", format="%.2f%%"
+                ),
+                "Biên lợi nhuận hoạt động": st.column_config.NumberColumn(
+                    "Biên LN hoạt động", format="%.2f%%"
+                ),
+                "Hiệu suất sử dụng tài sản": st.column_config.NumberColumn(
+                    "Hiệu suất TS", format="%.2f"
+                ),
+                "Đòn bẩy tài chính": st.column_config.NumberColumn("Đòn bẩy TC", format="%.2f"),
+                "ROE": st.column_config.NumberColumn("ROE", format="%.2f%%"),
             },
             hide_index=True,
             use_container_width=True,
@@ -245,21 +199,7 @@ def display_dupont_analysis(stock):
         # Biểu đồ xu hướng ROE và các thành phần
         st.subheader("3. Biểu đồ phân tích xu hướng DuPont")
 
-        # Chuyển đổi dữ liệu về float để vẽ biểu đồ
-        numeric_dupont_df = dupont_df.copy()
-
-        # Chuyển đổi dữ liệu về float để vẽ biểu đồ
-        numeric_dupont_df = dupont_df.copy()
-        for col in [
-            "ROE",
-            "ROA",
-            "Gánh nặng thuế",
-            "Gánh nặng lãi vay",
-            "Biên lợi nhuận hoạt động",
-            "Hiệu suất sử dụng tài sản",
-            "Đòn bẩy tài chính",
-        ]:
-            numeric_dupont_df[col] = numeric_dupont_df[col].astype(float)
+        numeric_dupont_df = dupont_df
 
         # Màu sắc dịu mắt hơn (pastel)
         pastel_colors = {
@@ -486,15 +426,65 @@ def display_dupont_analysis(stock):
             """
             )
 
+        display_dupont_peer_ranks(stock)
+
+
+@st.cache_data(ttl=3600)
+def load_dupont_table():
+    return load_dupont_peers()
+
+
+def _percent_view(dupont_df):
+    view = dupont_df.copy()
+    view[PERCENT_METRICS] = view[PERCENT_METRICS] * 100
+    return view
+
+
+def display_dupont_peer_ranks(stock):
+    """Hiển thị thứ hạng DuPont của mã trong ngành từ bảng tính sẵn"""
+    st.subheader("5. Xếp hạng DuPont trong ngành")
+
+    peers = load_dupont_table()
+    if peers is None or stock not in peers.index:
+        st.info("Chưa có dữ liệu xếp hạng ngành. Chạy `python -m src.dupont --sync` để tạo bảng.")
+        return
+
+    ranks = peers.loc[[stock]].sort_values("Năm", ascending=False)
+    peer_count = ranks["Số DN cùng ngành"].iloc[0]
+    if pd.isna(peer_count):
+        # Mã không có trong symbols_by_industries.csv nên không có nhóm ngành để so sánh
+        st.info("Mã chưa phân ngành ICB, không có thứ hạng trong ngành.")
+        return
+    st.caption(
+        f"Ngành: {ranks['icb_name3'].iloc[0]} — {int(peer_count)} "
+        "doanh nghiệp. Phần trăm cao hơn nghĩa là chỉ số lớn hơn các DN cùng ngành."
+    )
+    rank_columns = [f"{col} (pct)" for col in DUPONT_METRICS]
+    st.dataframe(
+        ranks[["Năm"] + rank_columns],
+        column_config={
+            "Năm": st.column_config.TextColumn("Năm"),
+            **{
+                f"{col} (pct)": st.column_config.ProgressColumn(
+                    col, format="%.2f", min_value=0, max_value=1
+                )
+                for col in DUPONT_METRICS
+            },
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
     # Load and prepare data
 
 
-@st.cache_data
+@st.cache_data(ttl=3600)
+def load_statements(stock):
+    return get_statements(stock, period="year")
+
+
 def load_data(stock):
-    vn_stock = Vnstock().stock(symbol=stock, source="TCBS")
-    is_df = vn_stock.finance.income_statement(period="year", lang="en")
-    bs_df = vn_stock.finance.balance_sheet(period="year", lang="en")
-    cf_df = vn_stock.finance.cash_flow(period="year", lang="en")
+    is_df, bs_df, cf_df = load_statements(stock)
 
     # Reverse rows to have chronological order
     cf_df = cf_df.iloc[::-1].reset_index(drop=True)
@@ -504,205 +494,6 @@ def load_data(stock):
     return cf_df, is_df, bs_df
 
 
-def calculate_f_score(year_index, cf_df, is_df, bs_df):
-    scores = {}
-    total_score = 0
-
-    # Check if we have sufficient data for comparison (need current and previous year)
-    if year_index < 1:
-        return None, None
-
-    # 1. Profitability
-    # ROA
-    net_profit = is_df.loc[year_index, "Net Profit For the Year"]
-    total_assets = bs_df.loc[year_index, "TOTAL ASSETS (Bn. VND)"]
-    prev_total_assets = bs_df.loc[year_index - 1, "TOTAL ASSETS (Bn. VND)"]
-
-    roa = net_profit / total_assets
-    scores["ROA > 0"] = 1 if roa > 0 else 0
-    total_score += scores["ROA > 0"]
-
-    # ROA Change
-    prev_net_profit = is_df.loc[year_index - 1, "Net Profit For the Year"]
-    prev_roa = prev_net_profit / prev_total_assets
-    scores["ROA Increasing"] = 1 if roa > prev_roa else 0
-    total_score += scores["ROA Increasing"]
-
-    # Operating Cash Flow
-    op_cash_flow = cf_df.loc[year_index, "Net cash inflows/outflows from operating activities"]
-    scores["Operating CF > 0"] = 1 if op_cash_flow > 0 else 0
-    total_score += scores["Operating CF > 0"]
-
-    # Cash Flow vs ROA
-    cash_flow_ratio = op_cash_flow / total_assets
-    scores["CF > ROA"] = 1 if cash_flow_ratio > roa else 0
-    total_score += scores["CF > ROA"]
-
-    # 2. Leverage, Liquidity, and Source of Funds
-    # Long-term Debt Ratio
-    lt_debt = bs_df.loc[year_index, "Long-term liabilities (Bn. VND)"]
-    lt_debt_ratio = lt_debt / total_assets
-
-    prev_lt_debt = bs_df.loc[year_index - 1, "Long-term liabilities (Bn. VND)"]
-    prev_lt_debt_ratio = prev_lt_debt / prev_total_assets
-
-    scores["Decreasing LT Debt Ratio"] = 1 if lt_debt_ratio < prev_lt_debt_ratio else 0
-    total_score += scores["Decreasing LT Debt Ratio"]
-
-    # Current Ratio
-    current_assets = bs_df.loc[year_index, "CURRENT ASSETS (Bn. VND)"]
-    current_liabilities = bs_df.loc[year_index, "Current liabilities (Bn. VND)"]
-    current_ratio = current_assets / current_liabilities
-
-    prev_current_assets = bs_df.loc[year_index - 1, "CURRENT ASSETS (Bn. VND)"]
-    prev_current_liabilities = bs_df.loc[year_index - 1, "Current liabilities (Bn. VND)"]
-    prev_current_ratio = prev_current_assets / prev_current_liabilities
-
-    scores["Increasing Current Ratio"] = 1 if current_ratio > prev_current_ratio else 0
-    total_score += scores["Increasing Current Ratio"]
-
-    # Check if new shares were issued
-    shares = bs_df.loc[year_index, "Common shares (Bn. VND)"]
-    prev_shares = bs_df.loc[year_index - 1, "Common shares (Bn. VND)"]
-    scores["No New Shares"] = 1 if shares <= prev_shares else 0
-    total_score += scores["No New Shares"]
-
-    # 3. Operating Efficiency
-    # Gross Margin
-    gross_profit = is_df.loc[year_index, "Gross Profit"]
-    net_sales = is_df.loc[year_index, "Net Sales"]
-    gross_margin = gross_profit / net_sales
-
-    prev_gross_profit = is_df.loc[year_index - 1, "Gross Profit"]
-    prev_net_sales = is_df.loc[year_index - 1, "Net Sales"]
-    prev_gross_margin = prev_gross_profit / prev_net_sales
-
-    scores["Increasing Gross Margin"] = 1 if gross_margin > prev_gross_margin else 0
-    total_score += scores["Increasing Gross Margin"]
-
-    # Asset Turnover
-    asset_turnover = net_sales / total_assets
-    prev_asset_turnover = prev_net_sales / prev_total_assets
-
-    scores["Increasing Asset Turnover"] = 1 if asset_turnover > prev_asset_turnover else 0
-    total_score += scores["Increasing Asset Turnover"]
-
-    return total_score, scores
-
-
-def calculate_m_score(year_index, cf_df, is_df, bs_df):
-    if year_index < 1:
-        return None, None
-
-    try:
-        # Helper to safely get values, default to 0 if missing
-        def safe_get(df, idx, col):
-            try:
-                return df.loc[idx, col]
-            except Exception:
-                return 0
-
-        # DSRI
-        receivables = safe_get(bs_df, year_index, "Accounts receivable (Bn. VND)")
-        sales = safe_get(is_df, year_index, "Net Sales")
-        prev_receivables = safe_get(bs_df, year_index - 1, "Accounts receivable (Bn. VND)")
-        prev_sales = safe_get(is_df, year_index - 1, "Net Sales")
-        if prev_sales == 0 or prev_receivables == 0:
-            return None, None
-        dsri = (receivables / sales) / (prev_receivables / prev_sales)
-
-        # GMI
-        gross_profit = safe_get(is_df, year_index, "Gross Profit")
-        prev_gross_profit = safe_get(is_df, year_index - 1, "Gross Profit")
-        gross_margin = gross_profit / sales if sales != 0 else 0
-        prev_gross_margin = prev_gross_profit / prev_sales if prev_sales != 0 else 0
-        if gross_margin == 0:
-            return None, None
-        gmi = prev_gross_margin / gross_margin
-
-        # AQI
-        current_assets = safe_get(bs_df, year_index, "CURRENT ASSETS (Bn. VND)")
-        total_assets = safe_get(bs_df, year_index, "TOTAL ASSETS (Bn. VND)")
-        prev_current_assets = safe_get(bs_df, year_index - 1, "CURRENT ASSETS (Bn. VND)")
-        prev_total_assets = safe_get(bs_df, year_index - 1, "TOTAL ASSETS (Bn. VND)")
-        non_current_assets = total_assets - current_assets
-        prev_non_current_assets = prev_total_assets - prev_current_assets
-        if prev_total_assets == 0 or prev_non_current_assets == 0 or total_assets == 0:
-            return None, None
-        aqi = (non_current_assets / total_assets) / (prev_non_current_assets / prev_total_assets)
-
-        # SGI
-        sgi = sales / prev_sales
-
-        # DEPI
-        depreciation = safe_get(cf_df, year_index, "Depreciation and Amortisation")
-        prev_depreciation = safe_get(cf_df, year_index - 1, "Depreciation and Amortisation")
-        fixed_assets = safe_get(bs_df, year_index, "Fixed assets (Bn. VND)")
-        prev_fixed_assets = safe_get(bs_df, year_index - 1, "Fixed assets (Bn. VND)")
-        if (
-            fixed_assets == 0
-            or prev_fixed_assets == 0
-            or prev_depreciation == 0
-            or depreciation == 0
-        ):
-            return None, None
-        depi = (prev_depreciation / prev_fixed_assets) / (depreciation / fixed_assets)
-
-        # SGAI
-        selling_expenses = safe_get(is_df, year_index, "Selling Expenses")
-        admin_expenses = safe_get(is_df, year_index, "General & Admin Expenses")
-        prev_selling_expenses = safe_get(is_df, year_index - 1, "Selling Expenses")
-        prev_admin_expenses = safe_get(is_df, year_index - 1, "General & Admin Expenses")
-        sga = selling_expenses + admin_expenses
-        prev_sga = prev_selling_expenses + prev_admin_expenses
-        if prev_sga == 0 or prev_sales == 0 or sales == 0:
-            return None, None
-        sgai = (sga / sales) / (prev_sga / prev_sales)
-
-        # TATA
-        net_income = safe_get(is_df, year_index, "Net Profit For the Year")
-        op_cash_flow = safe_get(
-            cf_df, year_index, "Net cash inflows/outflows from operating activities"
-        )
-        if total_assets == 0:
-            return None, None
-        tata = (net_income - op_cash_flow) / total_assets
-
-        # LVGI
-        total_liabilities = safe_get(bs_df, year_index, "LIABILITIES (Bn. VND)")
-        prev_total_liabilities = safe_get(bs_df, year_index - 1, "LIABILITIES (Bn. VND)")
-        if prev_total_liabilities == 0 or prev_total_assets == 0 or total_assets == 0:
-            return None, None
-        lvgi = (total_liabilities / total_assets) / (prev_total_liabilities / prev_total_assets)
-
-        m_score = (
-            -4.84
-            + 0.92 * dsri
-            + 0.528 * gmi
-            + 0.404 * aqi
-            + 0.892 * sgi
-            + 0.115 * depi
-            - 0.172 * sgai
-            + 4.679 * tata
-            - 0.327 * lvgi
-        )
-
-        components = {
-            "Days Sales in Receivables Index (DSRI)": dsri,
-            "Gross Margin Index (GMI)": gmi,
-            "Asset Quality Index (AQI)": aqi,
-            "Sales Growth Index (SGI)": sgi,
-            "Depreciation Index (DEPI)": depi,
-            "SG&A Expense Index (SGAI)": sgai,
-            "Total Accruals to Total Assets (TATA)": tata,
-            "Leverage Index (LVGI)": lvgi,
-        }
-        return m_score, components
-
-    except Exception:
-        return None, None
-
-
 def display_stock_score(stock):
     if stock in [
         "ABB",
@@ -749,6 +540,13 @@ def display_stock_score(stock):
         try:
             cf_df, is_df, bs_df = load_data(stock)
 
+            # Tính F/Z/M cho tất cả các năm một lần
+            panel = align_statements(is_df, bs_df, cf_df, ticker=stock)
+            prev_panel = previous_year(panel)
+            f_panel = compute_f_score(panel, prev_panel).dropna(subset=["F-Score"])
+            z_panel = compute_z_score(panel).dropna(subset=["Z-Score"])
+            m_panel = compute_m_score(panel, prev_panel).dropna(subset=["M-Score"])
+
             # Create tabs for the different sections
             tab1, tab2, tab3, tab4 = st.tabs(
                 [
@@ -861,18 +659,8 @@ def display_stock_score(stock):
                 """
                 )
 
-                # Calculate F-Score for all applicable years
-                f_scores = []
-                f_score_details = []
-                f_score_years = []
-
-                for i in range(len(is_df)):
-                    year = is_df.loc[i, "yearReport"]
-                    score, details = calculate_f_score(i, cf_df, is_df, bs_df)
-                    if score is not None:
-                        f_scores.append(score)
-                        f_score_details.append(details)
-                        f_score_years.append(year)
+                f_score_years = f_panel.index.get_level_values("yearReport").astype(int).tolist()
+                f_scores = f_panel["F-Score"].astype(int).tolist()
 
                 # Create F-score visualization
                 fig_f_score = go.Figure()
@@ -939,30 +727,17 @@ def display_stock_score(stock):
 
                 st.plotly_chart(fig_f_score, use_container_width=True)
 
-                # F-score breakdown for selected year
-                # Show F-Score breakdown as a table for the 5 most recent years
-                num_years = min(10, len(f_score_years))
-                recent_years = f_score_years[-num_years:]
-                recent_details = f_score_details[-num_years:]
-
-                # Prepare DataFrame for display
-                criteria = list(recent_details[-1].keys()) if recent_details else []
-                data = {"Tiêu chí": criteria}
-                for i, year in enumerate(recent_years):
-                    data[str(year)] = [recent_details[i][c] for c in criteria]
-
-                if f_score_details:
+                if f_scores:
                     st.subheader("Đánh giá chi tiết F-Score theo từng năm")
                     # Tạo bảng chi tiết cho tất cả các năm
-                    detail_data = []
-                    criteria = list(f_score_details[-1].keys()) if f_score_details else []
-                    for idx, year in enumerate(f_score_years):
-                        row = {"Năm": year}
-                        for crit in criteria:
-                            row[crit] = "✅" if f_score_details[idx][crit] else "❌"
-                        detail_data.append(row)
-                    detail_df = pd.DataFrame(detail_data).sort_index(ascending=False)
-                    st.dataframe(detail_df, hide_index=True, use_container_width=True)
+                    detail_df = pd.DataFrame(
+                        np.where(f_panel[F_SCORE_CRITERIA].to_numpy() == 1, "✅", "❌"),
+                        columns=F_SCORE_CRITERIA,
+                    )
+                    detail_df.insert(0, "Năm", f_score_years)
+                    st.dataframe(
+                        detail_df.iloc[::-1], hide_index=True, use_container_width=True
+                    )
 
             with tab3:
                 st.header("Altman Z-Score Analysis")
@@ -987,40 +762,6 @@ def display_stock_score(stock):
                 """
                 )
 
-                def get_z_score_components(year_index, is_df, bs_df):
-                    """Extract and calculate Altman Z-Score components for a given year index."""
-                    total_assets = bs_df.loc[year_index, "TOTAL ASSETS (Bn. VND)"]
-                    current_assets = bs_df.loc[year_index, "CURRENT ASSETS (Bn. VND)"]
-                    current_liabilities = bs_df.loc[year_index, "Current liabilities (Bn. VND)"]
-                    retained_earnings = bs_df.loc[year_index, "Undistributed earnings (Bn. VND)"]
-                    ebit = is_df.loc[year_index, "Profit before tax"]
-                    total_liabilities = bs_df.loc[year_index, "LIABILITIES (Bn. VND)"]
-                    equity = bs_df.loc[year_index, "OWNER'S EQUITY(Bn.VND)"]
-                    sales = is_df.loc[year_index, "Net Sales"]
-
-                    working_capital = current_assets - current_liabilities
-
-                    # Avoid division by zero
-                    if total_assets == 0 or total_liabilities == 0:
-                        return None
-
-                    A = working_capital / total_assets
-                    B = retained_earnings / total_assets
-                    C = ebit / total_assets
-                    D = equity / total_liabilities
-                    E = sales / total_assets
-
-                    z_score = 1.2 * A + 1.4 * B + 3.3 * C + 0.6 * D + 1.0 * E
-                    components = {
-                        "Working Capital/Total Assets": 1.2 * A,
-                        "Retained Earnings/Total Assets": 1.4 * B,
-                        "EBIT/Total Assets": 3.3 * C,
-                        "Equity/Total Liabilities": 0.6 * D,
-                        "Sales/Total Assets": 1.0 * E,
-                    }
-                    raw_components = (A, B, C, D, E)
-                    return z_score, components, raw_components
-
                 def diagnose_z_score_components(A, B, C, D, E):
                     """Return list of warning messages based on Z-Score component values."""
                     reasons = []
@@ -1066,17 +807,11 @@ def display_stock_score(stock):
                         )
                     return reasons
 
-                # Calculate Z-Score for all years
-                z_scores, z_components, z_years, z_raws = [], [], [], []
-                for i in range(len(is_df)):
-                    year = is_df.loc[i, "yearReport"]
-                    result = get_z_score_components(i, is_df, bs_df)
-                    if result is not None:
-                        z, comp, raw = result
-                        z_scores.append(z)
-                        z_components.append(comp)
-                        z_years.append(year)
-                        z_raws.append(raw)
+                # Z-Score cho tất cả các năm
+                z_years = z_panel.index.get_level_values("yearReport").astype(int).tolist()
+                z_scores = z_panel["Z-Score"].tolist()
+                z_components = z_panel[Z_SCORE_COMPONENTS].to_dict("records")
+                z_raws = list(z_panel[["A", "B", "C", "D", "E"]].itertuples(index=False))
 
                 # Visualization
                 colors = [
@@ -1287,22 +1022,10 @@ def display_stock_score(stock):
                 """
                 )
 
-                # Calculate Beneish M-Score
-
-                # Calculate M-Score for all years
-                m_scores = []
-                m_components = []
-                m_years = []
-
-                for i in range(len(is_df)):
-                    year = is_df.loc[i, "yearReport"]
-                    result = calculate_m_score(i, cf_df, is_df, bs_df)
-
-                    if result is not None and result[0] is not None:
-                        m, components = result
-                        m_scores.append(m)
-                        m_components.append(components)
-                        m_years.append(year)
+                # M-Score cho tất cả các năm
+                m_years = m_panel.index.get_level_values("yearReport").astype(int).tolist()
+                m_scores = m_panel["M-Score"].tolist()
+                m_components = m_panel[M_SCORE_COMPONENTS].to_dict("records")
 
                 # Create M-score visualization
                 fig_m_score = go.Figure()
@@ -11,10 +11,9 @@ from typing import Dict, List, Optional, Tuple, Union
 import pandas as pd
 import requests
 
-# Thiết lập logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+from src.instrumentation import instrument
+
+# Cấu hình logging (handler, mức log) do ứng dụng đặt, không đặt khi import module
 logger = logging.getLogger("tcbs_stock_data")
 
 
@@ -70,6 +69,7 @@ class TCBSStockData:
         """
         return int(datetime.strptime(date_str, "%Y-%m-%d").timestamp())
 
+    @instrument()
     def fetch_data(
         self,
         ticker: str,
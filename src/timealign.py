@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+def _times(df, on):
+    return pd.to_datetime(df[on]).to_numpy(dtype="datetime64[ns]")
+
+
+def asof_positions(left_times, right_times, tolerance=None):
+    """Vị trí dòng bên phải gần nhất không sau mỗi mốc bên trái (-1 nếu không khớp)
+
+    `right_times` phải đã sắp xếp tăng dần; `tolerance` giới hạn độ lệch tối đa (ví dụ "3D").
+    """
+    if len(right_times) == 0:
+        return np.full(len(left_times), -1, dtype=np.intp)
+    positions = np.searchsorted(right_times, left_times, side="right") - 1
+    valid = positions >= 0
+    if tolerance is not None:
+        gap = left_times - right_times[positions.clip(0)]
+        valid &= gap <= pd.Timedelta(tolerance).to_timedelta64()
+    positions[~valid] = -1
+    return positions
+
+
+def take(values, positions):
+    """Lấy giá trị theo vị trí, NaN/None ở các vị trí -1"""
+    values = np.asarray(values)
+    missing = positions < 0
+    if not len(values):
+        # Nguồn rỗng (kể cả bảng rỗng kiểu object): mọi vị trí đều thiếu
+        return np.full(
+            len(positions), np.datetime64("NaT") if values.dtype.kind == "M" else np.nan
+        )
+    if values.dtype.kind in "iub":
+        values = values.astype(float)
+    result = values[positions.clip(0)]
+    if missing.any():
+        if values.dtype.kind == "f":
+            result[missing] = np.nan
+        elif values.dtype.kind == "M":
+            result[missing] = np.datetime64("NaT")
+        else:
+            result = result.astype(object)
+            result[missing] = None
+    return result
+
+
+def asof_align(base, sources, on="time", tolerance=None):
+    """Ghép nhiều chuỗi thời gian vào trục thời gian của `base` bằng as-of join
+
+    `sources` là danh sách (df, columns) hoặc (df, columns, on) với `columns` là list cột hoặc
+    dict tên cột -> tên mới. Với mỗi mốc của `base`, lấy dòng gần nhất không sau mốc đó và lệch
+    không quá `tolerance`. Không sửa dữ liệu đầu vào; mỗi nguồn chỉ cần một lần sắp xếp chỉ số
+    (nếu chưa tăng dần) và một lần tìm nhị phân.
+    """
+    base_times = _times(base, on)
+    columns = {column: base[column].to_numpy() for column in base.columns}
+    columns[on] = base_times
+
+    for source in sources:
+        df, selected, source_on = (*source, on) if len(source) == 2 else source
+        if not isinstance(selected, dict):
+            selected = {column: column for column in selected}
+        times = _times(df, source_on)
+        order = None
+        if len(times) > 1 and (np.diff(times) < np.timedelta64(0)).any():
+            order = np.argsort(times, kind="stable")
+            times = times[order]
+        positions = asof_positions(base_times, times, tolerance)
+        for column, name in selected.items():
+            values = df[column].to_numpy()
+            columns[name] = take(values if order is None else values[order], positions)
+
+    return pd.DataFrame(columns, index=base.index)
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from src.config import INTERIM_DATA_DIR, RAW_DATA_DIR
+
+CATEGORY_COLUMNS = {
+    "exchange": "exchange",
+    "icb_code1": "icb_code1",
+    "icb_code2": "icb_code2",
+    "icb_code3": "icb_code3",
+    "icb_code4": "icb_code4",
+    "icb_name2": "icb_name2",
+    "icb_name3": "icb_name3",
+    "icb_name4": "icb_name4",
+}
+
+
+class UniverseIndex:
+    """Chỉ mục vũ trụ cổ phiếu dạng bitmap
+
+    Mỗi mã được gán một id cố định (thứ tự trong `symbols`). Mỗi giá trị của một tiêu chí phân loại
+    (sàn, ngành ICB 1-4, nhóm vốn hóa...) là một bitmap đã nén bằng `np.packbits`, nên kết hợp
+    nhiều tiêu chí chỉ là vài phép AND/OR trên mảng byte. Tiêu chí số (vốn hóa, GTNN mua ròng)
+    được lưu đã sắp xếp để lọc theo ngưỡng bằng tìm nhị phân.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = np.asarray(sorted(set(symbols)), dtype=object)
+        self.size = len(self.symbols)
+        self.ids = pd.Index(self.symbols)
+        self.columns = {}
+        self._bitmaps = {}
+        self._numeric = {}
+
+    @classmethod
+    def from_files(cls, stocks_path=None, industries_path=None):
+        """Dựng chỉ mục từ list_stock.csv và symbols_by_industries.csv"""
+        stocks = pd.read_csv(stocks_path or RAW_DATA_DIR / "list_stock.csv")
+        industries = pd.read_csv(industries_path or INTERIM_DATA_DIR / "symbols_by_industries.csv")
+        universe = cls(stocks["symbol"].tolist() + industries["symbol"].tolist())
+        universe.add_category("exchange", stocks["symbol"], stocks["exchange"])
+        for name, column in CATEGORY_COLUMNS.items():
+            if column in industries.columns:
+                universe.add_category(name, industries["symbol"], industries[column])
+        return universe
+
+    def _positions(self, symbols):
+        return self.ids.get_indexer(pd.Index(symbols))
+
+    def _pack(self, positions):
+        bits = np.zeros(self.size, dtype=bool)
+        bits[positions[positions >= 0]] = True
+        return np.packbits(bits)
+
+    def add_category(self, name, symbols, values):
+        """Tạo một bitmap cho mỗi giá trị của tiêu chí phân loại"""
+        positions = self._positions(symbols)
+        values = pd.Series(np.asarray(values), dtype=object)
+        valid = (positions >= 0) & values.notna().to_numpy()
+        column = np.full(self.size, None, dtype=object)
+        column[positions[valid]] = values[valid].to_numpy()
+        self.columns[name] = column
+
+        codes, uniques = pd.factorize(values[valid])
+        valid_positions = positions[valid]
+        for code, value in enumerate(uniques):
+            self._bitmaps[(name, value)] = self._pack(valid_positions[codes == code])
+
+    def add_numeric(self, name, symbols, values, buckets=None):
+        """Lưu tiêu chí số đã sắp xếp; `buckets` là dict nhãn -> (min, max) tạo sẵn bitmap"""
+        positions = self._positions(symbols)
+        values = np.asarray(values, dtype=float)
+        valid = (positions >= 0) & ~np.isnan(values)
+        order = np.argsort(values[valid], kind="stable")
+        self._numeric[name] = (values[valid][order], positions[valid][order])
+        for label, (low, high) in (buckets or {}).items():
+            self._bitmaps[(name, label)] = self.between(name, low, high)
+
+    def has_numeric(self, name):
+        return name in self._numeric
+
+    def values(self, name, within=None):
+        """Các giá trị khác nhau của một tiêu chí, có thể giới hạn trong một bitmap"""
+        column = self.columns[name]
+        if within is not None:
+            column = column[self.to_mask(within)]
+        return sorted(v for v in set(column) if v is not None)
+
+    def all(self):
+        return self._pack(np.arange(self.size))
+
+    def none(self):
+        return np.zeros_like(self.all())
+
+    def mask(self, name, value):
+        return self._bitmaps.get((name, value), self.none())
+
+    def any_of(self, name, values):
+        bitmaps = [self.mask(name, value) for value in values]
+        return np.bitwise_or.reduce(bitmaps) if bitmaps else self.none()
+
+    def between(self, name, low=None, high=None):
+        """Bitmap các mã có low < giá trị <= high, dùng tìm nhị phân trên mảng đã sắp xếp"""
+        if name not in self._numeric:
+            return self.none()
+        sorted_values, positions = self._numeric[name]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="right")
+        end = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, "right")
+        return self._pack(positions[start:end])
+
+    def greater_than(self, name, threshold):
+        return self.between(name, low=threshold)
+
+    def from_symbols(self, symbols):
+        return self._pack(self._positions(symbols))
+
+    @staticmethod
+    def combine(*bitmaps):
+        """Giao của nhiều bitmap"""
+        return np.bitwise_and.reduce(bitmaps)
+
+    def to_mask(self, bitmap):
+        return np.unpackbits(bitmap, count=self.size).astype(bool)
+
+    def to_symbols(self, bitmap):
+        return self.symbols[self.to_mask(bitmap)].tolist()
+
+    def count(self, bitmap):
+        return int(np.unpackbits(bitmap, count=self.size).sum())